@@ -0,0 +1,213 @@
+import asyncio
+import hashlib
+import os
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Optional
+
+import aiohttp
+from loguru import logger
+
+from .Metrics import metrics
+
+
+class AvatarTooLarge(Exception):
+    """头像超过大小限制"""
+
+
+class AvatarCache:
+    """头像下载器
+
+    复用一个长期存在的连接池下载头像，边读边检查大小，超过上限立即中断；
+    下载结果按 URL 缓存在内存中（LRU，按字节预算淘汰），
+    配置了磁盘目录时，被淘汰的头像会溢出到磁盘，命中后再提回内存。
+    """
+
+    def __init__(
+        self,
+        memory_budget: int = 32 * 1024 * 1024,
+        max_size: int = 15 * 1024 * 1024,
+        ttl: float = 24 * 3600,
+        spill_dir: Optional[str] = None,
+        spill_budget: int = 256 * 1024 * 1024,
+        timeout: float = 10,
+    ):
+        self.memory_budget = memory_budget
+        self.max_size = max_size
+        self.ttl = ttl
+        self.spill_budget = spill_budget
+        self.timeout = timeout
+
+        # url -> (头像字节, 获取时间)
+        self._memory: "OrderedDict[str, tuple]" = OrderedDict()
+        self._memory_bytes = 0
+        # url -> 文件大小，顺序即 LRU 顺序
+        self._disk: "OrderedDict[str, int]" = OrderedDict()
+        self._disk_bytes = 0
+        # 溢出文件放在配置目录下的专用子目录中，启动时清理不会波及其他文件
+        self._spill_dir = Path(spill_dir) / "marryme_avatars" if spill_dir else None
+
+        self._client: Optional[aiohttp.ClientSession] = None
+        # 同一 URL 的并发下载只发起一次
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+        self.hits = 0
+        self.misses = 0
+
+        if self._spill_dir:
+            self._spill_dir.mkdir(parents=True, exist_ok=True)
+            # 上次运行遗留的文件没有索引，直接清掉
+            for path in self._spill_dir.iterdir():
+                if path.is_file():
+                    path.unlink(missing_ok=True)
+
+    def _get_client(self) -> aiohttp.ClientSession:
+        if self._client is None or self._client.closed:
+            self._client = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=32, ttl_dns_cache=300),
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+            )
+        return self._client
+
+    async def fetch(self, url: str) -> Optional[bytes]:
+        """获取头像字节，失败或超过大小限制时返回 None"""
+        content = self._get_memory(url)
+        if content is None:
+            content = await self._get_disk(url)
+        if content is not None:
+            self.hits += 1
+            return content
+
+        self.misses += 1
+        future = self._inflight.get(url)
+        if future is not None:
+            return await asyncio.shield(future)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[url] = future
+        try:
+            content = await self._download(url)
+        finally:
+            del self._inflight[url]
+            # 下载失败或被取消（CancelledError 不是 Exception）时等待者拿到 None，
+            # 否则它们会一直卡在 shield 上
+            future.set_result(content)
+
+        # 先放入内存再等待溢出写盘，中间没有让出事件循环，不会重复下载
+        if content is not None:
+            await self._put_memory(url, content)
+        return content
+
+    @metrics.timed("external", "avatar")
+    async def _download(self, url: str) -> Optional[bytes]:
+        async with self._get_client().get(url) as resp:
+            if resp.status != 200:
+                return None
+
+            if resp.content_length and resp.content_length > self.max_size:
+                raise AvatarTooLarge(f"头像大小 {resp.content_length} 超过限制")
+
+            buffer = bytearray()
+            async for chunk in resp.content.iter_chunked(64 * 1024):
+                buffer.extend(chunk)
+                if len(buffer) > self.max_size:
+                    raise AvatarTooLarge(f"头像大小超过 {self.max_size} 字节")
+            return bytes(buffer)
+
+    def _get_memory(self, url: str) -> Optional[bytes]:
+        item = self._memory.get(url)
+        if item is None:
+            return None
+
+        content, fetched_at = item
+        if time.time() - fetched_at > self.ttl:
+            self._memory_bytes -= len(content)
+            del self._memory[url]
+            return None
+
+        self._memory.move_to_end(url)
+        return content
+
+    async def _put_memory(self, url: str, content: bytes, fetched_at: float = None):
+        if len(content) > self.memory_budget:
+            return
+
+        old = self._memory.pop(url, None)
+        if old is not None:
+            self._memory_bytes -= len(old[0])
+
+        self._memory[url] = (content, fetched_at or time.time())
+        self._memory_bytes += len(content)
+
+        while self._memory_bytes > self.memory_budget:
+            evicted_url, (evicted, evicted_at) = self._memory.popitem(last=False)
+            self._memory_bytes -= len(evicted)
+            await self._spill(evicted_url, evicted, evicted_at)
+
+    def _spill_path(self, url: str) -> Path:
+        return self._spill_dir / hashlib.sha1(url.encode()).hexdigest()
+
+    @staticmethod
+    def _write_file(path: Path, content: bytes, fetched_at: float):
+        path.write_bytes(content)
+        # 用修改时间记录原始获取时间，供过期判断
+        os.utime(path, (fetched_at, fetched_at))
+
+    async def _spill(self, url: str, content: bytes, fetched_at: float):
+        """把从内存淘汰的头像写到磁盘（在线程中写入，不阻塞事件循环）"""
+        if not self._spill_dir or len(content) > self.spill_budget:
+            return
+
+        self._drop_disk(url)
+        try:
+            await asyncio.to_thread(
+                self._write_file, self._spill_path(url), content, fetched_at
+            )
+        except OSError as e:
+            logger.warning(f"头像写入磁盘缓存失败: {e}")
+            return
+        self._disk[url] = len(content)
+        self._disk_bytes += len(content)
+
+        while self._disk_bytes > self.spill_budget:
+            evicted_url, _ = next(iter(self._disk.items()))
+            self._drop_disk(evicted_url)
+
+    def _drop_disk(self, url: str):
+        size = self._disk.pop(url, None)
+        if size is None:
+            return
+        self._disk_bytes -= size
+        try:
+            self._spill_path(url).unlink()
+        except OSError:
+            pass
+
+    async def _get_disk(self, url: str) -> Optional[bytes]:
+        if url not in self._disk:
+            return None
+
+        path = self._spill_path(url)
+        try:
+            fetched_at = path.stat().st_mtime
+            if time.time() - fetched_at > self.ttl:
+                self._drop_disk(url)
+                return None
+            content = await asyncio.to_thread(path.read_bytes)
+        except OSError:
+            self._drop_disk(url)
+            return None
+
+        # 提回内存
+        self._drop_disk(url)
+        await self._put_memory(url, content, fetched_at)
+        return content
+
+    async def close(self):
+        """关闭连接池并清理磁盘缓存"""
+        if self._client is not None and not self._client.closed:
+            await self._client.close()
+        self._client = None
+        for url in list(self._disk):
+            self._drop_disk(url)
@@ -0,0 +1,137 @@
+import asyncio
+import heapq
+import time
+from datetime import datetime
+from typing import (
+    Awaitable,
+    Callable,
+    Dict,
+    Hashable,
+    List,
+    Optional,
+    Set,
+    Tuple,
+    Union,
+)
+
+from loguru import logger
+
+DueCallback = Callable[[List[Hashable]], Awaitable[None]]
+
+
+class DeadlineScheduler:
+    """按到期时间批量触发的调度器
+
+    用一个最小堆记录所有键的到期时间，由单个后台任务按需唤醒，
+    把同一时间窗口内到期的键合并成一批交给回调处理，失败时整批延后重试。
+    被取消的键只从到期表中移除，堆中的旧条目在弹出时跳过。
+    """
+
+    def __init__(
+        self,
+        callback: DueCallback,
+        batch_window: float = 1.0,
+        max_batch: int = 500,
+        retry_delay: float = 30.0,
+        name: str = "到期处理",
+    ):
+        self._callback = callback
+        self.batch_window = batch_window
+        self.max_batch = max_batch
+        self.retry_delay = retry_delay
+        self.name = name
+
+        self._heap: List[Tuple[float, Hashable]] = []
+        self._deadlines: Dict[Hashable, float] = {}
+        # 正在交给回调处理的键，处理期间被取消的键失败后不再重试
+        self._dispatching: Set[Hashable] = set()
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    def schedule(self, key: Hashable, deadline: Union[datetime, float]):
+        """登记一个键的到期时间（datetime 或时间戳）"""
+        if isinstance(deadline, datetime):
+            deadline = deadline.timestamp()
+        self._push(key, deadline)
+
+    def _push(self, key: Hashable, deadline: float):
+        self._deadlines[key] = deadline
+        heapq.heappush(self._heap, (deadline, key))
+        # 新键比当前最早的到期时间还早时，唤醒后台任务重新计算等待时间
+        if self._heap[0][1] == key:
+            self._wakeup.set()
+
+    def discard(self, key: Hashable):
+        """取消一个键，不再触发"""
+        self._deadlines.pop(key, None)
+        self._dispatching.discard(key)
+
+    def clear(self):
+        """清空所有待触发的键"""
+        self._heap.clear()
+        self._deadlines.clear()
+        self._dispatching.clear()
+
+    def __len__(self) -> int:
+        return len(self._deadlines)
+
+    def start(self):
+        """启动后台任务，已启动时不做任何事"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """停止后台任务"""
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    def _pop_due(self, now: float) -> List[Hashable]:
+        due = []
+        while self._heap and self._heap[0][0] <= now and len(due) < self.max_batch:
+            deadline, key = heapq.heappop(self._heap)
+            # 跳过已取消或被重新登记过的旧条目
+            if self._deadlines.get(key) != deadline:
+                continue
+            del self._deadlines[key]
+            due.append(key)
+        return due
+
+    async def _run(self):
+        while True:
+            self._wakeup.clear()
+            due = self._pop_due(time.time())
+            if due:
+                await self._dispatch(due)
+                continue
+
+            timeout = None
+            if self._heap:
+                # 多等一个时间窗口，让相近的到期键合并到同一批
+                timeout = max(0, self._heap[0][0] - time.time()) + self.batch_window
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _dispatch(self, keys: List[Hashable]):
+        self._dispatching = set(keys)
+        try:
+            await self._fire(keys)
+        except Exception as e:
+            logger.error(f"{self.name}失败，{self.retry_delay}秒后重试: {e}")
+            retry_at = time.time() + self.retry_delay
+            for key in keys:
+                # 重试前被重新登记或取消的键以新的状态为准
+                if key in self._dispatching and key not in self._deadlines:
+                    self._push(key, retry_at)
+        finally:
+            self._dispatching = set()
+
+    async def _fire(self, keys: List[Hashable]):
+        await self._callback(keys)
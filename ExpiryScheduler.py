@@ -0,0 +1,50 @@
+from typing import Awaitable, Callable, List, Optional
+
+from loguru import logger
+
+from .DeadlineScheduler import DeadlineScheduler
+
+ExpireCallback = Callable[[List[str]], Awaitable[List[dict]]]
+NotifyCallback = Callable[[List[dict]], Awaitable[None]]
+
+
+class ExpiryScheduler(DeadlineScheduler):
+    """结婚请求过期调度器
+
+    把同一时间窗口内到期的请求合并成一次批量更新，再统一发送超时通知。
+    已被接受/拒绝的请求只从到期表中移除。
+    """
+
+    def __init__(
+        self,
+        expire_callback: ExpireCallback,
+        batch_window: float = 1.0,
+        max_batch: int = 500,
+        retry_delay: float = 30.0,
+    ):
+        super().__init__(
+            expire_callback,
+            batch_window=batch_window,
+            max_batch=max_batch,
+            retry_delay=retry_delay,
+            name="批量过期结婚请求",
+        )
+        self._notify: Optional[NotifyCallback] = None
+
+    def start(self, notify: NotifyCallback):
+        """启动后台任务"""
+        self._notify = notify
+        super().start()
+
+    async def _fire(self, request_ids: List[str]):
+        expired = await self._callback(request_ids)
+        if not expired:
+            return
+
+        logger.info(f"🕒 {len(expired)} 个结婚请求已超时")
+        if self._notify is None:
+            return
+        try:
+            await self._notify(expired)
+        except Exception as e:
+            logger.error(f"发送超时通知失败: {e}")
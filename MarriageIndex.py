@@ -0,0 +1,55 @@
+from typing import Dict, Iterable, List, Optional
+
+
+class MarriageIndex:
+    """内存中的婚姻关系邻接索引
+
+    结构为 user_id -> {spouse_id: 婚姻记录}，启动时从数据库加载一次，
+    之后由 MarriageManager 在事务提交后同步更新，查询不再访问数据库。
+    """
+
+    def __init__(self):
+        self._adjacency: Dict[str, Dict[str, dict]] = {}
+        self.loaded = False
+
+    def load(self, marriages: Iterable[dict]):
+        """用数据库中的有效婚姻重建索引"""
+        self._adjacency.clear()
+        for marriage in marriages:
+            self.add(marriage)
+        self.loaded = True
+
+    def add(self, marriage: dict):
+        """添加一段婚姻（双向）"""
+        proposer_id = marriage["proposer_id"]
+        target_id = marriage["target_id"]
+        self._adjacency.setdefault(proposer_id, {})[target_id] = marriage
+        self._adjacency.setdefault(target_id, {})[proposer_id] = marriage
+
+    def remove(self, user_id: str, spouse_id: str) -> Optional[dict]:
+        """移除一段婚姻（双向），返回被移除的记录"""
+        marriage = self._pop(user_id, spouse_id)
+        self._pop(spouse_id, user_id)
+        return marriage
+
+    def _pop(self, user_id: str, spouse_id: str) -> Optional[dict]:
+        spouses = self._adjacency.get(user_id)
+        if not spouses:
+            return None
+        marriage = spouses.pop(spouse_id, None)
+        if not spouses:
+            del self._adjacency[user_id]
+        return marriage
+
+    def get(self, user_id: str, spouse_id: str) -> Optional[dict]:
+        """获取两人之间的婚姻记录"""
+        marriage = self._adjacency.get(user_id, {}).get(spouse_id)
+        return dict(marriage) if marriage else None
+
+    def get_all(self, user_id: str) -> List[dict]:
+        """获取用户的所有婚姻记录（按结婚先后顺序）"""
+        return [dict(m) for m in self._adjacency.get(user_id, {}).values()]
+
+    def clear(self):
+        """清空索引（每日重置时使用）"""
+        self._adjacency.clear()
@@ -1,21 +1,391 @@
-import aiohttp
+import asyncio
+from collections import Counter
+from contextlib import asynccontextmanager
+from nonebot.exception import MatcherException
 from nonebot_plugin_orm import get_session
-from sqlalchemy import func, select, delete, update
-from datetime import datetime, timedelta, timezone
-from typing import List, Optional
-
+from sqlalchemy import case, func, select, delete, update, union_all
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+from datetime import datetime, timedelta
+from typing import AsyncIterator, Callable, Dict, List, Optional
+
+from .AvatarCache import AvatarCache
+from .Cache import MISSING, LRUCache
+from .ExpiryScheduler import ExpiryScheduler
+from .MarriageIndex import MarriageIndex
+from .MemberDirectory import MemberDirectory
+from .Metrics import metrics
+from .Outbox import Outbox
+from .PendingIndex import PendingIndex
+from .RateLimiter import RateLimiter
+from .SlowQueryLog import SlowQueryLog
+from .config import plugin_config
 from .SessionManager import BabyProcessManager
-from .models import BabyRecord, MarriageRequest, Marriage
-from .models import UserPreference
+from .models import BabyRecord, BabyTotal, MarriageRequest, Marriage, make_pair_key
+from .models import PluginState, UserPreference
 
 from nonebot.adapters.onebot.v11 import MessageSegment
 from loguru import logger
 
-
+# 结婚请求的有效期（秒）
+REQUEST_TIMEOUT = 120
+# plugin_state 中记录当前代的键
+GENERATION_KEY = "generation"
+
+
+def _upsert(
+    session, model, values: List[dict], index_elements: List[str], set_: Callable
+):
+    """生成 INSERT ... ON CONFLICT DO UPDATE
+
+    set_ 接收冲突时“新插入的行”（excluded），返回要更新的列。
+    插件依赖 ON CONFLICT、RETURNING 和部分唯一索引，只支持 SQLite 与 PostgreSQL
+    """
+    dialect = session.get_bind(mapper=model).dialect.name
+    insert = postgresql.insert if dialect == "postgresql" else sqlite.insert
+    stmt = insert(model).values(values)
+    return stmt.on_conflict_do_update(
+        index_elements=index_elements, set_=set_(stmt.excluded)
+    )
+
+
+def _insert_ignore(
+    session, model, values: dict, index_elements: List[str], index_where=None
+):
+    """生成 INSERT ... ON CONFLICT DO NOTHING
+
+    冲突时不插入也不报错，调用方通过 rowcount 判断是否插入成功；
+    index_where 用于指定部分唯一索引作为冲突目标
+    """
+    dialect = session.get_bind(mapper=model).dialect.name
+    insert = postgresql.insert if dialect == "postgresql" else sqlite.insert
+    return (
+        insert(model)
+        .values(values)
+        .on_conflict_do_nothing(index_elements=index_elements, index_where=index_where)
+    )
+
+
+_EPOCH = datetime(1970, 1, 1)
+_DIGITS = "0123456789abcdefghijklmnopqrstuvwxyz"
+
+
+def _encode_page_cursor(user_id: str, created_at: datetime, pair_key: str) -> str:
+    """把分页位置编码为可以放进命令里的短字符串：36 进制微秒时间戳-配偶 ID"""
+    micros = (created_at - _EPOCH) // timedelta(microseconds=1)
+    digits = ""
+    while True:
+        micros, digit = divmod(micros, 36)
+        digits = _DIGITS[digit] + digits
+        if not micros:
+            break
+    user1_id, user2_id = pair_key.split("&", 1)
+    return f"{digits}-{user2_id if user1_id == user_id else user1_id}"
+
+
+def _decode_page_cursor(user_id: str, cursor: Optional[str]) -> Optional[tuple]:
+    """解析 _encode_page_cursor 生成的游标，返回 (created_at, pair_key)，无效时返回 None"""
+    if not cursor:
+        return None
+    digits, _, partner_id = cursor.partition("-")
+    if not partner_id:
+        return None
+    try:
+        created_at = _EPOCH + timedelta(microseconds=int(digits, 36))
+    except (ValueError, OverflowError):
+        return None
+    return created_at, make_pair_key(user_id, partner_id)
+
+
+@metrics.instrument("manager")
 class MarriageManager:
     def __init__(self):
         # 初始化生宝宝过程管理器
-        self.baby_process_manager = BabyProcessManager()
+        self.baby_process_manager = BabyProcessManager(self.have_babies_with_spouses)
+        # 婚姻关系内存索引，启动时由 load_marriage_index 加载
+        self.marriage_index = MarriageIndex()
+        # 群成员缓存
+        self.member_directory = MemberDirectory(
+            ttl=plugin_config.marryme_member_cache_ttl,
+            max_groups=plugin_config.marryme_member_cache_groups,
+        )
+        # 头像下载连接池与缓存
+        self.avatar_cache = AvatarCache(
+            memory_budget=plugin_config.marryme_avatar_cache_bytes,
+            max_size=plugin_config.marryme_avatar_max_size,
+            ttl=plugin_config.marryme_avatar_cache_ttl,
+            spill_dir=plugin_config.marryme_avatar_spill_dir,
+            spill_budget=plugin_config.marryme_avatar_spill_bytes,
+        )
+
+        # 群通知发件箱，合并短时间内的通知并限制发送频率
+        self.outbox = Outbox(
+            coalesce_window=plugin_config.marryme_outbox_coalesce_window,
+            max_coalesce=plugin_config.marryme_outbox_max_coalesce,
+            group_burst=plugin_config.marryme_outbox_group_burst,
+            group_interval=plugin_config.marryme_outbox_group_interval,
+            global_burst=plugin_config.marryme_outbox_global_burst,
+            global_interval=plugin_config.marryme_outbox_global_interval,
+            retry_delay=plugin_config.marryme_outbox_retry_delay,
+            max_retries=plugin_config.marryme_outbox_max_retries,
+        )
+
+        # 结婚请求过期调度器
+        self.expiry_scheduler = ExpiryScheduler(self.expire_requests)
+        # 有待处理请求的 (被求婚者, 群)，由 start_expiry_scheduler 加载
+        self.pending_index = PendingIndex()
+        # 用户偏好缓存：(user_id, group_id) -> 偏好字典，未设置偏好时缓存 None
+        self._preferences = LRUCache(
+            maxsize=plugin_config.marryme_preference_cache_size
+        )
+        # 每次修改偏好后递增，防止修改前读到的旧值在修改后写回缓存
+        self._preference_version = 0
+        # 各命令的频率限制，求婚次数启动时由 load_rate_limits 从数据库初始化
+        self.rate_limiter = RateLimiter(plugin_config.marryme_rate_limits)
+        # 当前代，启动时由 load_generation 从数据库读取，每日重置时加一
+        self.generation = 0
+        # 慢查询日志，启动时由 watch_database 挂到数据库引擎上
+        self.slow_queries = SlowQueryLog(
+            threshold_ms=plugin_config.marryme_slow_query_ms,
+            path=plugin_config.marryme_slow_query_log,
+            rotation=plugin_config.marryme_slow_query_rotation,
+            retention=plugin_config.marryme_slow_query_retention,
+        )
+        self._register_gauges()
+        # 分批删除旧代数据的后台任务；关闭时在两批之间停下，不打断正在执行的语句
+        self._purge_task: Optional[asyncio.Task] = None
+        self._stop_purge = False
+
+    def _register_gauges(self):
+        """导出缓存命中数与进行中的数量"""
+        for name, cache in (
+            ("preferences", self._preferences),
+            ("members", self.member_directory),
+            ("avatars", self.avatar_cache),
+        ):
+            metrics.gauge(
+                "marryme_cache_hits", "缓存命中次数", name, lambda c=cache: c.hits
+            )
+            metrics.gauge(
+                "marryme_cache_misses", "缓存未命中次数", name, lambda c=cache: c.misses
+            )
+
+        in_flight = {
+            "baby_processes": lambda: len(self.baby_process_manager.baby_processes),
+            "pending_requests": lambda: len(self.expiry_scheduler),
+            "outbox_queued": lambda: self.outbox.depth(),
+        }
+        for name, read in in_flight.items():
+            metrics.gauge("marryme_in_flight", "进行中的数量", name, read)
+        metrics.gauge(
+            "marryme_outbox_latency_seconds",
+            "通知从入队到发出的耗时（秒）",
+            "p95",
+            lambda: self.outbox.stats()["latency_p95"],
+        )
+        metrics.gauge(
+            "marryme_slow_queries",
+            "慢查询条数",
+            "total",
+            lambda: self.slow_queries.count,
+        )
+
+    def watch_database(self):
+        """统计插件所用数据库引擎上的 SQL 语句与连接签出，并记录慢查询"""
+        engine = get_session().get_bind(mapper=Marriage.__mapper__)
+        metrics.watch_engine(engine)
+        self.slow_queries.watch(engine)
+
+    @asynccontextmanager
+    async def unit_of_work(self) -> AsyncIterator[AsyncSession]:
+        """命令级工作单元：一条命令内的所有读写共用一个会话和一个事务
+
+        把返回的会话作为 session 参数传给管理器方法即可加入该事务。
+        正常退出或 matcher.finish() 等流程控制异常时提交，其他异常回滚；
+        其中任一管理器方法失败时整个工作单元回滚。提交成功后才会更新
+        内存索引、过期调度器等状态。
+        """
+        session = get_session()
+        async with session:
+            try:
+                yield session
+            except MatcherException:
+                await self._commit_unit(session)
+                raise
+            except BaseException:
+                await session.rollback()
+                self._run_hooks(session, committed=False)
+                raise
+            await self._commit_unit(session)
+
+    async def _commit_unit(self, session: AsyncSession):
+        # 工作单元中有方法抛过异常时，即使调用方吞掉了异常也整体回滚
+        if session.info.get("rollback_only"):
+            await session.rollback()
+            self._run_hooks(session, committed=False)
+            return
+        try:
+            await session.commit()
+        except BaseException:
+            # 提交本身失败（唯一约束冲突、数据库被锁等）也要撤销提前生效的状态
+            self._run_hooks(session, committed=False)
+            raise
+        self._run_hooks(session, committed=True)
+
+    @asynccontextmanager
+    async def _transaction(
+        self, session: Optional[AsyncSession] = None
+    ) -> AsyncIterator[AsyncSession]:
+        """加入调用方的工作单元；未传入会话时单独开启一个事务"""
+        if session is not None:
+            try:
+                yield session
+            except BaseException:
+                session.info["rollback_only"] = True
+                raise
+            return
+
+        session = get_session()
+        async with session:
+            try:
+                async with session.begin():
+                    yield session
+            except BaseException:
+                self._run_hooks(session, committed=False)
+                raise
+            self._run_hooks(session, committed=True)
+
+    @staticmethod
+    def _after_commit(session: AsyncSession, callback: Callable[[], None]):
+        """登记事务提交后才执行的内存状态更新，回滚时丢弃"""
+        session.info.setdefault("after_commit", []).append(callback)
+
+    @staticmethod
+    def _after_rollback(session: AsyncSession, callback: Callable[[], None]):
+        """登记事务回滚时撤销已提前生效的内存状态"""
+        session.info.setdefault("after_rollback", []).append(callback)
+
+    @staticmethod
+    def _run_hooks(session: AsyncSession, committed: bool):
+        after_commit = session.info.pop("after_commit", [])
+        after_rollback = session.info.pop("after_rollback", [])
+        for callback in after_commit if committed else after_rollback:
+            callback()
+
+    async def start_expiry_scheduler(self, notify):
+        """从数据库中的待处理请求重建过期调度器与待处理请求索引，并启动调度器"""
+        # 停机期间已经超时的请求一次性批量过期
+        expired = await self.cleanup_expired_requests()
+        if expired:
+            logger.info(f"🕒 清理了 {len(expired)} 个停机期间过期的结婚请求")
+            await notify(expired)
+
+        async with self._transaction() as session:
+            stmt = select(
+                MarriageRequest.request_id,
+                MarriageRequest.target_id,
+                MarriageRequest.group_id,
+                MarriageRequest.created_at,
+            ).where(
+                MarriageRequest.status == "pending",
+                MarriageRequest.generation == self.generation,
+            )
+            result = await session.execute(stmt)
+            pending = result.all()
+
+        self.expiry_scheduler.clear()
+        for request_id, _, _, created_at in pending:
+            self.expiry_scheduler.schedule(
+                request_id, created_at + timedelta(seconds=REQUEST_TIMEOUT)
+            )
+        self.pending_index.load(
+            (request_id, target_id, group_id)
+            for request_id, target_id, group_id, _ in pending
+        )
+        self.expiry_scheduler.start(notify)
+        logger.info(f"过期调度器已启动: {len(pending)} 个待处理请求")
+
+    async def close(self):
+        """释放管理器持有的连接等资源"""
+        if self._purge_task is not None:
+            self._stop_purge = True
+            await self._purge_task
+        await self.expiry_scheduler.stop()
+        await self.baby_process_manager.close()
+        await self.outbox.close()
+        await self.avatar_cache.close()
+
+    async def load_generation(self):
+        """读取当前代，其他加载步骤都依赖它"""
+        async with self._transaction() as session:
+            generation = await session.scalar(
+                select(PluginState.value).where(PluginState.key == GENERATION_KEY)
+            )
+            if generation is None:
+                generation = 0
+                session.add(PluginState(key=GENERATION_KEY, value=generation))
+
+        self.generation = generation
+        logger.info(f"当前数据代: {generation}")
+
+    async def load_marriage_index(self):
+        """从数据库加载所有有效婚姻到内存索引"""
+        async with self._transaction() as session:
+            stmt = (
+                select(Marriage)
+                .where(
+                    Marriage.status == "married",
+                    Marriage.generation == self.generation,
+                )
+                .order_by(Marriage.id)
+            )
+            result = await session.execute(stmt)
+            marriages = [marriage.to_dict() for marriage in result.scalars().all()]
+
+        self.marriage_index.load(marriages)
+        logger.info(f"婚姻索引已加载: {len(marriages)} 段婚姻")
+
+    async def load_rate_limits(self):
+        """用一次分组计数初始化今天每个用户的求婚次数"""
+        today_start = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+        async with self._transaction() as session:
+            stmt = (
+                select(MarriageRequest.proposer_id, func.count())
+                .where(
+                    MarriageRequest.created_at >= today_start,
+                    MarriageRequest.status.in_(["pending", "accepted"]),
+                    MarriageRequest.generation == self.generation,
+                )
+                .group_by(MarriageRequest.proposer_id)
+            )
+            counts = dict((await session.execute(stmt)).all())
+
+        self.rate_limiter.seed_daily("marry", counts)
+        logger.info(f"频率限制已初始化: 今天有 {len(counts)} 位用户求过婚")
+
+    def _refund_proposal(
+        self, session: AsyncSession, proposer_id: str, created_at: datetime
+    ):
+        """被拒绝或过期的请求不计入每日求婚次数"""
+        self._after_commit(
+            session,
+            lambda: self.rate_limiter.refund_daily(
+                "marry", proposer_id, created_at.date()
+            ),
+        )
+
+    def _close_request(self, session: AsyncSession, request_id: str):
+        """请求被接受、拒绝或过期：提交后移出过期调度器和待处理请求索引"""
+
+        def close():
+            self.expiry_scheduler.discard(request_id)
+            self.pending_index.discard(request_id)
+
+        self._after_commit(session, close)
+
+    def has_pending_request(self, target_id: str, group_id: str) -> bool:
+        """该用户在该群是否可能有待处理的请求，只查内存，供命令处理器提前返回"""
+        return self.pending_index.has(target_id, group_id)
 
     async def create_marriage_request(
         self,
@@ -24,17 +394,18 @@ class MarriageManager:
         target_id: str,
         target_name: str,
         group_id: str,
+        session: Optional[AsyncSession] = None,
     ) -> str:
         """创建结婚请求"""
 
-        if not await self.can_propose_today(proposer_id):
+        if not self.rate_limiter.take_daily("marry", proposer_id):
             raise ValueError("今天已经求过婚了，请明天再试吧！")
         request_id = (
             f"{proposer_id}_{target_id}_{group_id}_{int(datetime.now().timestamp())}"
         )
 
-        session = get_session()
-        async with session.begin():
+        created_at = datetime.now()
+        async with self._transaction(session) as session:
             marriage_request = MarriageRequest(
                 request_id=request_id,
                 proposer_id=proposer_id,
@@ -42,23 +413,39 @@ class MarriageManager:
                 target_id=target_id,
                 target_name=target_name,
                 group_id=group_id,
-                created_at=datetime.now(),
+                created_at=created_at,
                 status="pending",
+                generation=self.generation,
             )
             session.add(marriage_request)
+            self._after_rollback(
+                session, lambda: self.rate_limiter.refund_daily("marry", proposer_id)
+            )
+            self._after_commit(
+                session,
+                lambda: self.expiry_scheduler.schedule(
+                    request_id, created_at + timedelta(seconds=REQUEST_TIMEOUT)
+                ),
+            )
+            self._after_commit(
+                session,
+                lambda: self.pending_index.add(request_id, target_id, group_id),
+            )
 
         return request_id
 
-    async def get_pending_request(self, target_id: str, group_id: str) -> dict:
+    async def get_pending_request(
+        self, target_id: str, group_id: str, session: Optional[AsyncSession] = None
+    ) -> dict:
         """获取所有待处理的结婚请求"""
-        session = get_session()
-        async with session.begin():
+        async with self._transaction(session) as session:
             stmt = (
                 select(MarriageRequest)
                 .where(
                     MarriageRequest.target_id == target_id,
                     MarriageRequest.group_id == group_id,
                     MarriageRequest.status == "pending",
+                    MarriageRequest.generation == self.generation,
                 )
                 .order_by(MarriageRequest.created_at.desc())
             )
@@ -68,16 +455,18 @@ class MarriageManager:
 
             return request.to_dict() if request else None
 
-    async def get_pending_requests(self, target_id: str, group_id: str) -> List[dict]:
+    async def get_pending_requests(
+        self, target_id: str, group_id: str, session: Optional[AsyncSession] = None
+    ) -> List[dict]:
         """获取所有待处理的结婚请求，合并同一求婚者的请求（只保留最新的）"""
-        session = get_session()
-        async with session.begin():
+        async with self._transaction(session) as session:
             stmt = (
                 select(MarriageRequest)
                 .where(
                     MarriageRequest.target_id == target_id,
                     MarriageRequest.group_id == group_id,
                     MarriageRequest.status == "pending",
+                    MarriageRequest.generation == self.generation,
                 )
                 .order_by(MarriageRequest.created_at.desc())
             )
@@ -93,179 +482,300 @@ class MarriageManager:
 
             return list(merged_requests.values())
 
-    async def get_pending_request_by_id(self, request_id: str) -> Optional[dict]:
+    async def get_pending_request_by_id(
+        self, request_id: str, session: Optional[AsyncSession] = None
+    ) -> Optional[dict]:
         """根据ID获取结婚请求"""
-        session = get_session()
-        async with session.begin():
+        async with self._transaction(session) as session:
             stmt = select(MarriageRequest).where(
                 MarriageRequest.request_id == request_id,
                 MarriageRequest.status == "pending",
+                MarriageRequest.generation == self.generation,
             )
             result = await session.execute(stmt)
             request = result.scalar_one_or_none()
             return request.to_dict() if request else None
 
-    async def accept_marriage_request(self, request_id: str) -> bool:
-        """接受结婚请求"""
-        session = get_session()
-        async with session.begin():
-            # 获取请求
-            stmt = select(MarriageRequest).where(
-                MarriageRequest.request_id == request_id,
-                MarriageRequest.status == "pending",
-            )
-            result = await session.execute(stmt)
-            request = result.scalar_one_or_none()
+    async def accept_marriage_request(
+        self, request_id: str, session: Optional[AsyncSession] = None
+    ) -> bool:
+        """接受结婚请求
 
+        先用一条带条件的 UPDATE 把请求从 pending 改为 accepted，并发接受
+        同一请求时只有一方能改到；再插入婚姻记录，由“同一代中每对夫妻只有
+        一段有效婚姻”的唯一索引兜底，双方互相求婚后同时接受时只有一段婚姻
+        能插入成功，另一个请求改为拒绝并退还求婚次数。
+        """
+        async with self._transaction(session) as session:
+            stmt = (
+                update(MarriageRequest)
+                .where(
+                    MarriageRequest.request_id == request_id,
+                    MarriageRequest.status == "pending",
+                    MarriageRequest.generation == self.generation,
+                )
+                .values(status="accepted")
+                .returning(
+                    MarriageRequest.proposer_id,
+                    MarriageRequest.proposer_name,
+                    MarriageRequest.target_id,
+                    MarriageRequest.target_name,
+                    MarriageRequest.group_id,
+                    MarriageRequest.created_at,
+                )
+                .execution_options(synchronize_session=False)
+            )
+            request = (await session.execute(stmt)).first()
             if not request:
                 return False
 
-            # 检查双方是否已有婚姻
-            existing_marriage = await self.get_user_marriage(
-                request.target_id, request.proposer_id
+            self._close_request(session, request_id)
+
+            # 婚姻 ID 取自请求 ID（含时间戳），离婚后再次结婚不会与旧记录冲突
+            values = {
+                "marriage_id": f"marriage_{request_id}",
+                "proposer_id": request.proposer_id,
+                "proposer_name": request.proposer_name,
+                "target_id": request.target_id,
+                "target_name": request.target_name,
+                "group_id": request.group_id,
+                "pair_key": make_pair_key(request.proposer_id, request.target_id),
+                "married_at": datetime.now(),
+                "status": "married",
+                "generation": self.generation,
+            }
+            stmt = _insert_ignore(
+                session,
+                Marriage,
+                values,
+                index_elements=["pair_key", "generation"],
+                index_where=Marriage.status == "married",
             )
+            inserted = (await session.execute(stmt)).rowcount
 
-            if existing_marriage:
-                # 更新请求状态为拒绝
+            if not inserted:
+                # 两人已经结婚（或另一个请求抢先被接受）
                 stmt = (
                     update(MarriageRequest)
                     .where(MarriageRequest.request_id == request_id)
                     .values(status="rejected")
+                    .execution_options(synchronize_session=False)
                 )
                 await session.execute(stmt)
+                self._refund_proposal(session, request.proposer_id, request.created_at)
                 return False
 
-            # 创建婚姻记录
-            marriage_id = f"marriage_{request.proposer_id}_{request.target_id}"
-            marriage = Marriage(
-                marriage_id=marriage_id,
-                proposer_id=request.proposer_id,
-                proposer_name=request.proposer_name,
-                target_id=request.target_id,
-                target_name=request.target_name,
-                group_id=request.group_id,
-                married_at=datetime.now(),
-                status="married",
-            )
+            marriage_dict = dict(values, married_at=values["married_at"].isoformat())
+            # 事务提交后再写入索引
+            self._after_commit(session, lambda: self.marriage_index.add(marriage_dict))
 
-            # 更新请求状态
-            stmt = (
-                update(MarriageRequest)
-                .where(MarriageRequest.request_id == request_id)
-                .values(status="accepted")
-            )
-            await session.execute(stmt)
+        return True
 
-            session.add(marriage)
-            return True
-
-    async def reject_marriage_request(self, request_id: str) -> bool:
+    async def reject_marriage_request(
+        self, request_id: str, session: Optional[AsyncSession] = None
+    ) -> bool:
         """拒绝结婚请求"""
-        session = get_session()
-        async with session.begin():
+        async with self._transaction(session) as session:
             stmt = (
                 update(MarriageRequest)
                 .where(
                     MarriageRequest.request_id == request_id,
                     MarriageRequest.status == "pending",
+                    MarriageRequest.generation == self.generation,
                 )
                 .values(status="rejected")
+                .returning(MarriageRequest.proposer_id, MarriageRequest.created_at)
+                .execution_options(synchronize_session=False)
             )
 
-            result = await session.execute(stmt)
-            return result.rowcount > 0
+            rejected = (await session.execute(stmt)).first()
+            if rejected:
+                self._close_request(session, request_id)
+                self._refund_proposal(session, *rejected)
+
+        return rejected is not None
+
+    async def _expire_pending(self, session: AsyncSession, *conditions) -> List[dict]:
+        """将当前代中满足条件的待处理请求标记为过期，返还求婚次数并移出索引
+
+        返回被过期的请求（含群号，便于通知）
+        """
+        stmt = (
+            update(MarriageRequest)
+            .where(
+                MarriageRequest.status == "pending",
+                MarriageRequest.generation == self.generation,
+                *conditions,
+            )
+            .values(status="expired")
+            .returning(
+                MarriageRequest.request_id,
+                MarriageRequest.proposer_id,
+                MarriageRequest.proposer_name,
+                MarriageRequest.target_id,
+                MarriageRequest.target_name,
+                MarriageRequest.group_id,
+                MarriageRequest.created_at,
+            )
+            .execution_options(synchronize_session=False)
+        )
+        result = await session.execute(stmt)
+        expired_requests = [dict(row._mapping) for row in result]
+        for request in expired_requests:
+            self._refund_proposal(
+                session, request["proposer_id"], request["created_at"]
+            )
+            self._close_request(session, request["request_id"])
+        return expired_requests
+
+    async def expire_requests(
+        self, request_ids: List[str], session: Optional[AsyncSession] = None
+    ) -> List[dict]:
+        """批量将仍在等待中的请求标记为过期，返回实际过期的请求"""
+        async with self._transaction(session) as session:
+            return await self._expire_pending(
+                session, MarriageRequest.request_id.in_(request_ids)
+            )
 
-    async def get_user_marriage(self, user_id: str, spouse_id: str) -> Optional[dict]:
+    async def get_user_marriage(
+        self, user_id: str, spouse_id: str, session: Optional[AsyncSession] = None
+    ) -> Optional[dict]:
         """获取用户的婚姻关系"""
-        session = get_session()
-        async with session.begin():
+        if self.marriage_index.loaded:
+            return self.marriage_index.get(user_id, spouse_id)
+
+        async with self._transaction(session) as session:
             stmt = select(Marriage).where(
-                (
-                    (Marriage.proposer_id == user_id)
-                    & (Marriage.target_id == spouse_id)
-                    | (Marriage.proposer_id == spouse_id)
-                    & (Marriage.target_id == user_id)
-                ),
+                Marriage.pair_key == make_pair_key(user_id, spouse_id),
                 Marriage.status == "married",
+                Marriage.generation == self.generation,
             )
             result = await session.execute(stmt)
             marriage = result.scalar_one_or_none()
             return marriage.to_dict() if marriage else None
 
-    async def get_user_marriages(self, user_id: str) -> List[dict]:
+    async def get_user_marriages(
+        self, user_id: str, session: Optional[AsyncSession] = None
+    ) -> List[dict]:
         """获取用户的所有婚姻关系"""
-        session = get_session()
-        async with session.begin():
+        if self.marriage_index.loaded:
+            return self.marriage_index.get_all(user_id)
+
+        async with self._transaction(session) as session:
             stmt = select(Marriage).where(
                 (Marriage.proposer_id == user_id) | (Marriage.target_id == user_id),
                 Marriage.status == "married",
+                Marriage.generation == self.generation,
             )
             result = await session.execute(stmt)
             marriages = result.scalars().all()
             return [marriage.to_dict() for marriage in marriages]
 
-    async def divorce_with_spouse(self, user_id: str, spouse_id: str) -> bool:
+    async def divorce_with_spouse(
+        self, user_id: str, spouse_id: str, session: Optional[AsyncSession] = None
+    ) -> bool:
         """与指定配偶离婚"""
-        session = get_session()
-        async with session.begin():
-            stmt = select(Marriage).where(
-                (
-                    (Marriage.proposer_id == user_id)
-                    & (Marriage.target_id == spouse_id)
-                    | (Marriage.proposer_id == spouse_id)
-                    & (Marriage.target_id == user_id)
-                ),
-                Marriage.status == "married",
-            )
-            result = await session.execute(stmt)
-            marriage = result.scalar_one_or_none()
-
-            if marriage:
-                stmt = (
-                    update(Marriage)
-                    .where(Marriage.marriage_id == marriage.marriage_id)
-                    .values(status="divorced")
+        async with self._transaction(session) as session:
+            # 同一代中每对夫妻最多一段有效婚姻，一条带条件的 UPDATE 即可
+            stmt = (
+                update(Marriage)
+                .where(
+                    Marriage.pair_key == make_pair_key(user_id, spouse_id),
+                    Marriage.status == "married",
+                    Marriage.generation == self.generation,
                 )
-                await session.execute(stmt)
-                return True
-            return False
-
-    async def cleanup_expired_requests(self):
-        """清理过期的请求"""
-        session = get_session()
-        async with session.begin():
-            expired_time = datetime.now() - timedelta(seconds=120)
-            stmt = select(MarriageRequest).where(
-                MarriageRequest.status == "pending",
-                MarriageRequest.created_at < expired_time,
+                .values(status="divorced")
+                .execution_options(synchronize_session=False)
             )
-            result = await session.execute(stmt)
-            expired_requests = result.scalars().all()
+            if not (await session.execute(stmt)).rowcount:
+                return False
 
-            for request in expired_requests:
-                stmt = (
-                    update(MarriageRequest)
-                    .where(MarriageRequest.id == request.id)
-                    .values(status="expired")
-                )
-                await session.execute(stmt)
+            self._after_commit(
+                session, lambda: self.marriage_index.remove(user_id, spouse_id)
+            )
 
-            return len(expired_requests)
+        return True
 
-    async def daily_reset_all_data(self):
-        """每日零点清空所有结婚数据，包括宝宝记录"""
-        session = get_session()
-        async with session.begin():
-            # 删除所有婚姻记录
-            stmt_marriages = delete(Marriage)
-            await session.execute(stmt_marriages)
+    async def cleanup_expired_requests(
+        self, session: Optional[AsyncSession] = None
+    ) -> List[dict]:
+        """将所有超时的待处理请求标记为过期，返回被过期的请求（含群号，便于通知）"""
+        async with self._transaction(session) as session:
+            expired_time = datetime.now() - timedelta(seconds=REQUEST_TIMEOUT)
+            return await self._expire_pending(
+                session, MarriageRequest.created_at < expired_time
+            )
 
-            # 删除所有结婚请求记录
-            stmt_requests = delete(MarriageRequest)
-            await session.execute(stmt_requests)
+    async def daily_reset_all_data(self, session: Optional[AsyncSession] = None):
+        """每日零点清空所有婚姻和请求（宝宝记录保留）
 
-            logger.info("✅ 每日清空：婚姻记录、请求记录已清空")
-            return True
+        只把当前代加一，之后的读取不再看到旧代的数据；旧代的行由
+        purge_old_generations 在后台分批删除，不会长时间占用写锁。
+        """
+        async with self._transaction(session) as session:
+            stmt = (
+                update(PluginState)
+                .where(PluginState.key == GENERATION_KEY)
+                .values(value=PluginState.value + 1)
+                .returning(PluginState.value)
+                .execution_options(synchronize_session=False)
+            )
+            generation = await session.scalar(stmt)
+            if generation is None:
+                generation = self.generation + 1
+                session.add(PluginState(key=GENERATION_KEY, value=generation))
+
+            self._after_commit(session, lambda: setattr(self, "generation", generation))
+            self._after_commit(session, self.marriage_index.clear)
+            self._after_commit(session, self.expiry_scheduler.clear)
+            self._after_commit(session, self.pending_index.clear)
+            self._after_commit(session, self.rate_limiter.clear_daily)
+            self._after_commit(session, self.start_purge)
+
+        logger.info(f"✅ 每日清空：已切换到第 {generation} 代，旧数据将在后台删除")
+        return True
+
+    def start_purge(self):
+        """在后台删除旧代数据，已经在运行时不重复启动"""
+        if self._purge_task is None or self._purge_task.done():
+            self._purge_task = asyncio.create_task(self.purge_old_generations())
+
+    async def purge_old_generations(self) -> int:
+        """分批删除旧代的婚姻和请求，每批一个短事务，批与批之间让出事件循环
+
+        Returns:
+            删除的行数
+        """
+        chunk = plugin_config.marryme_purge_chunk
+        purged = 0
+        for model in (MarriageRequest, Marriage):
+            while not self._stop_purge:
+                try:
+                    async with self._transaction() as session:
+                        stmt = (
+                            select(model.id)
+                            .where(model.generation < self.generation)
+                            .limit(chunk)
+                        )
+                        ids = (await session.scalars(stmt)).all()
+                        if ids:
+                            await session.execute(
+                                delete(model)
+                                .where(model.id.in_(ids))
+                                .execution_options(synchronize_session=False)
+                            )
+                except Exception as e:
+                    logger.error(f"删除旧代数据失败: {e}")
+                    return purged
+
+                purged += len(ids)
+                if len(ids) < chunk:
+                    break
+                await asyncio.sleep(plugin_config.marryme_purge_pause)
+
+        if purged:
+            logger.info(f"🧹 已删除 {purged} 行旧代的婚姻和请求数据")
+        return purged
 
     async def download_avatar_as_image(
         self, avatar_url: str
@@ -275,184 +785,200 @@ class MarriageManager:
             return None
 
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.get(avatar_url) as resp:
-                    if resp.status != 200:
-                        return None
-
-                    content = await resp.read()
-                    # 检查文件大小（例如限制为15MB）
-                    if len(content) > 15 * 1024 * 1024:
-                        return None
-
-                    # 创建图片消息段
-                    return MessageSegment.image(content)
-
+            content = await self.avatar_cache.fetch(avatar_url)
         except Exception as e:
             logger.error(f"下载头像失败: {e}")
             return None
 
-    async def can_propose_today(self, proposer_id: str) -> bool:
-        """检查今天是否已经求过婚"""
-        session = get_session()
-        async with session.begin():
-            # 获取今天的日期范围
-            today_start = datetime.now().replace(
-                hour=0, minute=0, second=0, microsecond=0
-            )
-            today_end = today_start + timedelta(days=1)
-
-            stmt = select(MarriageRequest).where(
-                MarriageRequest.proposer_id == proposer_id,
-                MarriageRequest.created_at >= today_start,
-                MarriageRequest.created_at < today_end,
-                MarriageRequest.status.in_(
-                    ["pending", "accepted"]
-                ),  # 包括待处理和已接受的请求
-            )
-
-            result = await session.execute(stmt)
-            existing_requests = result.scalars().all()
+        if content is None:
+            return None
 
-            # 如果今天已经有求婚记录，返回False
-            return len(existing_requests) <= 3
-
-    async def have_baby(self, user_id: str, group_id: str, baby_count: int = 1) -> dict:
-        """生宝宝"""
-        session = get_session()
-        async with session.begin():
-            # 查找用户的有效婚姻
-            stmt = select(Marriage).where(
-                (Marriage.proposer_id == user_id) | (Marriage.target_id == user_id),
-                Marriage.status == "married",
-            )
-            result = await session.execute(stmt)
-            marriages = result.scalars().all()
+        # 创建图片消息段
+        return MessageSegment.image(content)
 
+    async def have_baby(
+        self,
+        user_id: str,
+        group_id: str,
+        baby_count: int = 1,
+        session: Optional[AsyncSession] = None,
+    ) -> dict:
+        """与第一段有效婚姻的配偶生宝宝，数量累加到这对夫妻的宝宝记录上"""
+        async with self._transaction(session) as session:
+            marriages = await self.get_user_marriages(user_id, session=session)
             if not marriages:
                 raise ValueError("你还没有结婚，不能生宝宝哦！")
 
-            # 使用第一个有效婚姻
             marriage = marriages[0]
-
-            # 确定父母信息
-            if marriage.proposer_id == user_id:
-                parent1_id = marriage.proposer_id
-                parent1_name = marriage.proposer_name
-                parent2_id = marriage.target_id
-                parent2_name = marriage.target_name
-            else:
-                parent1_id = marriage.target_id
-                parent1_name = marriage.target_name
-                parent2_id = marriage.proposer_id
-                parent2_name = marriage.proposer_name
-
-            # 创建宝宝记录
-            baby_record = BabyRecord(
-                marriage_id=marriage.marriage_id,
-                parent1_id=parent1_id,
-                parent1_name=parent1_name,
-                parent2_id=parent2_id,
-                parent2_name=parent2_name,
-                baby_count=baby_count,
-                group_id=group_id,
+            spouse_id = (
+                marriage["target_id"]
+                if marriage["proposer_id"] == user_id
+                else marriage["proposer_id"]
             )
-            session.add(baby_record)
-
-            return {
-                "parent1_name": parent1_name,
-                "parent2_name": parent2_name,
+            birth = {
+                "user_id": user_id,
+                "spouse_id": spouse_id,
+                "group_id": group_id,
                 "baby_count": baby_count,
-                "total_babies": await self.get_total_babies(user_id),
             }
+            (result,) = await self.have_babies_with_spouses([birth], session=session)
+            result["total_babies"] = await self._read_baby_total(
+                session, "user", user_id
+            )
+            return result
 
     async def have_baby_with_spouse(
-        self, user_id: str, spouse_id: str, group_id: str, baby_count: int = 1
+        self,
+        user_id: str,
+        spouse_id: str,
+        group_id: str,
+        baby_count: int = 1,
+        session: Optional[AsyncSession] = None,
     ) -> dict:
         """与指定配偶生宝宝"""
-        session = get_session()
-        async with session.begin():
-            # 查找与指定配偶的婚姻关系
-            stmt = select(Marriage).where(
-                (
-                    (Marriage.proposer_id == user_id)
-                    & (Marriage.target_id == spouse_id)
-                    | (Marriage.proposer_id == spouse_id)
-                    & (Marriage.target_id == user_id)
-                ),
-                Marriage.status == "married",
-            )
-            result = await session.execute(stmt)
-            marriage = result.scalar()
+        birth = {
+            "user_id": user_id,
+            "spouse_id": spouse_id,
+            "group_id": group_id,
+            "baby_count": baby_count,
+        }
+        (result,) = await self.have_babies_with_spouses([birth], session=session)
+        if result is None:
+            raise ValueError("你与指定的用户没有婚姻关系，不能生宝宝哦！")
+        return result
+
+    async def have_babies_with_spouses(
+        self, births: List[dict], session: Optional[AsyncSession] = None
+    ) -> List[Optional[dict]]:
+        """批量生宝宝，语句数量与夫妻对数无关
 
-            if not marriage:
-                raise ValueError("你与指定的用户没有婚姻关系，不能生宝宝哦！")
+        Args:
+            births: 每项为 {user_id, spouse_id, group_id, baby_count}，夫妻不能重复
 
-            # 确定父母信息
-            if marriage.proposer_id == user_id:
-                parent1_id = marriage.proposer_id
-                parent1_name = marriage.proposer_name
-                parent2_id = marriage.target_id
-                parent2_name = marriage.target_name
+        Returns:
+            与 births 一一对应的结果，没有婚姻关系的夫妻为 None
+        """
+        pair_keys = [make_pair_key(b["user_id"], b["spouse_id"]) for b in births]
+
+        async with self._transaction(session) as session:
+            # 查找这些夫妻的婚姻关系，索引已加载时不访问数据库
+            marriages = {}
+            if self.marriage_index.loaded:
+                for birth, pair_key in zip(births, pair_keys):
+                    marriage = self.marriage_index.get(
+                        birth["user_id"], birth["spouse_id"]
+                    )
+                    if marriage:
+                        marriages[pair_key] = marriage
             else:
-                parent1_id = marriage.target_id
-                parent1_name = marriage.target_name
-                parent2_id = marriage.proposer_id
-                parent2_name = marriage.proposer_name
+                stmt = select(Marriage).where(
+                    Marriage.pair_key.in_(pair_keys),
+                    Marriage.status == "married",
+                    Marriage.generation == self.generation,
+                )
+                for marriage in (await session.execute(stmt)).scalars():
+                    marriages.setdefault(marriage.pair_key, marriage.to_dict())
+
+            results = []
+            records = []
+            deltas = Counter()
+            now = datetime.now()
+            for birth, pair_key in zip(births, pair_keys):
+                marriage = marriages.get(pair_key)
+                if not marriage:
+                    results.append(None)
+                    continue
+
+                user_id, baby_count = birth["user_id"], birth["baby_count"]
+                # 确定父母信息
+                if marriage["proposer_id"] == user_id:
+                    parent1_id = marriage["proposer_id"]
+                    parent1_name = marriage["proposer_name"]
+                    parent2_id = marriage["target_id"]
+                    parent2_name = marriage["target_name"]
+                else:
+                    parent1_id = marriage["target_id"]
+                    parent1_name = marriage["target_name"]
+                    parent2_id = marriage["proposer_id"]
+                    parent2_name = marriage["proposer_name"]
+
+                records.append(
+                    {
+                        "marriage_id": marriage["marriage_id"],
+                        "parent1_id": parent1_id,
+                        "parent1_name": parent1_name,
+                        "parent2_id": parent2_id,
+                        "parent2_name": parent2_name,
+                        "pair_key": pair_key,
+                        "baby_count": baby_count,
+                        "group_id": birth["group_id"],
+                        "created_at": now,
+                    }
+                )
 
-            # 查找这对夫妻的宝宝记录
-            baby_stmt = (
-                select(BabyRecord)
-                .where(
-                    (
-                        (BabyRecord.parent1_id == user_id)
-                        & (BabyRecord.parent2_id == spouse_id)
-                    )
-                    | (
-                        (BabyRecord.parent1_id == spouse_id)
-                        & (BabyRecord.parent2_id == user_id)
-                    )
+                deltas["user", parent1_id] += baby_count
+                deltas["user", parent2_id] += baby_count
+                deltas["pair", pair_key] += baby_count
+                results.append(
+                    {
+                        "parent1_name": parent1_name,
+                        "parent2_name": parent2_name,
+                        "baby_count": baby_count,
+                        "pair_key": pair_key,
+                    }
                 )
-                .order_by(BabyRecord.created_at)
-            )
 
-            baby_result = await session.execute(baby_stmt)
-            baby_records = baby_result.scalars().all()
+            if records:
+                await self._add_to_baby_records(session, records)
+            if deltas:
+                # 这些夫妻生完这次后的宝宝总数
+                totals = await self._apply_baby_totals(session, deltas)
+                for result in results:
+                    if result is not None:
+                        result["total_babies"] = totals["pair", result["pair_key"]]
 
-            if baby_records:
-                # 总是使用最早创建的记录进行更新（作为主记录）
-                main_baby_record = baby_records[0]
-                main_baby_record.baby_count += baby_count
-                # 更新父母信息到主记录
-                main_baby_record.parent1_name = parent1_name
-                main_baby_record.parent2_name = parent2_name
-                # 更新群组信息（使用最新的群组）
-                main_baby_record.group_id = group_id
-                main_baby_record.created_at = datetime.now(timezone.utc)
-            else:
-                # 如果没有记录，创建新记录
-                main_baby_record = BabyRecord(
-                    marriage_id=marriage.marriage_id,
-                    parent1_id=parent1_id,
-                    parent1_name=parent1_name,
-                    parent2_id=parent2_id,
-                    parent2_name=parent2_name,
-                    baby_count=baby_count,
-                    group_id=group_id,
-                )
-                session.add(main_baby_record)
+        return results
 
-            # 获取总宝宝数量（使用你的现有方法）
-            total_babies = await self.get_total_babies(user_id, spouse_id)
+    async def _add_to_baby_records(self, session, records: List[dict]):
+        """每对夫妻只有一条宝宝记录：一条 upsert 新建或累加
 
-            return {
-                "parent1_name": parent1_name,
-                "parent2_name": parent2_name,
-                "baby_count": baby_count,
-                "total_babies": total_babies,
-            }
+        冲突时数量在数据库中累加，群组与时间取这一次的；父母名字按记录中
+        已有的父母 ID 对应写入，由配偶一方发起时不会把两人的名字写反。
+        同一条语句中每对夫妻只能出现一次。
+        """
+        stmt = _upsert(
+            session,
+            BabyRecord,
+            records,
+            ["pair_key"],
+            lambda inserted: {
+                "baby_count": BabyRecord.baby_count + inserted.baby_count,
+                "parent1_name": case(
+                    (
+                        BabyRecord.parent1_id == inserted.parent1_id,
+                        inserted.parent1_name,
+                    ),
+                    else_=inserted.parent2_name,
+                ),
+                "parent2_name": case(
+                    (
+                        BabyRecord.parent2_id == inserted.parent2_id,
+                        inserted.parent2_name,
+                    ),
+                    else_=inserted.parent1_name,
+                ),
+                "group_id": inserted.group_id,
+                "created_at": inserted.created_at,
+            },
+        )
+        await session.execute(stmt)
 
-    async def get_total_babies(self, user_id: str, spouse_id: str = None) -> int:
+    async def get_total_babies(
+        self,
+        user_id: str,
+        spouse_id: str = None,
+        session: Optional[AsyncSession] = None,
+    ) -> int:
         """获取宝宝总数量
 
         Args:
@@ -461,35 +987,167 @@ class MarriageManager:
                 - 如果提供：查询这对夫妻共同生育的宝宝总数量
                 - 如果不提供：查询该用户所有宝宝数量（包括与不同伴侣生育的）
         """
-        session = get_session()
-        async with session.begin():
-            if spouse_id:
-                # 查询这对夫妻共同生育的宝宝总数量
-                stmt = select(func.sum(BabyRecord.baby_count)).where(
-                    (
-                        (BabyRecord.parent1_id == user_id)
-                        & (BabyRecord.parent2_id == spouse_id)
-                    )
-                    | (
-                        (BabyRecord.parent1_id == spouse_id)
-                        & (BabyRecord.parent2_id == user_id)
-                    )
-                )
+        if spouse_id:
+            # 这对夫妻共同生育的宝宝总数量
+            kind, owner_key = "pair", make_pair_key(user_id, spouse_id)
+        else:
+            # 该用户所有宝宝数量（包括与不同伴侣生育的）
+            kind, owner_key = "user", user_id
+
+        async with self._transaction(session) as session:
+            return await self._read_baby_total(session, kind, owner_key)
+
+    async def _read_baby_total(self, session, kind: str, owner_key: str) -> int:
+        stmt = select(BabyTotal.total).where(
+            BabyTotal.kind == kind, BabyTotal.owner_key == owner_key
+        )
+        return await session.scalar(stmt) or 0
+
+    async def _apply_baby_totals(
+        self, session, deltas: Dict[tuple, int]
+    ) -> Dict[tuple, int]:
+        """按 (kind, owner_key) -> 增量 一次性更新宝宝汇总，返回更新后的总数
+
+        同一条 upsert 语句中每个键只能出现一次，所以由调用方先合并增量。
+        """
+        now = datetime.now()
+        rows = [
+            {"kind": kind, "owner_key": owner_key, "total": total, "updated_at": now}
+            for (kind, owner_key), total in deltas.items()
+        ]
+        stmt = _upsert(
+            session,
+            BabyTotal,
+            rows,
+            ["kind", "owner_key"],
+            lambda inserted: {
+                "total": BabyTotal.total + inserted.total,
+                "updated_at": inserted.updated_at,
+            },
+        ).returning(BabyTotal.kind, BabyTotal.owner_key, BabyTotal.total)
+        result = await session.execute(stmt)
+        return {(kind, owner_key): total for kind, owner_key, total in result}
+
+    async def get_baby_leaderboard(
+        self,
+        limit: int = 10,
+        kind: str = "user",
+        session: Optional[AsyncSession] = None,
+    ) -> List[dict]:
+        """宝宝数量排行榜（kind 为 user 或 pair）
+
+        每行的 names 为 owner_key 中各用户的名字，取自宝宝记录中保存的
+        父母名字（同一用户取最近一条记录），没有记录时为用户 ID。
+        """
+        async with self._transaction(session) as session:
+            stmt = (
+                select(BabyTotal)
+                .where(BabyTotal.kind == kind, BabyTotal.total > 0)
+                .order_by(BabyTotal.total.desc())
+                .limit(limit)
+            )
+            result = await session.execute(stmt)
+            leaderboard = [row.to_dict() for row in result.scalars().all()]
+            if not leaderboard:
+                return []
+
+            owner_keys = [row["owner_key"] for row in leaderboard]
+            if kind == "pair":
+                condition = BabyRecord.pair_key.in_(owner_keys)
             else:
-                # 查询该用户所有宝宝数量（包括与不同伴侣生育的）
-                stmt = select(func.sum(BabyRecord.baby_count)).where(
-                    (BabyRecord.parent1_id == user_id)
-                    | (BabyRecord.parent2_id == user_id)
+                is_parent1 = BabyRecord.parent1_id.in_(owner_keys)
+                condition = is_parent1 | BabyRecord.parent2_id.in_(owner_keys)
+            stmt = (
+                select(
+                    BabyRecord.parent1_id,
+                    BabyRecord.parent1_name,
+                    BabyRecord.parent2_id,
+                    BabyRecord.parent2_name,
                 )
+                .where(condition)
+                .order_by(BabyRecord.created_at)
+            )
+            names = {}
+            for parent1_id, parent1_name, parent2_id, parent2_name in (
+                await session.execute(stmt)
+            ).all():
+                names[parent1_id] = parent1_name or names.get(parent1_id)
+                names[parent2_id] = parent2_name or names.get(parent2_id)
 
-            result = await session.execute(stmt)
-            total = result.scalar() or 0
-            return total
+        for row in leaderboard:
+            row["names"] = [
+                names.get(user_id) or user_id for user_id in row["owner_key"].split("&")
+            ]
+        return leaderboard
+
+    async def rebuild_baby_totals(
+        self, repair: bool = True, session: Optional[AsyncSession] = None
+    ) -> int:
+        """根据宝宝记录重新计算汇总表
+
+        Args:
+            repair: 为 False 时只校验不修改
+
+        Returns:
+            与宝宝记录不一致的汇总条数
+        """
+        async with self._transaction(session) as session:
+            expected = {}
+
+            pair_stmt = select(
+                BabyRecord.pair_key, func.sum(BabyRecord.baby_count)
+            ).group_by(BabyRecord.pair_key)
+            for pair_key, total in await session.execute(pair_stmt):
+                expected[("pair", pair_key)] = total or 0
+
+            parents = union_all(
+                select(
+                    BabyRecord.parent1_id.label("user_id"),
+                    BabyRecord.baby_count.label("baby_count"),
+                ),
+                select(BabyRecord.parent2_id, BabyRecord.baby_count),
+            ).subquery()
+            user_stmt = select(
+                parents.c.user_id, func.sum(parents.c.baby_count)
+            ).group_by(parents.c.user_id)
+            for user_id, total in await session.execute(user_stmt):
+                expected[("user", user_id)] = total or 0
+
+            actual = {
+                (row.kind, row.owner_key): row.total
+                for row in (await session.execute(select(BabyTotal))).scalars()
+            }
+
+            drift = [
+                key
+                for key in expected.keys() | actual.keys()
+                if expected.get(key, 0) != actual.get(key, 0)
+            ]
+
+            if repair and drift:
+                now = datetime.now()
+                await session.execute(delete(BabyTotal))
+                if expected:
+                    await session.execute(
+                        BabyTotal.__table__.insert(),
+                        [
+                            {
+                                "kind": kind,
+                                "owner_key": owner_key,
+                                "total": total,
+                                "updated_at": now,
+                            }
+                            for (kind, owner_key), total in expected.items()
+                        ],
+                    )
 
-    async def get_baby_records(self, user_id: str) -> List[dict]:
+        return len(drift)
+
+    async def get_baby_records(
+        self, user_id: str, session: Optional[AsyncSession] = None
+    ) -> List[dict]:
         """获取用户的宝宝记录"""
-        session = get_session()
-        async with session.begin():
+        async with self._transaction(session) as session:
             stmt = (
                 select(BabyRecord)
                 .where(
@@ -503,6 +1161,107 @@ class MarriageManager:
             records = result.scalars().all()
             return [record.to_dict() for record in records]
 
+    async def get_baby_pairs_page(
+        self,
+        user_id: str,
+        page: int = 1,
+        page_size: int = 5,
+        cursor: Optional[str] = None,
+        session: Optional[AsyncSession] = None,
+    ) -> dict:
+        """按夫妻分页获取用户的宝宝记录（每对夫妻一条记录）
+
+        按最近生宝宝的时间倒序（相同时间按夫妻键）排列。计数、分页与宝宝
+        总数在一条 SQL 中完成。cursor 为上一页返回的 next_cursor，
+        带上时使用 keyset 分页，任意页的代价与第一页相同；没有游标
+        （直接跳页）或游标无效时退回 OFFSET。
+
+        Returns:
+            {"pairs": 当前页, "total_pairs": 夫妻组合总数, "total_babies": 宝宝总数,
+             "next_cursor": 下一页的游标（没有下一页时为 None）}
+        """
+        is_parent1 = BabyRecord.parent1_id == user_id
+        owned = is_parent1 | (BabyRecord.parent2_id == user_id)
+        conditions = [owned]
+        position = _decode_page_cursor(user_id, cursor) if page > 1 else None
+        if position:
+            created_at, pair_key = position
+            conditions.append(
+                (BabyRecord.created_at < created_at)
+                | (
+                    (BabyRecord.created_at == created_at)
+                    & (BabyRecord.pair_key > pair_key)
+                )
+            )
+        offset = 0 if page == 1 or position else (page - 1) * page_size
+
+        total_pairs = (
+            select(func.count()).select_from(BabyRecord).where(owned).scalar_subquery()
+        )
+        total_babies = (
+            select(BabyTotal.total)
+            .where(BabyTotal.kind == "user", BabyTotal.owner_key == user_id)
+            .scalar_subquery()
+        )
+        stmt = (
+            select(
+                BabyRecord.pair_key,
+                case(
+                    (is_parent1, BabyRecord.parent1_name),
+                    else_=BabyRecord.parent2_name,
+                ).label("user_name"),
+                case(
+                    (is_parent1, BabyRecord.parent2_name),
+                    else_=BabyRecord.parent1_name,
+                ).label("partner_name"),
+                BabyRecord.baby_count,
+                BabyRecord.created_at.label("latest_date"),
+                # 不带游标条件统计，插入在游标之前的组合也计入总数
+                total_pairs.label("total_pairs"),
+                total_babies.label("total_babies"),
+            )
+            .where(*conditions)
+            .order_by(BabyRecord.created_at.desc(), BabyRecord.pair_key)
+            .offset(offset)
+            .limit(page_size)
+        )
+
+        async with self._transaction(session) as session:
+            rows = (await session.execute(stmt)).all()
+            if rows:
+                total = rows[0].total_babies or 0
+                count = rows[0].total_pairs
+            else:
+                # 页码超出范围时才需要单独计数
+                count = await session.scalar(select(total_pairs)) or 0
+                total = await self._read_baby_total(session, "user", user_id)
+
+        next_cursor = None
+        if len(rows) == page_size and page * page_size < count:
+            next_cursor = _encode_page_cursor(
+                user_id, rows[-1].latest_date, rows[-1].pair_key
+            )
+
+        return {
+            "pairs": [
+                {
+                    "pair_key": row.pair_key,
+                    "parent1_name": row.user_name,
+                    "parent2_name": row.partner_name,
+                    "baby_count": row.baby_count or 0,
+                    "latest_date": (
+                        row.latest_date.isoformat()
+                        if hasattr(row.latest_date, "isoformat")
+                        else row.latest_date
+                    ),
+                }
+                for row in rows
+            ],
+            "total_pairs": count,
+            "total_babies": total,
+            "next_cursor": next_cursor,
+        }
+
     async def set_user_preference(
         self,
         user_id: str,
@@ -510,44 +1269,64 @@ class MarriageManager:
         group_id: str,
         allow_marriage: bool = True,
         allow_baby: bool = True,
+        session: Optional[AsyncSession] = None,
     ):
-        """设置用户偏好"""
-        from sqlalchemy import select
-
-        session = get_session()
-        async with session.begin():
-            # 查找现有记录
-            stmt = select(UserPreference).where(
-                UserPreference.user_id == user_id, UserPreference.group_id == group_id
+        """设置用户偏好（按 user_id + group_id 插入或更新）"""
+        now = datetime.now()
+        async with self._transaction(session) as session:
+            stmt = _upsert(
+                session,
+                UserPreference,
+                [
+                    {
+                        "user_id": user_id,
+                        "user_name": user_name,
+                        "group_id": group_id,
+                        "allow_marriage": allow_marriage,
+                        "allow_baby": allow_baby,
+                        "created_at": now,
+                        "updated_at": now,
+                    }
+                ],
+                ["user_id", "group_id"],
+                lambda inserted: {
+                    "allow_marriage": inserted.allow_marriage,
+                    "allow_baby": inserted.allow_baby,
+                    "updated_at": inserted.updated_at,
+                },
             )
-            result = await session.scalar(stmt)
-
-            if result:
-                # 更新现有记录
-                result.allow_marriage = allow_marriage
-                result.allow_baby = allow_baby
-                result.updated_at = datetime.now()
-            else:
-                # 创建新记录
-                preference = UserPreference(
-                    user_id=user_id,
-                    user_name=user_name,
-                    group_id=group_id,
-                    allow_marriage=allow_marriage,
-                    allow_baby=allow_baby,
-                )
-                session.add(preference)
+            await session.execute(stmt)
 
-            await session.commit()
+            # 同一事务内随后的读取绕过缓存，避免读到旧值或缓存未提交的值
+            session.info["preference_dirty"] = True
+            self._after_commit(
+                session, lambda: self._invalidate_preference(user_id, group_id)
+            )
 
-    async def get_user_preference(self, user_id: str, group_id: str) -> dict:
-        """获取用户偏好"""
+    async def get_user_preference(
+        self, user_id: str, group_id: str, session: Optional[AsyncSession] = None
+    ) -> dict:
+        """获取用户偏好，结果（包括没有设置过偏好）会被缓存"""
         from sqlalchemy import select
 
-        session = get_session()
-        async with session.begin():
+        key = (str(user_id), str(group_id))
+        use_cache = session is None or not session.info.get("preference_dirty")
+        cached = self._preferences.get(key) if use_cache else MISSING
+        if cached is not MISSING:
+            return cached
+
+        version = self._preference_version
+        async with self._transaction(session) as session:
             stmt = select(UserPreference).where(
                 UserPreference.user_id == user_id, UserPreference.group_id == group_id
             )
             record = await session.scalar(stmt)
-            return record.to_dict() if record else None
+            preference = record.to_dict() if record else None
+
+        if use_cache and version == self._preference_version:
+            self._preferences.set(key, preference)
+        return preference
+
+    def _invalidate_preference(self, user_id: str, group_id: str):
+        self._preference_version += 1
+        self._preferences.pop((str(user_id), str(group_id)))
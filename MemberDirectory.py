@@ -0,0 +1,72 @@
+import time
+from typing import Dict, Optional
+
+from nonebot_plugin_uninfo import QryItrface, SceneType, User
+from loguru import logger
+
+from .Cache import LRUCache
+from .Metrics import metrics
+
+
+class MemberDirectory:
+    """按群缓存的群成员目录
+
+    每个群一份 user_id -> (User, 获取时间) 的字典，单个成员按 TTL 过期，
+    群之间按 LRU 淘汰。未命中时优先只拉取单个成员，接口不支持时再拉取整个群成员列表。
+    """
+
+    def __init__(self, ttl: float = 300, max_groups: int = 128):
+        self.ttl = ttl
+        self._groups = LRUCache(maxsize=max_groups)
+        self.hits = 0
+        self.misses = 0
+
+    def _get_group(self, group_id: str) -> Dict[str, tuple]:
+        members = self._groups.get(group_id, None)
+        if members is None:
+            members = {}
+            self._groups.set(group_id, members)
+        return members
+
+    async def get_member(
+        self, interface: QryItrface, group_id: str, user_id: str
+    ) -> Optional[User]:
+        """获取群成员信息，不在群中时返回 None"""
+        members = self._get_group(group_id)
+        cached = members.get(user_id)
+        if cached and time.monotonic() - cached[1] < self.ttl:
+            self.hits += 1
+            return cached[0]
+
+        self.misses += 1
+        try:
+            async with metrics.timer("external", "member"):
+                member = await interface.get_member(SceneType.GROUP, group_id, user_id)
+        except Exception as e:
+            logger.debug(f"获取单个群成员失败，改为刷新群成员列表: {e}")
+            await self.refresh(interface, group_id)
+            cached = self._get_group(group_id).get(user_id)
+            return cached[0] if cached else None
+
+        if not member:
+            members.pop(user_id, None)
+            return None
+
+        members[user_id] = (member.user, time.monotonic())
+        return member.user
+
+    async def refresh(self, interface: QryItrface, group_id: str):
+        """拉取整个群成员列表并刷新缓存"""
+        now = time.monotonic()
+        async with metrics.timer("external", "member_list"):
+            members = await interface.get_members(SceneType.GROUP, group_id)
+        self._groups.set(group_id, {m.user.id: (m.user, now) for m in members})
+
+    def invalidate(self, group_id: str, user_id: Optional[str] = None):
+        """使缓存失效"""
+        if user_id is None:
+            self._groups.pop(group_id)
+            return
+        members = self._groups.get(group_id, None)
+        if members:
+            members.pop(user_id, None)
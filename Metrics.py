@@ -0,0 +1,235 @@
+import functools
+import inspect
+import os
+import time
+from bisect import bisect_left
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, Optional, Tuple
+
+from nonebot.exception import MatcherException
+from sqlalchemy import event
+
+# 延迟直方图的桶上界（秒）
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+# 当前正在执行的被统计调用（最内层），如 "manager.accept_marriage_request"
+current_call: ContextVar[Optional[str]] = ContextVar("marryme_call", default=None)
+
+
+class Histogram:
+    """固定桶的延迟直方图"""
+
+    __slots__ = ("counts", "sum", "count")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(BUCKETS, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q: float) -> float:
+        """按桶上界估算分位数，落在最后一个桶时返回最大的桶上界"""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(BUCKETS, self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return BUCKETS[-1]
+
+
+class Metrics:
+    """插件内部的延迟、计数与实时状态统计
+
+    - 延迟：按 (类型, 名称) 记录直方图，类型为 handler（命令处理器）、
+      manager（管理器方法）、baby（生宝宝过程）、external（群成员接口、头像下载）
+    - 计数：调用失败次数、每个调用执行的 SQL 语句数、数据库连接签出次数
+    - 实时状态：由 gauge 注册的回调在导出时读取，如缓存命中数、进行中的过程数
+
+    导出为 Prometheus 文本格式，或由管理员命令查看摘要。
+    """
+
+    def __init__(self):
+        self.histograms: Dict[Tuple[str, str], Histogram] = {}
+        self.errors: Dict[Tuple[str, str], int] = {}
+        self.statements: Dict[str, int] = {}
+        self.connections = 0
+        self._gauges: Dict[str, Tuple[str, Dict[str, Callable[[], float]]]] = {}
+        self._engines = set()
+
+    def observe(self, kind: str, name: str, seconds: float):
+        histogram = self.histograms.get((kind, name))
+        if histogram is None:
+            histogram = self.histograms[kind, name] = Histogram()
+        histogram.observe(seconds)
+
+    def error(self, kind: str, name: str):
+        self.errors[kind, name] = self.errors.get((kind, name), 0) + 1
+
+    @asynccontextmanager
+    async def timer(self, kind: str, name: str):
+        """统计一段代码的耗时；期间执行的 SQL 语句计到这次调用上"""
+        token = current_call.set(f"{kind}.{name}")
+        started = time.perf_counter()
+        try:
+            yield
+        except MatcherException:
+            # finish() 等流程控制不算失败
+            raise
+        except BaseException:
+            self.error(kind, name)
+            raise
+        finally:
+            self.observe(kind, name, time.perf_counter() - started)
+            current_call.reset(token)
+
+    def timed(self, kind: str, name: Optional[str] = None):
+        """异步函数装饰器，保留原函数签名（命令处理器的依赖注入依赖它）"""
+
+        def decorator(func):
+            label = name or func.__name__
+
+            @functools.wraps(func)
+            async def wrapper(*args, **kwargs):
+                async with self.timer(kind, label):
+                    return await func(*args, **kwargs)
+
+            return wrapper
+
+        return decorator
+
+    def instrument(self, kind: str):
+        """类装饰器：统计类中定义的所有公开异步方法"""
+
+        def decorator(cls):
+            for attr, value in list(vars(cls).items()):
+                if attr.startswith("_") or not inspect.iscoroutinefunction(value):
+                    continue
+                setattr(cls, attr, self.timed(kind, attr)(value))
+            return cls
+
+        return decorator
+
+    def gauge(self, name: str, help_text: str, label: str, read: Callable[[], float]):
+        """注册一个导出时读取的实时值，如 gauge("marryme_cache_hits", ..., "avatar", fn)"""
+        self._gauges.setdefault(name, (help_text, {}))[1][label] = read
+
+    def watch_engine(self, engine):
+        """统计该引擎上执行的 SQL 语句与连接签出次数（同一引擎只注册一次）"""
+        if engine in self._engines:
+            return
+        self._engines.add(engine)
+
+        def before_cursor_execute(*_):
+            call = current_call.get() or "other"
+            self.statements[call] = self.statements.get(call, 0) + 1
+
+        def checkout(*_):
+            self.connections += 1
+
+        event.listen(engine, "before_cursor_execute", before_cursor_execute)
+        event.listen(engine, "checkout", checkout)
+
+    def render(self) -> str:
+        """Prometheus 文本格式"""
+        lines = [
+            "# HELP marryme_call_seconds 命令处理器、管理器方法与外部调用的耗时",
+            "# TYPE marryme_call_seconds histogram",
+        ]
+        for (kind, name), histogram in sorted(self.histograms.items()):
+            labels = f'kind="{kind}",name="{name}"'
+            cumulative = 0
+            for bound, count in zip(BUCKETS, histogram.counts):
+                cumulative += count
+                lines.append(
+                    f'marryme_call_seconds_bucket{{{labels},le="{bound}"}} {cumulative}'
+                )
+            lines.append(
+                f'marryme_call_seconds_bucket{{{labels},le="+Inf"}} {histogram.count}'
+            )
+            lines.append(f"marryme_call_seconds_sum{{{labels}}} {histogram.sum:.6f}")
+            lines.append(f"marryme_call_seconds_count{{{labels}}} {histogram.count}")
+
+        lines += [
+            "# HELP marryme_call_errors_total 抛出异常的调用次数",
+            "# TYPE marryme_call_errors_total counter",
+        ]
+        for (kind, name), count in sorted(self.errors.items()):
+            lines.append(
+                f'marryme_call_errors_total{{kind="{kind}",name="{name}"}} {count}'
+            )
+
+        lines += [
+            "# HELP marryme_db_statements_total 按调用统计的 SQL 语句数",
+            "# TYPE marryme_db_statements_total counter",
+        ]
+        for call, count in sorted(self.statements.items()):
+            lines.append(f'marryme_db_statements_total{{call="{call}"}} {count}')
+
+        lines += [
+            "# HELP marryme_db_connections_total 数据库连接签出次数（每个会话一次）",
+            "# TYPE marryme_db_connections_total counter",
+            f"marryme_db_connections_total {self.connections}",
+        ]
+
+        for name, (help_text, readers) in sorted(self._gauges.items()):
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} gauge"]
+            for label, read in sorted(readers.items()):
+                lines.append(f'{name}{{name="{label}"}} {read()}')
+
+        return "\n".join(lines) + "\n"
+
+    def write(self, path: str):
+        """原子地写入 Prometheus 文本文件（供 node_exporter textfile 采集）"""
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(self.render())
+        os.replace(tmp_path, path)
+
+    def summary(self, limit: int = 10) -> str:
+        """管理员命令使用的文字摘要"""
+        lines = ["📊 耗时最多的调用（次数 / 平均 / p95 / 失败 / SQL）:"]
+        ranked = sorted(
+            self.histograms.items(), key=lambda item: item[1].sum, reverse=True
+        )
+        for (kind, name), histogram in ranked[:limit]:
+            call = f"{kind}.{name}"
+            avg = histogram.sum / histogram.count * 1000
+            p95 = histogram.quantile(0.95) * 1000
+            lines.append(
+                f"{call}: {histogram.count} / {avg:.1f}ms / ≤{p95:g}ms"
+                f" / {self.errors.get((kind, name), 0)} / {self.statements.get(call, 0)}"
+            )
+
+        external = [
+            (name, histogram)
+            for (kind, name), histogram in self.histograms.items()
+            if kind == "external"
+        ]
+        if external:
+            lines.append("🌐 外部调用平均耗时:")
+            for name, histogram in sorted(external):
+                avg = histogram.sum / histogram.count * 1000
+                lines.append(f"{name}: {histogram.count} 次 / {avg:.1f}ms")
+
+        lines.append(
+            f"🗄️ SQL 语句 {sum(self.statements.values())} 条，连接签出 {self.connections} 次"
+        )
+        for name, (help_text, readers) in sorted(self._gauges.items()):
+            values = ", ".join(f"{label}={read():g}" for label, read in readers.items())
+            lines.append(f"{help_text}: {values}")
+        return "\n".join(lines)
+
+
+# 全局统计实例
+metrics = Metrics()
@@ -0,0 +1,189 @@
+import asyncio
+import time
+from collections import deque
+from typing import Deque, Dict, List, Optional, Tuple, Union
+
+from loguru import logger
+from nonebot import get_bot
+from nonebot.adapters.onebot.v11 import Message, MessageSegment
+
+from .RateLimiter import TokenBuckets
+
+# (入队时间, 消息, 发送用的机器人)
+OutboxItem = Tuple[float, Union[str, Message, MessageSegment], Optional[str]]
+
+# 发送耗时样本数量，用于计算分位数
+LATENCY_SAMPLES = 1024
+
+
+class Outbox:
+    """按群排队的通知发件箱
+
+    每个群一个队列和一个发送任务：第一条通知入队后等待 coalesce_window 秒，
+    窗口内同一机器人的通知合并成一条消息发送；每次发送前先后取群和全局的令牌，
+    避免在零点或批量结算后集中调用 OneBot 接口。机器人尚未连接时通知留在队列中，
+    连接后由 resume 继续发送；发送失败的通知放回队首，
+    按 retry_delay 的倍数逐次延后重试，重试 max_retries 次仍失败才丢弃。
+    """
+
+    def __init__(
+        self,
+        coalesce_window: float = 1.0,
+        max_coalesce: int = 10,
+        group_burst: int = 3,
+        group_interval: float = 2.0,
+        global_burst: int = 20,
+        global_interval: float = 0.2,
+        retry_delay: float = 5.0,
+        max_retries: int = 3,
+    ):
+        self.coalesce_window = coalesce_window
+        self.max_coalesce = max_coalesce
+        self.retry_delay = retry_delay
+        self.max_retries = max_retries
+        self._group_buckets = TokenBuckets(group_burst, group_interval)
+        self._global_bucket = TokenBuckets(global_burst, global_interval, maxsize=1)
+
+        self._queues: Dict[str, Deque[OutboxItem]] = {}
+        self._workers: Dict[str, asyncio.Task] = {}
+
+        # 统计
+        self.sent_messages = 0
+        self.sent_notices = 0
+        self.failed_notices = 0
+        self._latencies: Deque[float] = deque(maxlen=LATENCY_SAMPLES)
+        self._max_latency = 0.0
+
+    def put(
+        self,
+        group_id: str,
+        message: Union[str, Message, MessageSegment],
+        bot_id: Optional[str] = None,
+    ):
+        """加入一条群通知，不等待发送"""
+        queue = self._queues.setdefault(group_id, deque())
+        queue.append((time.monotonic(), message, bot_id))
+        self._start(group_id)
+
+    def resume(self):
+        """机器人连接后继续发送暂存的通知"""
+        for group_id, queue in self._queues.items():
+            if queue:
+                self._start(group_id)
+
+    def _start(self, group_id: str):
+        if group_id not in self._workers:
+            self._workers[group_id] = asyncio.create_task(self._run(group_id))
+
+    async def close(self):
+        """停止所有发送任务，未发送的通知丢弃"""
+        workers = list(self._workers.values())
+        for task in workers:
+            task.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+        self._workers.clear()
+
+    async def _run(self, group_id: str):
+        queue = self._queues[group_id]
+        failures = 0
+        try:
+            while queue:
+                # 等到第一条通知的合并窗口结束
+                delay = queue[0][0] + self.coalesce_window - time.monotonic()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+
+                bot_id = queue[0][2]
+                try:
+                    bot = get_bot(bot_id) if bot_id else get_bot()
+                except (KeyError, ValueError):
+                    # 机器人未连接，留在队列中等待 resume
+                    return
+
+                await self._acquire(group_id)
+                batch = self._take_batch(queue, bot_id)
+                if await self._send(bot, group_id, batch):
+                    failures = 0
+                    continue
+
+                failures += 1
+                if failures > self.max_retries:
+                    self.failed_notices += len(batch)
+                    logger.error(
+                        f"群 {group_id} 的 {len(batch)} 条通知连续 {failures} 次发送失败，已丢弃"
+                    )
+                    failures = 0
+                    continue
+
+                # 放回队首保持顺序，等待后重试
+                queue.extendleft(reversed(batch))
+                await asyncio.sleep(self.retry_delay * failures)
+        finally:
+            self._workers.pop(group_id, None)
+            if not queue:
+                self._queues.pop(group_id, None)
+
+    async def _acquire(self, group_id: str):
+        """依次取群和全局的令牌，不足时等待"""
+        for buckets, key in (
+            (self._group_buckets, group_id),
+            (self._global_bucket, ""),
+        ):
+            while True:
+                wait = buckets.take(key)
+                if not wait:
+                    break
+                await asyncio.sleep(wait)
+
+    def _take_batch(
+        self, queue: Deque[OutboxItem], bot_id: Optional[str]
+    ) -> List[OutboxItem]:
+        """取出队首连续的、由同一机器人发送的通知"""
+        batch = []
+        while queue and len(batch) < self.max_coalesce and queue[0][2] == bot_id:
+            batch.append(queue.popleft())
+        return batch
+
+    async def _send(self, bot, group_id: str, batch: List[OutboxItem]) -> bool:
+        """合并发送一批通知，返回是否成功"""
+        message = Message()
+        for i, (_, notice, _) in enumerate(batch):
+            if i:
+                message += "\n"
+            message += notice
+
+        try:
+            await bot.send_group_msg(group_id=int(group_id), message=message)
+        except Exception as e:
+            logger.warning(f"发送群 {group_id} 的通知失败: {e}")
+            return False
+
+        now = time.monotonic()
+        self.sent_messages += 1
+        self.sent_notices += len(batch)
+        for enqueued_at, _, _ in batch:
+            latency = now - enqueued_at
+            self._latencies.append(latency)
+            self._max_latency = max(self._max_latency, latency)
+        return True
+
+    def depth(self, group_id: Optional[str] = None) -> int:
+        """排队中的通知数，不指定群时为所有群的总数"""
+        if group_id is not None:
+            return len(self._queues.get(group_id, ()))
+        return sum(len(queue) for queue in self._queues.values())
+
+    def stats(self) -> dict:
+        """队列深度与发送耗时（秒，从入队到发送成功）"""
+        latencies = sorted(self._latencies)
+        p95 = latencies[int(len(latencies) * 0.95)] if latencies else 0.0
+        return {
+            "queued": self.depth(),
+            "groups": len(self._queues),
+            "sent_messages": self.sent_messages,
+            "sent_notices": self.sent_notices,
+            "failed_notices": self.failed_notices,
+            "latency_avg": sum(latencies) / len(latencies) if latencies else 0.0,
+            "latency_p95": p95,
+            "latency_max": self._max_latency,
+        }
@@ -0,0 +1,56 @@
+from typing import Dict, Iterable, Tuple
+
+
+class PendingIndex:
+    """内存中“谁在哪个群有待处理的结婚请求”的索引
+
+    结构为 request_id -> (target_id, group_id)，以及 (target_id, group_id) -> 请求数。
+    启动时从数据库加载一次，之后由 MarriageManager 在事务提交后同步更新；
+    同意、拒绝命令的别名是“不要”“不行”这类常用词，先查这里，
+    没有待处理请求的用户不再访问数据库。
+    """
+
+    def __init__(self):
+        self._requests: Dict[str, Tuple[str, str]] = {}
+        self._counts: Dict[Tuple[str, str], int] = {}
+        self.loaded = False
+
+    def load(self, requests: Iterable[Tuple[str, str, str]]):
+        """用 (request_id, target_id, group_id) 重建索引"""
+        self._requests.clear()
+        self._counts.clear()
+        for request_id, target_id, group_id in requests:
+            self.add(request_id, target_id, group_id)
+        self.loaded = True
+
+    def add(self, request_id: str, target_id: str, group_id: str):
+        if request_id in self._requests:
+            return
+        key = (str(target_id), str(group_id))
+        self._requests[request_id] = key
+        self._counts[key] = self._counts.get(key, 0) + 1
+
+    def discard(self, request_id: str):
+        """请求被接受、拒绝或过期后移除，不存在时忽略"""
+        key = self._requests.pop(request_id, None)
+        if key is None:
+            return
+        count = self._counts[key] - 1
+        if count:
+            self._counts[key] = count
+        else:
+            del self._counts[key]
+
+    def has(self, target_id: str, group_id: str) -> bool:
+        """该用户在该群是否可能有待处理的请求（未加载时总是返回 True）"""
+        if not self.loaded:
+            return True
+        return (str(target_id), str(group_id)) in self._counts
+
+    def clear(self):
+        """清空索引（每日重置时使用）"""
+        self._requests.clear()
+        self._counts.clear()
+
+    def __len__(self) -> int:
+        return len(self._requests)
@@ -0,0 +1,35 @@
+import time
+from typing import Optional
+
+
+class ProcessRecord:
+    """进行中的生宝宝过程
+
+    只保存 ID 和时间，不引用 bot 或回调对象；使用 __slots__ 省掉每个实例的 __dict__。
+    """
+
+    __slots__ = ("user1_id", "user2_id", "group_id", "bot_id", "start_time", "duration")
+
+    def __init__(
+        self,
+        user1_id: str,
+        user2_id: str,
+        group_id: str,
+        bot_id: Optional[str],
+        start_time: float,
+        duration: int,
+    ):
+        self.user1_id = user1_id
+        self.user2_id = user2_id
+        self.group_id = group_id
+        self.bot_id = bot_id
+        self.start_time = start_time  # 开始时间（时间戳）
+        self.duration = duration  # 持续时间（秒）
+
+    @property
+    def finish_time(self) -> float:
+        return self.start_time + self.duration
+
+    def remaining(self) -> float:
+        """剩余时间（秒）"""
+        return max(0, self.finish_time - time.time())
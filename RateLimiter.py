@@ -0,0 +1,141 @@
+import time
+from collections import Counter
+from datetime import date
+from typing import Dict, Optional
+
+from pydantic import BaseModel
+
+from .Cache import LRUCache
+
+
+class RateLimitRule(BaseModel):
+    """单个命令的频率限制，字段为 None 表示不限制
+
+    令牌桶容量为 burst，每隔 interval 秒恢复一个令牌；每日次数在零点清零。
+    """
+
+    user_daily: Optional[int] = None
+    user_burst: Optional[int] = None
+    user_interval: float = 0
+    group_burst: Optional[int] = None
+    group_interval: float = 0
+
+
+# 每日次数用完时的提示
+DAILY_MESSAGES = {
+    "marry": "今天已经求过婚了，请明天再试吧！",
+}
+
+
+class TokenBuckets:
+    """一组令牌桶，键为用户或群
+
+    空闲足够久的桶已经装满，和不存在的桶等价，所以用带 TTL 的 LRU 保存即可。
+    """
+
+    def __init__(self, burst: int, interval: float, maxsize: int = 65536):
+        self.burst = burst
+        self.interval = interval
+        self._buckets = LRUCache(maxsize=maxsize, ttl=burst * interval)
+
+    def take(self, key: str) -> float:
+        """取走一个令牌，成功返回 0，否则返回需要等待的秒数"""
+        now = time.monotonic()
+        tokens, updated_at = self._buckets.get(key, (self.burst, now))
+        tokens = min(self.burst, tokens + (now - updated_at) / self.interval)
+
+        if tokens < 1:
+            self._buckets.set(key, (tokens, now))
+            return (1 - tokens) * self.interval
+
+        self._buckets.set(key, (tokens - 1, now))
+        return 0
+
+
+class RateLimiter:
+    """按命令配置的内存频率限制
+
+    每个命令可以有按用户、按群的令牌桶（防刷屏）以及按用户的每日次数。
+    所有判断都在内存中完成，被拒绝的请求不会访问数据库。
+    """
+
+    def __init__(self, rules: Dict[str, RateLimitRule]):
+        self.rules = rules
+        self._user_buckets: Dict[str, TokenBuckets] = {}
+        self._group_buckets: Dict[str, TokenBuckets] = {}
+        for command, rule in rules.items():
+            if rule.user_burst and rule.user_interval > 0:
+                self._user_buckets[command] = TokenBuckets(
+                    rule.user_burst, rule.user_interval
+                )
+            if rule.group_burst and rule.group_interval > 0:
+                self._group_buckets[command] = TokenBuckets(
+                    rule.group_burst, rule.group_interval
+                )
+        # 命令 -> (日期, user_id -> 当日次数)
+        self._daily: Dict[str, tuple] = {}
+
+    def _daily_counts(self, command: str) -> Counter:
+        today = date.today()
+        day, counts = self._daily.get(command, (None, None))
+        if day != today:
+            counts = Counter()
+            self._daily[command] = (today, counts)
+        return counts
+
+    def remaining_daily(self, command: str, user_id: str) -> Optional[int]:
+        """今天剩余次数，不限制时返回 None"""
+        rule = self.rules.get(command)
+        if not rule or rule.user_daily is None:
+            return None
+        return max(0, rule.user_daily - self._daily_counts(command)[user_id])
+
+    def acquire(
+        self, command: str, user_id: str, group_id: str, count_daily: bool = True
+    ) -> Optional[str]:
+        """检查并消耗一次配额，允许时返回 None，否则返回提示语
+
+        count_daily 为 False 时只检查每日次数而不计数，
+        由调用方在操作真正生效时再调用 take_daily。
+        """
+        if self.remaining_daily(command, user_id) == 0:
+            return DAILY_MESSAGES.get(command, "今天的次数已经用完了，明天再来吧！")
+
+        for buckets, key in (
+            (self._user_buckets.get(command), user_id),
+            (self._group_buckets.get(command), group_id),
+        ):
+            if buckets is None:
+                continue
+            wait = buckets.take(key)
+            if wait:
+                return f"操作太频繁了，请 {int(wait) + 1} 秒后再试"
+
+        if count_daily:
+            self.take_daily(command, user_id)
+        return None
+
+    def take_daily(self, command: str, user_id: str) -> bool:
+        """计入一次每日次数，已经用完时返回 False"""
+        remaining = self.remaining_daily(command, user_id)
+        if remaining is None:
+            return True
+        if remaining == 0:
+            return False
+        self._daily_counts(command)[user_id] += 1
+        return True
+
+    def refund_daily(self, command: str, user_id: str, day: Optional[date] = None):
+        """退还一次每日次数（例如请求被拒绝或过期），不是今天的次数忽略"""
+        if day is not None and day != date.today():
+            return
+        counts = self._daily_counts(command)
+        if counts[user_id] > 0:
+            counts[user_id] -= 1
+
+    def seed_daily(self, command: str, counts: Dict[str, int]):
+        """用数据库中今天的统计结果初始化每日次数"""
+        self._daily[command] = (date.today(), Counter(counts))
+
+    def clear_daily(self):
+        self._daily.clear()
@@ -1,128 +1,253 @@
 import random
-import time
-import asyncio
 from datetime import datetime, timedelta
-from typing import Dict, Tuple
-from nonebot_plugin_apscheduler import scheduler
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+from nonebot_plugin_orm import get_session
+from sqlalchemy import delete, select
+from sqlalchemy.exc import IntegrityError
 from loguru import logger
 from nonebot.adapters.onebot.v11 import MessageSegment
 
+from .DeadlineScheduler import DeadlineScheduler
+from .Metrics import metrics
+from .models import BabyProcess, make_pair_key
+from .ProcessRecord import ProcessRecord
 
+# 发送群消息：(group_id, message, bot_id)
+SendCallback = Callable[[str, MessageSegment, Optional[str]], Awaitable[None]]
+
+# 每批结算的过程数量，避免单条语句的参数过多
+SETTLE_BATCH = 500
+# 结算失败后重试的间隔（秒）
+SETTLE_RETRY_DELAY = 30
+
+
+@metrics.instrument("baby")
 class BabyProcessManager:
-    """简洁的生宝宝过程管理器"""
+    """简洁的生宝宝过程管理器
 
-    def __init__(self):
+    进行中的过程同时保存在内存和 baby_processes 表中，重启后由 restore
+    用一次查询恢复。所有过程的完成时间放在同一个最小堆里，由一个后台任务
+    每次唤醒时把已到期的过程放在一个事务中批量结算，再统一发送结果。
+    """
+
+    def __init__(self, have_babies_callback):
         # 使用排序后的夫妻ID作为键
-        self.baby_processes: Dict[Tuple[str, str], dict] = {}
-        self._lock = asyncio.Lock()
+        self.baby_processes: Dict[Tuple[str, str], ProcessRecord] = {}
+        # 批量生宝宝回调，见 MarriageManager.have_babies_with_spouses
+        self._have_babies = have_babies_callback
+        # 发送完成通知，由 restore 设置
+        self._send: Optional[SendCallback] = None
+        # 完成时间调度，键为 process_key
+        self._engine = DeadlineScheduler(
+            self._complete_due,
+            max_batch=SETTLE_BATCH,
+            retry_delay=SETTLE_RETRY_DELAY,
+            name="结算生宝宝过程",
+        )
 
     def _get_process_key(self, user1_id: str, user2_id: str) -> Tuple[str, str]:
         """生成统一的进程键"""
         sorted_ids = sorted([user1_id, user2_id])
         return (sorted_ids[0], sorted_ids[1])
 
+    def _schedule(self, process: ProcessRecord):
+        """登记内存状态和完成时间"""
+        process_key = self._get_process_key(process.user1_id, process.user2_id)
+        self.baby_processes[process_key] = process
+        self._engine.schedule(process_key, process.finish_time)
+        self._engine.start()
+
+    async def restore(self, send: SendCallback) -> Tuple[int, int]:
+        """启动时恢复进行中的过程
+
+        已经到期的过程在调度器第一次唤醒时按批结算。
+
+        Returns:
+            (已到期的过程数, 未到期的过程数)
+        """
+        self._send = send
+        now = datetime.now()
+
+        stmt = select(
+            BabyProcess.user1_id,
+            BabyProcess.user2_id,
+            BabyProcess.group_id,
+            BabyProcess.bot_id,
+            BabyProcess.started_at,
+            BabyProcess.duration,
+            BabyProcess.finish_at,
+        )
+        session = get_session()
+        async with session.begin():
+            rows = (await session.execute(stmt)).all()
+
+        overdue = 0
+        for row in rows:
+            self._schedule(
+                ProcessRecord(
+                    row.user1_id,
+                    row.user2_id,
+                    row.group_id,
+                    row.bot_id,
+                    row.started_at.timestamp(),
+                    row.duration,
+                )
+            )
+            if row.finish_at <= now:
+                overdue += 1
+
+        self._engine.start()
+        return overdue, len(rows) - overdue
+
     async def start_baby_process(
         self,
         user1_id: str,
         user2_id: str,
         group_id: str,
         duration: int,
-        bot,  # bot实例
-        have_baby_callback,  # 生宝宝回调函数
+        bot_id: Optional[str] = None,  # 完成后用于发送通知的机器人
     ) -> bool:
         """开始生宝宝过程
 
         Returns:
             bool: 是否成功开始
         """
-        async with self._lock:
-            process_key = self._get_process_key(user1_id, user2_id)
-
-            # 检查是否已存在
-            if process_key in self.baby_processes:
-                return False
-
-            # 记录过程信息
-            self.baby_processes[process_key] = {
-                "user1_id": user1_id,
-                "user2_id": user2_id,
-                "group_id": group_id,
-                "start_time": time.time(),
-                "duration": duration,  # 保存持续时间
-                "bot": bot,
-                "have_baby_callback": have_baby_callback,
-            }
-
-            # 创建定时任务
-            scheduler.add_job(
-                self._complete_baby_process,
-                "date",
-                run_date=datetime.now() + timedelta(seconds=duration),
-                id=f"baby_{process_key[0]}_{process_key[1]}",
-                args=[user1_id, user2_id],
-            )
-
-            logger.info(
-                f"开始生宝宝过程: {user1_id} & {user2_id}, 持续时间: {duration}秒"
-            )
-            return True
-
-    async def _complete_baby_process(self, user1_id: str, user2_id: str):
-        """定时任务回调：完成生宝宝过程"""
         process_key = self._get_process_key(user1_id, user2_id)
+        started_at = datetime.now()
+        process = ProcessRecord(
+            user1_id, user2_id, group_id, bot_id, started_at.timestamp(), duration
+        )
 
-        async with self._lock:
-            process = self.baby_processes.pop(process_key, None)
-            if not process:
-                return
+        # 检查与占位之间没有 await，同一事件循环中不会被其他请求打断，
+        # 不需要加锁；先占位，写库期间重复的请求会被拒绝
+        if process_key in self.baby_processes:
+            return False
+        self.baby_processes[process_key] = process
 
         try:
-            bot = process["bot"]
-            have_baby_callback = process["have_baby_callback"]
-            group_id = process["group_id"]
+            session = get_session()
+            async with session.begin():
+                session.add(
+                    BabyProcess(
+                        pair_key=make_pair_key(user1_id, user2_id),
+                        user1_id=user1_id,
+                        user2_id=user2_id,
+                        group_id=group_id,
+                        bot_id=bot_id,
+                        started_at=started_at,
+                        duration=duration,
+                        finish_at=started_at + timedelta(seconds=duration),
+                    )
+                )
+        except Exception as e:
+            self.baby_processes.pop(process_key, None)
+            if not isinstance(e, IntegrityError):
+                logger.error(f"保存生宝宝过程失败: {e}")
+            return False
+
+        self._schedule(process)
+
+        logger.info(f"开始生宝宝过程: {user1_id} & {user2_id}, 持续时间: {duration}秒")
+        return True
 
-            # 生宝宝逻辑
-            baby_count = self._realistic_baby_count()
-            result = await have_baby_callback(user1_id, user2_id, group_id, baby_count)
+    @metrics.timed("baby", "complete_due")
+    async def _complete_due(self, process_keys: List[Tuple[str, str]]):
+        """调度器回调：批量完成到期的生宝宝过程
 
-            # 构建消息
-            total_after_birth = result["total_babies"] + baby_count
-            count_display = self.format_baby_count_symbols(total_after_birth)
+        结算失败时抛出异常，由调度器整批延后重试；结算成功后才移出内存。
+        """
+        processes = [
+            self.baby_processes[key]
+            for key in process_keys
+            if key in self.baby_processes
+        ]
+        if not processes:
+            return
+
+        results = await self._settle(processes)
+
+        for process_key in process_keys:
+            self.baby_processes.pop(process_key, None)
+
+        await self._announce(processes, results)
+
+    async def _settle(self, processes: List[ProcessRecord]) -> List[Optional[dict]]:
+        """在一个事务中删除过程记录并批量生宝宝"""
+        births = [
+            {
+                "user_id": process.user1_id,
+                "spouse_id": process.user2_id,
+                "group_id": process.group_id,
+                "baby_count": self._realistic_baby_count(),
+            }
+            for process in processes
+        ]
+        pair_keys = [make_pair_key(b["user_id"], b["spouse_id"]) for b in births]
+
+        session = get_session()
+        async with session.begin():
+            await session.execute(
+                delete(BabyProcess).where(BabyProcess.pair_key.in_(pair_keys))
+            )
+            return await self._have_babies(births, session=session)
+
+    async def _announce(
+        self, processes: List[ProcessRecord], results: List[Optional[dict]]
+    ):
+        """提交后发送生宝宝结果"""
+        for process, result in zip(processes, results):
+            user1_id, user2_id = process.user1_id, process.user2_id
+            if result is None:
+                # 过程中婚姻已经解除
+                logger.info(f"生宝宝过程结束但已无婚姻关系: {user1_id} & {user2_id}")
+                continue
 
-            if baby_count == 0:
-                msg = random.choice(
+            logger.info(
+                f"生宝宝完成: {user1_id} & {user2_id}, 宝宝数量: {result['baby_count']}"
+            )
+            if self._send is None:
+                continue
+            try:
+                await self._send(
+                    process.group_id,
+                    self._birth_message(user1_id, user2_id, result),
+                    process.bot_id,
+                )
+            except Exception as e:
+                logger.error(f"发送生宝宝结果失败: {e}")
+
+    def _birth_message(self, user1_id: str, user2_id: str, result: dict):
+        """构建生宝宝结果消息（total_babies 已包含本次出生的宝宝）"""
+        baby_count = result["baby_count"]
+        count_display = self.format_baby_count_symbols(result["total_babies"])
+
+        if baby_count == 0:
+            msg = random.choice(
+                [
+                    "😔 很遗憾，这次没有怀上宝宝。",
+                    "💔 这次没有成功怀上宝宝，再接再厉！",
+                    "🌙 没有怀上宝宝，再多做几次试试也许就能怀上了。",
+                ]
+            )
+        else:
+            msg = (
+                random.choice(
                     [
-                        "😔 很遗憾，这次没有怀上宝宝。",
-                        "💔 这次没有成功怀上宝宝，再接再厉！",
-                        "🌙 没有怀上宝宝，再多做几次试试也许就能怀上了。",
+                        f"🎉 恭喜！喜得{baby_count}个宝宝！👶",
+                        f"💕 大喜事！爱情结晶 - {baby_count}个宝宝诞生啦！",
+                        f"👶 好消息！家庭新增了{baby_count}个成员！",
+                        f"🎊 {baby_count}个宝宝来到这个世界啦！",
+                        f"💖 爱情的见证！迎来了{baby_count}个可爱的宝宝！",
                     ]
                 )
-            else:
-                msg = (
-                    random.choice(
-                        [
-                            f"🎉 恭喜！喜得{baby_count}个宝宝！👶",
-                            f"💕 大喜事！爱情结晶 - {baby_count}个宝宝诞生啦！",
-                            f"👶 好消息！家庭新增了{baby_count}个成员！",
-                            f"🎊 {baby_count}个宝宝来到这个世界啦！",
-                            f"💖 爱情的见证！迎来了{baby_count}个可爱的宝宝！",
-                        ]
-                    )
-                    + f"\n🏠 你们现在共有 {count_display} 个宝宝了！"
-                )
-
-            # 发送消息
-            result_msg = (
-                MessageSegment.text(msg)
-                + MessageSegment.at(user1_id)
-                + MessageSegment.at(user2_id)
+                + f"\n🏠 你们现在共有 {count_display} 个宝宝了！"
             )
-            await bot.send_group_msg(group_id=int(group_id), message=result_msg)
-
-            logger.info(f"生宝宝完成: {user1_id} & {user2_id}, 宝宝数量: {baby_count}")
 
-        except Exception as e:
-            logger.error(f"生宝宝过程异常: {e}")
+        return (
+            MessageSegment.text(msg)
+            + MessageSegment.at(user1_id)
+            + MessageSegment.at(user2_id)
+        )
 
     def _realistic_baby_count(self) -> int:
         """
@@ -153,11 +278,7 @@ class BabyProcessManager:
             return 0
 
         # 根据开始时间计算预估剩余时间
-        elapsed = time.time() - process["start_time"]
-        # 这里需要存储duration，修改start_baby_process时保存duration
-        duration = process.get("duration", 0)
-        remaining = duration - elapsed
-        return max(0, remaining)
+        return process.remaining()
 
     def format_baby_count_symbols(self, baby_count: int) -> str:
         """将宝宝数量转换为符号显示字符串
@@ -212,12 +333,10 @@ class BabyProcessManager:
             return f"{parent1_name} 和 {parent2_name} 的宝宝 {count_display} - {date}"
 
     async def cleanup(self):
-        """清理所有任务"""
-        async with self._lock:
-            for process_key in list(self.baby_processes.keys()):
-                task_id = f"baby_{process_key[0]}_{process_key[1]}"
-                try:
-                    scheduler.remove_job(task_id)
-                except Exception:
-                    pass
-            self.baby_processes.clear()
+        """清理内存中的所有过程（数据库中的过程保留，重启后恢复）"""
+        self._engine.clear()
+        self.baby_processes.clear()
+
+    async def close(self):
+        """停止完成调度"""
+        await self._engine.stop()
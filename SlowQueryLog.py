@@ -0,0 +1,106 @@
+import time
+from typing import Optional
+
+from loguru import logger
+from sqlalchemy import event
+
+from .Metrics import current_call
+
+# 日志中参数的最大长度
+MAX_PARAMS_LENGTH = 1000
+
+
+class SlowQueryLog:
+    """慢查询日志
+
+    监听引擎上的每条语句，耗时超过阈值时记录语句、绑定参数、发起调用的
+    管理器方法（来自 Metrics.current_call），SQLite 下再附上
+    EXPLAIN QUERY PLAN 的结果。日志写入单独的按大小滚动的文件。
+    """
+
+    def __init__(
+        self,
+        threshold_ms: Optional[float] = None,
+        path: Optional[str] = None,
+        rotation: str = "10 MB",
+        retention: int = 5,
+    ):
+        self.threshold = threshold_ms / 1000 if threshold_ms is not None else None
+        self.path = path
+        self.rotation = rotation
+        self.retention = retention
+        self.count = 0
+        self._engines = set()
+        self._sink_id: Optional[int] = None
+
+    def watch(self, engine):
+        """开始监听引擎（同一引擎只注册一次），阈值为 None 时不做任何事"""
+        if self.threshold is None or engine in self._engines:
+            return
+        self._engines.add(engine)
+
+        if self.path and self._sink_id is None:
+            self._sink_id = logger.add(
+                self.path,
+                rotation=self.rotation,
+                retention=self.retention,
+                encoding="utf-8",
+                filter=lambda record: record["extra"].get("slow_query", False),
+            )
+
+        event.listen(engine, "before_cursor_execute", self._before)
+        event.listen(engine, "after_cursor_execute", self._after)
+        event.listen(engine, "handle_error", self._error)
+
+    def _before(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("marryme_query_started", []).append(time.perf_counter())
+
+    @staticmethod
+    def _error(context):
+        """语句出错时 after_cursor_execute 不会触发，在这里弹出开始时间"""
+        if context.connection is None:
+            return
+        started = context.connection.info.get("marryme_query_started")
+        if started:
+            started.pop()
+
+    def _after(self, conn, cursor, statement, parameters, context, executemany):
+        started = conn.info["marryme_query_started"].pop()
+        elapsed = time.perf_counter() - started
+        if elapsed < self.threshold:
+            return
+
+        self.count += 1
+        if executemany:
+            params = f"{len(parameters)} 组，第一组: {parameters[0]!r}"
+        else:
+            params = repr(parameters)
+        if len(params) > MAX_PARAMS_LENGTH:
+            params = params[:MAX_PARAMS_LENGTH] + "..."
+
+        lines = [
+            f"慢查询 {elapsed * 1000:.1f}ms，调用: {current_call.get() or '未知'}",
+            statement.strip(),
+            f"参数: {params}",
+        ]
+        if conn.dialect.name == "sqlite":
+            lines += self._explain(conn, statement, parameters, executemany)
+
+        logger.bind(slow_query=True).warning("\n".join(lines))
+
+    @staticmethod
+    def _explain(conn, statement, parameters, executemany):
+        """在同一连接上执行 EXPLAIN QUERY PLAN（直接用 DBAPI 游标，不触发引擎事件）"""
+        if executemany:
+            parameters = parameters[0]
+        try:
+            cursor = conn.connection.dbapi_connection.cursor()
+            try:
+                cursor.execute(f"EXPLAIN QUERY PLAN {statement}", parameters)
+                rows = cursor.fetchall()
+            finally:
+                cursor.close()
+        except Exception as e:
+            return [f"查询计划获取失败: {e}"]
+        # 每行为 (id, parent, notused, detail)
+        return ["查询计划:"] + [f"  {row[-1]}" for row in rows]
@@ -3,13 +3,18 @@ import time
 from nonebot import get_driver, on_command, require
 from nonebot.adapters.onebot.v11 import Bot, Event, MessageSegment, GroupMessageEvent
 from nonebot.adapters.onebot.v11.message import Message
+from nonebot.exception import MatcherException
 from nonebot.params import CommandArg
+from nonebot.permission import SUPERUSER
 from nonebot_plugin_apscheduler import scheduler
-from nonebot_plugin_uninfo import SceneType, Session, UniSession, QryItrface
+from nonebot_plugin_uninfo import Session, UniSession, QryItrface
 import asyncio
 from datetime import datetime, timedelta
+from typing import List, Union
 
 from .MarriageManager import MarriageManager
+from .Metrics import metrics
+from .config import plugin_config
 from loguru import logger
 
 # 全局管理器实例
@@ -38,12 +43,18 @@ have_baby_cmd = on_command(
 check_babies_cmd = on_command(
     "我的宝宝", aliases={"宝宝列表", "查看宝宝", "babies"}, priority=10, block=True
 )
+baby_leaderboard_cmd = on_command(
+    "宝宝排行榜", aliases={"宝宝排行"}, priority=10, block=True
+)
 preference_cmd = on_command(
     "婚姻设置", aliases={"偏好", "preference"}, priority=10, block=True
 )
+baby_totals_cmd = on_command("宝宝校验", permission=SUPERUSER, priority=10, block=True)
+stats_cmd = on_command("婚姻统计", permission=SUPERUSER, priority=10, block=True)
 
 
 @marry_cmd.handle()
+@metrics.timed("handler", "marry")
 async def handle_marry(
     bot: Bot,
     event: GroupMessageEvent,
@@ -73,55 +84,89 @@ async def handle_marry(
     if target_id == str(event.user_id):
         await marry_cmd.finish("你不能和自己结婚哦！")
 
-    target_pref = await marriage_manager.get_user_preference(target_id, group_id)
-    if target_pref and target_pref["allow_marriage"] is False:
-        await marry_cmd.finish(
-            f"{target_pref.get('user_name', '对方')}设置了不允许结婚"
-        )
-
-    # # 检查是否已有婚姻
-    existing_marriage = await marriage_manager.get_user_marriage(
-        str(event.user_id), target_id
+    # 频率限制在内存中判断，每日次数在请求真正创建时才计入
+    limited = marriage_manager.rate_limiter.acquire(
+        "marry", str(event.user_id), group_id, count_daily=False
     )
-    if existing_marriage:
-        await marry_cmd.finish("❌ 你已经和TA结过婚了哦！")
-        return
+    if limited:
+        await marry_cmd.finish(limited)
 
-    # 获取用户信息
-    try:
-        members = await interface.get_members(SceneType.GROUP, str(event.group_id))
+    user_id = str(event.user_id)
+    member_directory = marriage_manager.member_directory
 
-        proposer_info = next(
-            (m.user for m in members if m.user.id == str(event.user_id)), None
+    async def fetch_members():
+        return await asyncio.gather(
+            member_directory.get_member(interface, group_id, user_id),
+            member_directory.get_member(interface, group_id, target_id),
         )
-        target_info = next((m.user for m in members if m.user.id == target_id), None)
 
+    async def fetch_avatar():
+        _, target_info = await members
         if not target_info:
-            await marry_cmd.finish(
-                "未在群聊中找到指定的用户！请确认@的是正确的群成员。"
+            return None
+        if not target_info.avatar:
+            logger.warning("未获取到头像URL")
+            return None
+        logger.info(f"开始下载头像: {target_info.avatar}")
+        return await marriage_manager.download_avatar_as_image(target_info.avatar)
+
+    # 群成员查询和头像下载与下面的数据库检查同时进行，检查不通过时取消
+    members = asyncio.create_task(fetch_members())
+    avatar = asyncio.create_task(fetch_avatar())
+    try:
+        # 偏好检查、婚姻检查与创建请求在同一个事务中完成
+        async with marriage_manager.unit_of_work() as db:
+            target_pref = await marriage_manager.get_user_preference(
+                target_id, group_id, session=db
             )
-        # 获取头像URL
-        logger.info(f"用户信息: {target_info}")  # 添加日志
-
-        target_avatar_url = target_info.avatar
+            if target_pref and target_pref["allow_marriage"] is False:
+                await marry_cmd.finish(
+                    f"{target_pref.get('user_name', '对方')}设置了不允许结婚"
+                )
 
-        avatar_image = None
-        if target_avatar_url:
-            logger.info(f"开始下载头像: {target_avatar_url}")  # 添加日志
-            avatar_image = await marriage_manager.download_avatar_as_image(
-                target_avatar_url
+            # # 检查是否已有婚姻
+            existing_marriage = await marriage_manager.get_user_marriage(
+                user_id, target_id, session=db
             )
-        else:
-            logger.warning("未获取到头像URL")  # 添加日志
-        # 创建结婚请求
-        request_id = await marriage_manager.create_marriage_request(
-            proposer_id=str(event.user_id),
-            proposer_name=proposer_info.name or proposer_info.id,
-            target_id=target_id,
-            target_name=target_info.name or target_info.id,
-            group_id=str(event.group_id),
-        )
+            if existing_marriage:
+                await marry_cmd.finish("❌ 你已经和TA结过婚了哦！")
+                return
 
+            # 获取用户信息
+            try:
+                proposer_info, target_info = await members
+                if not target_info:
+                    await marry_cmd.finish(
+                        "未在群聊中找到指定的用户！请确认@的是正确的群成员。"
+                    )
+                logger.info(f"用户信息: {target_info}")  # 添加日志
+
+                # 创建结婚请求
+                request_id = await marriage_manager.create_marriage_request(
+                    proposer_id=user_id,
+                    proposer_name=proposer_info.name or proposer_info.id,
+                    target_id=target_id,
+                    target_name=target_info.name or target_info.id,
+                    group_id=group_id,
+                    session=db,
+                )
+
+            except MatcherException:
+                raise
+            except ValueError as e:
+                await marry_cmd.finish(f"发起结婚请求失败：{e}")
+            except Exception as e:
+                await marry_cmd.finish(f"发起结婚请求失败：{e}")
+
+        # 头像只用于消息，在事务提交后再等待下载完成
+        avatar_image = await avatar
+    finally:
+        for task in (members, avatar):
+            task.cancel()
+        await asyncio.gather(members, avatar, return_exceptions=True)
+
+    # 请求提交后再发送消息，避免发消息时占着事务
+    try:
         # 构建消息
         message_parts = [
             f"💌结婚请求",
@@ -145,28 +190,15 @@ async def handle_marry(
             ]
         )
 
+        # 120秒后由过期调度器自动取消
         await marry_cmd.send(Message(message_parts))
 
-        # 设置120秒后自动取消
-        async def expire_request():
-            await asyncio.sleep(120)
-            # 检查请求是否仍然存在且未被处理
-            request = await marriage_manager.get_pending_request_by_id(request_id)
-            if request:
-                await marriage_manager.reject_marriage_request(request_id)
-                await marry_cmd.send(
-                    f"💔 {proposer_info.name or proposer_info.id} 向 {target_info.name or target_info.id} 的结婚请求已超时取消。"
-                )
-
-        asyncio.create_task(expire_request())
-
-    except ValueError as e:
-        await marry_cmd.finish(f"发起结婚请求失败：{e}")
     except Exception as e:
         await marry_cmd.finish(f"发起结婚请求失败：{e}")
 
 
 @accept_cmd.handle()
+@metrics.timed("handler", "accept")
 async def handle_accept(
     bot: Bot,
     event: GroupMessageEvent,
@@ -177,136 +209,150 @@ async def handle_accept(
     user_id = str(event.user_id)
     group_id = str(event.group_id)
 
-    logger.info(f"用户 {user_id} 在群 {group_id} 执行接受结婚命令")
-
-    # 查找所有待处理的请求
-    try:
-        logger.debug(f"开始获取用户 {user_id} 在群 {group_id} 的待处理请求")
-        pending_requests = await marriage_manager.get_pending_requests(
-            user_id, group_id
-        )
-        logger.info(f"找到 {len(pending_requests)} 个待处理求婚请求")
-
-        if not pending_requests:
-            return
-
-    except ValueError as e:
-        logger.error(f"获取求婚请求失败: {e}", exc_info=True)
-        await accept_cmd.finish(f"{e}")
+    # 别名都是常用词，没有待处理请求的用户直接忽略，不访问数据库
+    if not marriage_manager.has_pending_request(user_id, group_id):
         return
-    except Exception as e:
-        logger.error(f"获取求婚请求时发生未知错误: {e}", exc_info=True)
-        return
-
-    # 获取消息中的at对象
-    at_targets = []
-    for segment in event.message:
-        if segment.type == "at":
-            qq = segment.data.get("qq")
-            if qq and qq != "all":
-                at_targets.append(str(qq))
 
-    logger.debug(f"解析到 {len(at_targets)} 个@目标: {at_targets}")
-
-    selected_request = None
+    logger.info(f"用户 {user_id} 在群 {group_id} 执行接受结婚命令")
 
-    # 方案1：如果有@某人，接受指定的请求
-    if at_targets:
-        target_id = at_targets[0]
-        logger.info(f"用户选择了通过@指定目标: {target_id}")
+    # 查询请求与接受请求在同一个事务中完成
+    async with marriage_manager.unit_of_work() as db:
+        # 查找所有待处理的请求
+        try:
+            logger.debug(f"开始获取用户 {user_id} 在群 {group_id} 的待处理请求")
+            pending_requests = await marriage_manager.get_pending_requests(
+                user_id, group_id, session=db
+            )
+            logger.info(f"找到 {len(pending_requests)} 个待处理求婚请求")
 
-        for request in pending_requests:
-            if request["proposer_id"] == target_id:
-                selected_request = request
-                logger.info(
-                    f"找到匹配的求婚请求: {request['proposer_name']}({target_id})"
-                )
-                break
+            if not pending_requests:
+                return
 
-        if not selected_request:
-            logger.warning(f"未找到用户 {user_id} 对目标 {target_id} 的求婚请求")
-            await accept_cmd.finish("❌ 未找到对应的求婚请求！")
+        except ValueError as e:
+            logger.error(f"获取求婚请求失败: {e}", exc_info=True)
+            await accept_cmd.finish(f"{e}")
+            return
+        except Exception as e:
+            logger.error(f"获取求婚请求时发生未知错误: {e}", exc_info=True)
             return
 
-    # 方案2：如果没有@任何人，默认同意第一个
-    else:
-        selected_request = pending_requests[0]
-        logger.info(
-            f"用户未指定目标，默认接受第一个请求: {selected_request['proposer_name']}({selected_request['proposer_id']})"
-        )
+        # 获取消息中的at对象
+        at_targets = []
+        for segment in event.message:
+            if segment.type == "at":
+                qq = segment.data.get("qq")
+                if qq and qq != "all":
+                    at_targets.append(str(qq))
+
+        logger.debug(f"解析到 {len(at_targets)} 个@目标: {at_targets}")
+
+        selected_request = None
+
+        # 方案1：如果有@某人，接受指定的请求
+        if at_targets:
+            target_id = at_targets[0]
+            logger.info(f"用户选择了通过@指定目标: {target_id}")
+
+            for request in pending_requests:
+                if request["proposer_id"] == target_id:
+                    selected_request = request
+                    logger.info(
+                        f"找到匹配的求婚请求: {request['proposer_name']}({target_id})"
+                    )
+                    break
 
-    # 拒绝其他所有请求
-    # try:
-    #     reject_count = 0
-    #     for request in pending_requests:
-    #         if request["request_id"] != selected_request["request_id"]:
-    #             logger.debug(
-    #                 f"拒绝其他请求: {request['proposer_name']}({request['proposer_id']})"
-    #             )
-    #             await marriage_manager.reject_marriage_request(request["request_id"])
-    #             reject_count += 1
-
-    #     logger.info(f"成功拒绝了 {reject_count} 个其他求婚请求")
-
-    # except Exception as e:
-    #     logger.error(f"拒绝其他请求时发生错误: {e}", exc_info=True)
-    #     await accept_cmd.finish("❌ 处理其他请求时出现错误")
-    #     return
-
-    # 接受选中的请求
-    try:
-        logger.info(f"开始接受选中的求婚请求: {selected_request['request_id']}")
-        success = await marriage_manager.accept_marriage_request(
-            selected_request["request_id"]
-        )
+            if not selected_request:
+                logger.warning(f"未找到用户 {user_id} 对目标 {target_id} 的求婚请求")
+                await accept_cmd.finish("❌ 未找到对应的求婚请求！")
+                return
 
-        if success:
+        # 方案2：如果没有@任何人，默认同意第一个
+        else:
+            selected_request = pending_requests[0]
             logger.info(
-                f"成功接受求婚请求，求婚者: {selected_request['proposer_name']}, 接受者: {user_id}"
+                f"用户未指定目标，默认接受第一个请求: {selected_request['proposer_name']}({selected_request['proposer_id']})"
             )
-            await send_marriage_success_message(selected_request, event)
-        else:
-            logger.error(f"接受求婚请求失败，请求ID: {selected_request['request_id']}")
-            await accept_cmd.finish("❌ 你们已经结过婚了！")
 
-    except Exception as e:
-        logger.error(f"接受求婚请求时发生错误: {e}", exc_info=True)
-        await accept_cmd.finish("❌ 处理求婚请求时发生未知错误")
+        # 拒绝其他所有请求
+        # try:
+        #     reject_count = 0
+        #     for request in pending_requests:
+        #         if request["request_id"] != selected_request["request_id"]:
+        #             logger.debug(
+        #                 f"拒绝其他请求: {request['proposer_name']}({request['proposer_id']})"
+        #             )
+        #             await marriage_manager.reject_marriage_request(request["request_id"])
+        #             reject_count += 1
+
+        #     logger.info(f"成功拒绝了 {reject_count} 个其他求婚请求")
+
+        # except Exception as e:
+        #     logger.error(f"拒绝其他请求时发生错误: {e}", exc_info=True)
+        #     await accept_cmd.finish("❌ 处理其他请求时出现错误")
+        #     return
+
+        # 接受选中的请求
+        try:
+            logger.info(f"开始接受选中的求婚请求: {selected_request['request_id']}")
+            success = await marriage_manager.accept_marriage_request(
+                selected_request["request_id"], session=db
+            )
+        except Exception as e:
+            logger.error(f"接受求婚请求时发生错误: {e}", exc_info=True)
+            await accept_cmd.finish("❌ 处理求婚请求时发生未知错误")
+
+    # 婚姻提交后再发送结果
+    if success:
+        logger.info(
+            f"成功接受求婚请求，求婚者: {selected_request['proposer_name']}, 接受者: {user_id}"
+        )
+        await send_marriage_success_message(selected_request, event, bot)
+    else:
+        logger.error(f"接受求婚请求失败，请求ID: {selected_request['request_id']}")
+        await accept_cmd.finish("❌ 你们已经结过婚了！")
 
 
 async def send_marriage_success_message(
-    selected_request: dict, event: GroupMessageEvent
+    selected_request: dict, event: GroupMessageEvent, bot: Bot
 ):
-    """发送结婚成功消息"""
+    """发送结婚成功消息（经发件箱，与同时段的其他通知合并）"""
     # 直接从事件中获取接受者信息
     target_name = event.sender.nickname or f"用户{event.user_id}"
 
     message = (
         f"🎉 恭喜 {selected_request['proposer_name']} 和 {target_name} 结为夫妻！💕"
     )
-    await accept_cmd.send(message)
+    await send_group_message(str(event.group_id), message, bot.self_id)
 
 
 @reject_cmd.handle()
+@metrics.timed("handler", "reject")
 async def handle_reject(event: GroupMessageEvent):
     """处理拒绝结婚"""
     user_id = str(event.user_id)
     group_id = str(event.group_id)
 
-    # 查找待处理的请求
-    pending_request = await marriage_manager.get_pending_request(user_id, group_id)
-    if not pending_request:
+    if not marriage_manager.has_pending_request(user_id, group_id):
         return
 
-    # 拒绝请求
-    success = await marriage_manager.reject_marriage_request(
-        pending_request["request_id"]
-    )  # 修复：改为方括号
+    async with marriage_manager.unit_of_work() as db:
+        # 查找待处理的请求
+        pending_request = await marriage_manager.get_pending_request(
+            user_id, group_id, session=db
+        )
+        if not pending_request:
+            return
+
+        # 拒绝请求
+        success = await marriage_manager.reject_marriage_request(
+            pending_request["request_id"], session=db
+        )  # 修复：改为方括号
     if success:
         await reject_cmd.send("💔 结婚请求已被拒绝。")
 
 
 @check_marriage_cmd.handle()
+@metrics.timed("handler", "check_marriage")
 async def handle_check_marriage(event: Event, session: Session = UniSession()):
     """查看婚姻状态"""
     user_id = str(event.user_id)
@@ -359,15 +405,112 @@ async def daily_reset_job():
         logger.error(f"❌ 每日清空任务异常: {e}")
 
 
-@scheduler.scheduled_job("interval", minutes=2)
-async def expire_check_job():
-    """每2分钟检查一次过期请求"""
+async def send_group_message(
+    group_id: str, message: Union[str, Message, MessageSegment], bot_id: str = None
+):
+    """通过发件箱发送群通知
+
+    短时间内发往同一个群的通知会合并成一条，机器人尚未连接时暂存到连接后发送。
+    """
+    marriage_manager.outbox.put(group_id, message, bot_id)
+
+
+@get_driver().on_bot_connect
+async def resume_outbox(bot: Bot):
+    """机器人连接后补发暂存的通知"""
+    marriage_manager.outbox.resume()
+
+
+async def notify_expired_requests(requests: List[dict]):
+    """发送结婚请求超时通知"""
+    for request in requests:
+        await send_group_message(
+            request["group_id"],
+            f"💔 {request['proposer_name']} 向 {request['target_name']} 的结婚请求已超时取消。",
+        )
+
+
+@get_driver().on_startup
+async def start_metrics():
+    """统计数据库语句、记录慢查询，并按配置定期写出 Prometheus 文本文件"""
+    try:
+        marriage_manager.watch_database()
+    except Exception as e:
+        logger.warning(f"无法统计数据库语句: {e}")
+
+    if plugin_config.marryme_metrics_file:
+        scheduler.add_job(
+            write_metrics,
+            "interval",
+            seconds=plugin_config.marryme_metrics_interval,
+            id="marryme_metrics",
+            replace_existing=True,
+        )
+
+
+async def write_metrics():
+    try:
+        metrics.write(plugin_config.marryme_metrics_file)
+    except Exception as e:
+        logger.warning(f"写入统计文件失败: {e}")
+
+
+@get_driver().on_startup
+async def load_generation():
+    """启动时读取当前数据代（须在其他加载步骤之前），并在后台删除残留的旧数据"""
+    try:
+        await marriage_manager.load_generation()
+        marriage_manager.start_purge()
+    except Exception as e:
+        logger.error(f"❌ 读取数据代失败: {e}")
+
+
+@get_driver().on_startup
+async def start_expiry_scheduler():
+    """启动时从待处理请求重建过期调度器"""
+    try:
+        await marriage_manager.start_expiry_scheduler(notify_expired_requests)
+    except Exception as e:
+        logger.error(f"❌ 启动过期调度器失败: {e}")
+
+
+@get_driver().on_startup
+async def load_marriage_index():
+    """启动时加载婚姻关系索引"""
     try:
-        expired_count = await marriage_manager.cleanup_expired_requests()
-        if expired_count > 0:
-            logger.info(f"🕒 清理了 {expired_count} 个过期的结婚请求")
+        await marriage_manager.load_marriage_index()
     except Exception as e:
-        logger.error(f"❌ 清理过期请求异常: {e}")
+        logger.error(f"❌ 加载婚姻索引失败，将回退到数据库查询: {e}")
+
+
+@get_driver().on_startup
+async def restore_baby_processes():
+    """启动时恢复进行中的生宝宝过程"""
+    try:
+        settled, pending = await marriage_manager.baby_process_manager.restore(
+            send_group_message
+        )
+        logger.info(f"生宝宝过程已恢复: 结算 {settled} 个，继续 {pending} 个")
+    except Exception as e:
+        logger.error(f"❌ 恢复生宝宝过程失败: {e}")
+
+
+@get_driver().on_startup
+async def load_rate_limits():
+    """启动时从今天的求婚记录初始化频率限制"""
+    try:
+        await marriage_manager.load_rate_limits()
+    except Exception as e:
+        logger.error(f"❌ 初始化频率限制失败: {e}")
+
+
+@get_driver().on_shutdown
+async def close_marriage_manager():
+    """关闭头像下载连接池等资源"""
+    try:
+        await marriage_manager.close()
+    except Exception as e:
+        logger.warning(f"关闭管理器资源时出现警告: {e}")
 
 
 @get_driver().on_shutdown
@@ -447,6 +590,7 @@ def check_time_restriction(
 
 
 @have_baby_cmd.handle()
+@metrics.timed("handler", "have_baby")
 async def handle_have_baby(
     bot: Bot, event: GroupMessageEvent, args: Message = CommandArg()
 ):
@@ -465,6 +609,10 @@ async def handle_have_baby(
     user_id = str(event.user_id)
     group_id = str(event.group_id)
 
+    limited = marriage_manager.rate_limiter.acquire("baby", user_id, group_id)
+    if limited:
+        await have_baby_cmd.finish(limited)
+
     # 解析@的用户
     at_users = [
         str(seg.data["qq"]) for seg in args if seg.type == "at" and seg.data.get("qq")
@@ -474,39 +622,48 @@ async def handle_have_baby(
         # 获取配偶ID
         spouse_id = at_users[0] if at_users else None
 
-        target_pref = await marriage_manager.get_user_preference(spouse_id, group_id)
-        if target_pref and target_pref["allow_baby"] is False:
-            await marry_cmd.finish(
-                f"{target_pref.get('user_name', '对方')}设置了不允许生宝宝"
+        # 偏好与婚姻检查共用一个会话
+        async with marriage_manager.unit_of_work() as db:
+            target_pref = await marriage_manager.get_user_preference(
+                spouse_id, group_id, session=db
             )
+            if target_pref and target_pref["allow_baby"] is False:
+                await have_baby_cmd.finish(
+                    f"{target_pref.get('user_name', '对方')}设置了不允许生宝宝"
+                )
 
-        if spouse_id:
-            # 如果有@对象，检查是否与该对象有婚姻关系
-            marriages = await marriage_manager.get_user_marriages(user_id)
-            valid_marriage = None
-            for marriage in marriages:
-                if (
-                    marriage["proposer_id"] == spouse_id
-                    or marriage["target_id"] == spouse_id
-                ):
-                    valid_marriage = marriage
-                    break
-
-            if not valid_marriage:
-                await have_baby_cmd.finish("❌ 你与@的对象没有婚姻关系！")
-                return
-        else:
-            # 没有@时，获取第一个婚姻关系
-            marriages = await marriage_manager.get_user_marriages(user_id)
-            if not marriages:
-                await have_baby_cmd.finish("❌ 你还没有结婚！")
-                return
-            marriage = marriages[0]
-            spouse_id = (
-                marriage["target_id"]
-                if marriage["proposer_id"] == user_id
-                else marriage["proposer_id"]
-            )
+            if spouse_id:
+                # 如果有@对象，检查是否与该对象有婚姻关系
+                marriages = await marriage_manager.get_user_marriages(
+                    user_id, session=db
+                )
+                valid_marriage = None
+                for marriage in marriages:
+                    if (
+                        marriage["proposer_id"] == spouse_id
+                        or marriage["target_id"] == spouse_id
+                    ):
+                        valid_marriage = marriage
+                        break
+
+                if not valid_marriage:
+                    await have_baby_cmd.finish("❌ 你与@的对象没有婚姻关系！")
+                    return
+                marriage = valid_marriage
+            else:
+                # 没有@时，获取第一个婚姻关系
+                marriages = await marriage_manager.get_user_marriages(
+                    user_id, session=db
+                )
+                if not marriages:
+                    await have_baby_cmd.finish("❌ 你还没有结婚！")
+                    return
+                marriage = marriages[0]
+                spouse_id = (
+                    marriage["target_id"]
+                    if marriage["proposer_id"] == user_id
+                    else marriage["proposer_id"]
+                )
 
         baby_manager = marriage_manager.baby_process_manager
         if await baby_manager.is_in_baby_process(user_id, spouse_id):
@@ -523,8 +680,7 @@ async def handle_have_baby(
             user2_id=spouse_id,
             group_id=group_id,
             duration=random_duration,
-            bot=bot,
-            have_baby_callback=marriage_manager.have_baby_with_spouse,
+            bot_id=bot.self_id,
         )
         if not started:
             await have_baby_cmd.finish("❌ 生宝宝过程已经开始，请勿重复操作！")
@@ -541,11 +697,15 @@ async def handle_have_baby(
         )
         await have_baby_cmd.send(start_msg)
 
+    except MatcherException:
+        # finish() 等流程控制异常交给 NoneBot 处理，不是错误
+        raise
     except Exception as e:
         logger.error(f"生宝宝命令异常: {e}")
 
 
 @check_babies_cmd.handle()
+@metrics.timed("handler", "check_babies")
 async def handle_check_babies(
     event: Event,
     args: Message = CommandArg(),
@@ -553,78 +713,43 @@ async def handle_check_babies(
     """查看宝宝记录"""
     user_id = str(event.user_id)
     page = args.extract_plain_text().strip()
-    total_babies = await marriage_manager.get_total_babies(user_id)
-    records = await marriage_manager.get_baby_records(user_id)
     baby = marriage_manager.baby_process_manager
-    if not records:
-        await check_babies_cmd.send("你还没有宝宝呢！")
-        return
-
-    # 按父母组合合并记录
-    merged_records = {}
-    for record in records:
-        # 使用 to_dict() 方法获取字典数据
-        record_dict = record
-
-        # 使用父母双方的ID作为唯一键
-        parent1_id = record_dict["parent1_id"]
-        parent2_id = record_dict["parent2_id"]
-        parent1_name = record_dict["parent1_name"]
-        parent2_name = record_dict["parent2_name"]
-
-        # 创建唯一的父母组合键，确保顺序一致
-        parent_ids = sorted([parent1_id, parent2_id])  # 按ID排序确保一致
-        partner_key = f"{parent_ids[0]}&{parent_ids[1]}"
-
-        if partner_key not in merged_records:
-            merged_records[partner_key] = {
-                "parent1_name": parent1_name,
-                "parent2_name": parent2_name,
-                "baby_count": 0,
-                "latest_date": record_dict["created_at"],
-            }
-
-        merged_records[partner_key]["baby_count"] += record_dict["baby_count"]
-        # 更新最新日期
-        if record_dict["created_at"] > merged_records[partner_key]["latest_date"]:
-            merged_records[partner_key]["latest_date"] = record_dict["created_at"]
 
-    message = [f"👶 你的宝宝们 (共{baby.format_baby_count_symbols(total_babies)}个):"]
-
-    code = None
+    # 『我的宝宝.页码』，从上一页的提示进入时还带有游标『我的宝宝.页码.游标』
+    current_page = 1
+    cursor = None
     if "." in page:
+        parts = page.split(".")
+        cursor = parts[2] if len(parts) > 2 else None
         try:
-            page, code = page.split(".")
-            page_num = int(code)
-            if page_num < 1:
-                await check_babies_cmd.finish("页码必须大于0！")
+            current_page = int(parts[1])
         except Exception:
             await check_babies_cmd.finish(".后面必须跟数字页码！")
+        if current_page < 1:
+            await check_babies_cmd.finish("页码必须大于0！")
 
     # 设置每页显示数量
     page_size = 5
-    total_records = len(merged_records)
-    total_pages = (total_records + page_size - 1) // page_size  # 向上取整
-
-    # 处理页码
-    if code:
-        current_page = page_num
-        if current_page > total_pages:
-            await check_babies_cmd.finish(
-                f"页码 {current_page} 超出范围，总页数只有 {total_pages} 页"
-            )
-    else:
-        current_page = 1
+    result = await marriage_manager.get_baby_pairs_page(
+        user_id, current_page, page_size, cursor=cursor
+    )
+    total_records = result["total_pairs"]
+    if not total_records:
+        await check_babies_cmd.send("你还没有宝宝呢！")
+        return
 
-    # 计算分页范围
-    start_index = (current_page - 1) * page_size
-    end_index = start_index + page_size
-    paged_records = dict(list(merged_records.items())[start_index:end_index])
+    total_pages = (total_records + page_size - 1) // page_size  # 向上取整
+    if current_page > total_pages:
+        await check_babies_cmd.finish(
+            f"页码 {current_page} 超出范围，总页数只有 {total_pages} 页"
+        )
 
     # 生成消息
+    total_babies = result["total_babies"]
     message = [f"👶 你的宝宝们 (共{baby.format_baby_count_symbols(total_babies)}个):"]
 
-    for i, (partner_key, data) in enumerate(paged_records.items(), start_index + 1):
+    start_index = (current_page - 1) * page_size
+    for i, data in enumerate(result["pairs"], start_index + 1):
         latest_date = (
             data["latest_date"].split("T")[0]
             if "T" in data["latest_date"]
@@ -644,13 +769,56 @@ async def handle_check_babies(
     if total_pages > 1:
         message.append(f"\n第 {current_page}/{total_pages} 页")
         message.append(f"共 {total_records} 条记录")
-        if current_page < total_pages:
-            message.append(f"输入『我的宝宝.{current_page + 1}』查看下一页")
+        if result["next_cursor"]:
+            message.append(
+                f"输入『我的宝宝.{current_page + 1}.{result['next_cursor']}』查看下一页"
+            )
 
     await check_babies_cmd.send("\n".join(message))
 
 
+@baby_leaderboard_cmd.handle()
+@metrics.timed("handler", "baby_leaderboard")
+async def handle_baby_leaderboard(args: Message = CommandArg()):
+    """宝宝排行榜，参数为“夫妻”时按夫妻排行，否则按个人排行"""
+    kind = "pair" if args.extract_plain_text().strip() == "夫妻" else "user"
+    leaderboard = await marriage_manager.get_baby_leaderboard(limit=10, kind=kind)
+    if not leaderboard:
+        await baby_leaderboard_cmd.finish("还没有人生过宝宝呢！")
+
+    baby = marriage_manager.baby_process_manager
+    title = "💞 夫妻宝宝排行榜" if kind == "pair" else "🏆 宝宝排行榜"
+    message = [f"{title}:"]
+    for i, row in enumerate(leaderboard, 1):
+        owner = " ❤️ ".join(row["names"])
+        message.append(f"{i}. {owner} - {baby.format_baby_count_symbols(row['total'])}")
+
+    await baby_leaderboard_cmd.send("\n".join(message))
+
+
+@baby_totals_cmd.handle()
+@metrics.timed("handler", "baby_totals")
+async def handle_baby_totals(args: Message = CommandArg()):
+    """校验宝宝汇总表，参数为“修复”时按宝宝记录重建"""
+    repair = args.extract_plain_text().strip() == "修复"
+    drift = await marriage_manager.rebuild_baby_totals(repair=repair)
+    if not drift:
+        await baby_totals_cmd.finish("✅ 宝宝汇总与记录一致")
+    if repair:
+        await baby_totals_cmd.finish(f"🔧 已重建宝宝汇总，修正了 {drift} 条不一致")
+    await baby_totals_cmd.finish(
+        f"⚠️ 发现 {drift} 条宝宝汇总与记录不一致，发送『宝宝校验 修复』进行重建"
+    )
+
+
+@stats_cmd.handle()
+async def handle_stats():
+    """查看运行统计（仅超级用户）"""
+    await stats_cmd.finish(metrics.summary())
+
+
 @preference_cmd.handle()
+@metrics.timed("handler", "preference")
 async def handle_preference(event: Event, args: Message = CommandArg()):
     preference = args.extract_plain_text().strip()
 
@@ -698,6 +866,7 @@ async def handle_preference(event: Event, args: Message = CommandArg()):
 
 
 @divorce_cmd.handle()
+@metrics.timed("handler", "divorce")
 async def handle_marry(
     event: GroupMessageEvent,
     interface: QryItrface = None,
@@ -722,11 +891,17 @@ async def handle_marry(
     if target_id == user_id:
         return
 
-    # 获取用户信息
-    members = await interface.get_members(SceneType.GROUP, str(event.group_id))
+    limited = marriage_manager.rate_limiter.acquire(
+        "divorce", user_id, str(event.group_id)
+    )
+    if limited:
+        await divorce_cmd.finish(limited)
 
-    user_info = next((m.user for m in members if m.user.id == user_id), None)
-    target_info = next((m.user for m in members if m.user.id == target_id), None)
+    # 获取用户信息
+    group_id = str(event.group_id)
+    member_directory = marriage_manager.member_directory
+    user_info = await member_directory.get_member(interface, group_id, user_id)
+    target_info = await member_directory.get_member(interface, group_id, target_id)
 
     if not target_info:
         await divorce_cmd.finish("未在群聊中找到指定的用户！请确认@的是正确的群成员。")
@@ -0,0 +1,186 @@
+"""宝宝记录合并前后的空间与读取延迟基准
+
+按旧版本的写法（每生一次可能新增一条记录）生成一张 baby_records 表：
+--pairs 对夫妻，每对平均 --rows-per-pair 条记录，然后
+
+1. 记录数据库文件大小（VACUUM 后），以及“我的宝宝”分页查询在合并前的
+   写法（按 pair_key GROUP BY 聚合）下的延迟
+2. 用迁移 c6e2f8a1d359 中的 compact() 合并重复记录，并建立 pair_key 唯一索引
+3. 再次记录文件大小，以及合并后的写法（每对夫妻一行，直接读取）的延迟
+
+只测数据库，不加载 NoneBot。
+
+用法:
+    python benchmarks/bench_baby_compaction.py [--pairs 20000] [--rows-per-pair 8]
+        [--users 5000] [--queries 2000] [--chunk 500]
+"""
+
+import argparse
+import importlib.util
+import os
+import random
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import sqlalchemy as sa
+
+_spec = importlib.util.spec_from_file_location(
+    "compact_baby_records",
+    os.path.join(
+        os.path.dirname(__file__),
+        os.pardir,
+        "migrations",
+        "c6e2f8a1d359_compact_baby_records.py",
+    ),
+)
+_migration = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(_migration)
+
+metadata = sa.MetaData()
+# 合并前的表结构：pair_key 上是普通索引
+baby_records = sa.Table(
+    "baby_records",
+    metadata,
+    sa.Column("id", sa.Integer, primary_key=True, autoincrement=True),
+    sa.Column("marriage_id", sa.String(100), nullable=False, index=True),
+    sa.Column("parent1_id", sa.String(100), nullable=False, index=True),
+    sa.Column("parent1_name", sa.String(100)),
+    sa.Column("parent2_id", sa.String(100), nullable=False, index=True),
+    sa.Column("parent2_name", sa.String(100)),
+    sa.Column("pair_key", sa.String(201), nullable=False),
+    sa.Column("baby_count", sa.Integer, default=1),
+    sa.Column("created_at", sa.DateTime),
+    sa.Column("group_id", sa.String(100), nullable=False, index=True),
+    sa.Index("ix_baby_records_pair_key", "pair_key"),
+)
+
+
+def populate(engine, args) -> int:
+    rng = random.Random(args.seed)
+    users = [str(100000000 + i) for i in range(args.users)]
+    start = datetime(2026, 1, 1)
+    rows = []
+    for i in range(args.pairs):
+        user1, user2 = rng.sample(users, 2)
+        pair_key = "&".join(sorted((user1, user2)))
+        for j in range(max(1, int(rng.expovariate(1 / args.rows_per_pair)))):
+            # 由哪一方发起决定 parent1
+            parent1, parent2 = (user1, user2) if rng.random() < 0.5 else (user2, user1)
+            rows.append(
+                {
+                    "marriage_id": f"marriage_{i}",
+                    "parent1_id": parent1,
+                    "parent1_name": f"用户{parent1}",
+                    "parent2_id": parent2,
+                    "parent2_name": f"用户{parent2}",
+                    "pair_key": pair_key,
+                    "baby_count": rng.randint(1, 3),
+                    "created_at": start + timedelta(minutes=i * 7 + j),
+                    "group_id": str(rng.randint(1, 50)),
+                }
+            )
+    # 相同 pair_key 的夫妻可能被抽到多次，插入前打乱，模拟按时间交错写入
+    rng.shuffle(rows)
+    with engine.begin() as conn:
+        metadata.create_all(conn)
+        conn.execute(baby_records.insert(), rows)
+    return len(rows)
+
+
+def page_query(user_id: str, grouped: bool):
+    """“我的宝宝”第一页：合并前按 pair_key 聚合，合并后直接读取"""
+    t = baby_records.c
+    is_parent1 = t.parent1_id == user_id
+    user_name = sa.case((is_parent1, t.parent1_name), else_=t.parent2_name)
+    partner_name = sa.case((is_parent1, t.parent2_name), else_=t.parent1_name)
+    if grouped:
+        columns = [
+            t.pair_key,
+            sa.func.max(user_name),
+            sa.func.max(partner_name),
+            sa.func.sum(t.baby_count),
+            sa.func.max(t.created_at),
+        ]
+    else:
+        columns = [t.pair_key, user_name, partner_name, t.baby_count, t.created_at]
+    stmt = (
+        sa.select(*columns, sa.func.count().over())
+        .where(is_parent1 | (t.parent2_id == user_id))
+        # 最近生宝宝的夫妻在前
+        .order_by(columns[-1].desc(), t.pair_key)
+        .limit(5)
+    )
+    if grouped:
+        stmt = stmt.group_by(t.pair_key)
+    return stmt
+
+
+def measure(engine, path: str, args, grouped: bool) -> dict:
+    with engine.connect() as conn:
+        conn.exec_driver_sql("VACUUM")
+        rows = conn.scalar(sa.select(sa.func.count()).select_from(baby_records))
+
+    rng = random.Random(args.seed + 1)
+    users = [str(100000000 + rng.randrange(args.users)) for _ in range(args.queries)]
+    latencies = []
+    with engine.connect() as conn:
+        for user_id in users:
+            started = time.perf_counter()
+            conn.execute(page_query(user_id, grouped)).all()
+            latencies.append(time.perf_counter() - started)
+    latencies.sort()
+    return {
+        "rows": rows,
+        "size": os.path.getsize(path),
+        "avg_ms": statistics.mean(latencies) * 1000,
+        "p95_ms": latencies[int(len(latencies) * 0.95)] * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pairs", type=int, default=20000)
+    parser.add_argument("--rows-per-pair", type=float, default=8)
+    parser.add_argument("--users", type=int, default=5000)
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--chunk", type=int, default=_migration.CHUNK)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    path = os.path.join(tempfile.mkdtemp(prefix="marryme_bench_"), "babies.db")
+    engine = sa.create_engine(f"sqlite:///{path}")
+
+    inserted = populate(engine, args)
+    print(f"生成 {inserted} 条宝宝记录")
+    before = measure(engine, path, args, grouped=True)
+
+    started = time.perf_counter()
+    with engine.begin() as conn:
+        merged, deleted = _migration.compact(conn, args.chunk)
+        conn.exec_driver_sql("DROP INDEX ix_baby_records_pair_key")
+        conn.exec_driver_sql(
+            "CREATE UNIQUE INDEX uq_baby_records_pair_key ON baby_records (pair_key)"
+        )
+    elapsed = time.perf_counter() - started
+    print(
+        f"合并 {merged} 对夫妻，删除 {deleted} 条记录，"
+        f"耗时 {elapsed:.2f}s（每批 {args.chunk} 对）"
+    )
+    after = measure(engine, path, args, grouped=False)
+
+    print(f"{'':<8}{'记录数':>10}{'文件 KB':>12}{'平均 ms':>10}{'p95 ms':>10}")
+    for label, result in (("合并前", before), ("合并后", after)):
+        print(
+            f"{label:<8}{result['rows']:>10}{result['size'] / 1024:>12.0f}"
+            f"{result['avg_ms']:>10.3f}{result['p95_ms']:>10.3f}"
+        )
+    print(
+        f"空间节省 {(1 - after['size'] / before['size']) * 100:.1f}%，"
+        f"平均读取延迟降低 {(1 - after['avg_ms'] / before['avg_ms']) * 100:.1f}%"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+"""生宝宝过程记录的内存与吞吐基准
+
+对比旧实现（每个过程一个 7 键字典，引用 bot 对象和绑定方法，全局一把锁）
+与 ProcessRecord（__slots__，只存 ID，不加锁），在 10 万个并发过程下的
+每个过程内存占用，以及开始/完成的吞吐量。只测内存结构，不访问数据库。
+
+BabyProcessManager 中检查与占位之间没有 await，单个事件循环里不会交错，
+所以新实现不加锁；旧实现的全局锁同样从不发生争用，只有获取锁本身的开销。
+
+用法:
+    python benchmarks/bench_baby_processes.py [--processes 100000]
+"""
+
+import argparse
+import asyncio
+import gc
+import importlib.util
+import os
+import time
+import tracemalloc
+
+_spec = importlib.util.spec_from_file_location(
+    "ProcessRecord",
+    os.path.join(os.path.dirname(__file__), os.pardir, "ProcessRecord.py"),
+)
+_module = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(_module)
+ProcessRecord = _module.ProcessRecord
+
+
+class FakeBot:
+    self_id = "10000"
+
+
+class FakeManager:
+    async def have_baby_with_spouse(self, *args):
+        pass
+
+
+def pairs(n: int):
+    return [(f"{1000000 + i}", f"{2000000 + i}") for i in range(n)]
+
+
+def old_record(user1_id, user2_id, bot, manager):
+    return {
+        "user1_id": user1_id,
+        "user2_id": user2_id,
+        "group_id": "123456789",
+        "start_time": time.time(),
+        "duration": 1800,
+        "bot": bot,
+        # 每次访问都会生成新的绑定方法对象
+        "have_baby_callback": manager.have_baby_with_spouse,
+    }
+
+
+def new_record(user1_id, user2_id, bot, manager):
+    return ProcessRecord(
+        user1_id, user2_id, "123456789", bot.self_id, time.time(), 1800
+    )
+
+
+def measure_memory(make, ids) -> float:
+    bot, manager = FakeBot(), FakeManager()
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    records = [make(u1, u2, bot, manager) for u1, u2 in ids]
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del records
+    return (after - before) / len(ids)
+
+
+async def run_old(ids) -> float:
+    processes, lock = {}, asyncio.Lock()
+    bot, manager = FakeBot(), FakeManager()
+
+    async def start(u1, u2):
+        async with lock:
+            key = (u1, u2)
+            if key in processes:
+                return
+            processes[key] = old_record(u1, u2, bot, manager)
+
+    async def complete(u1, u2):
+        async with lock:
+            processes.pop((u1, u2), None)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(start(u1, u2) for u1, u2 in ids))
+    await asyncio.gather(*(complete(u1, u2) for u1, u2 in ids))
+    return time.perf_counter() - started
+
+
+async def run_new(ids) -> float:
+    processes = {}
+    bot, manager = FakeBot(), FakeManager()
+
+    async def start(u1, u2):
+        key = (u1, u2)
+        if key in processes:
+            return
+        processes[key] = new_record(u1, u2, bot, manager)
+
+    async def complete(u1, u2):
+        processes.pop((u1, u2), None)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(start(u1, u2) for u1, u2 in ids))
+    await asyncio.gather(*(complete(u1, u2) for u1, u2 in ids))
+    return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--processes", type=int, default=100_000)
+    args = parser.parse_args()
+
+    ids = pairs(args.processes)
+    old_bytes = measure_memory(old_record, ids)
+    new_bytes = measure_memory(new_record, ids)
+    print(f"每个过程的内存（{args.processes} 个过程，不含键与字典槽位）")
+    print(f"  旧: 字典     {old_bytes:8.1f} B")
+    print(f"  新: __slots__ {new_bytes:7.1f} B  ({old_bytes / new_bytes:.1f}x)")
+
+    print(f"\n开始 + 完成 {args.processes} 个并发过程的吞吐量（次/秒）")
+    old = asyncio.run(run_old(ids))
+    new = asyncio.run(run_new(ids))
+    ops = args.processes * 2
+    print(f"  旧 {ops / old:>10.0f}   新 {ops / new:>10.0f}   ({old / new:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
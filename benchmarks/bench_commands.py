@@ -0,0 +1,399 @@
+"""命令级负载与延迟基准
+
+启动一个不连接任何协议端的 NoneBot，加载本插件，注册一个假的 OneBot V11
+机器人（群成员、群信息等接口直接返回构造的数据，可配置接口延迟），然后用
+nonebot.message.handle_event 驱动真实的命令处理器：结婚、同意、拒绝、离婚、
+生宝宝、婚姻状态、我的宝宝、婚姻设置。
+
+输出总吞吐量，以及每个命令的 p50/p95/p99 延迟和平均 SQL 语句数；
+结果可以保存为 JSON，并与之前保存的结果对比。
+
+默认关闭“生宝宝”的时段限制和各命令的频率限制，否则大部分请求在进入
+数据库之前就被拒绝；头像下载替换为固定内容，延迟由 --avatar-latency 模拟。
+--db memory 使用 SQLite 共享缓存内存库，它只有表级锁，并发较高时会出现
+“table is locked”之类的错误，这些错误计入每个命令的 errors。
+
+用法:
+    python benchmarks/bench_commands.py [--db memory|file] [--ops 5000]
+        [--concurrency 32] [--groups 20] [--users-per-group 50]
+        [--mix marry=3,accept=3,reject=1,divorce=1,baby=2,check=3,babies=1,preference=1]
+        [--member-latency 0.0] [--avatar-latency 0.0] [--member-cache-ttl N]
+        [--rate-limits]
+        [--save results.json] [--compare baseline.json]
+"""
+
+import argparse
+import asyncio
+import contextvars
+import itertools
+import json
+import os
+import platform
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from collections import Counter, defaultdict
+from typing import Dict, List
+
+import nonebot
+from loguru import logger
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+DEFAULT_MIX = "marry=3,accept=3,reject=1,divorce=1,baby=2,check=3,babies=1,preference=1"
+
+# 当前正在执行的命令，用于把 SQL 语句计到对应命令上
+current_command: contextvars.ContextVar = contextvars.ContextVar(
+    "current_command", default=None
+)
+
+
+def parse_mix(text: str) -> Dict[str, int]:
+    mix = {}
+    for item in text.split(","):
+        name, _, weight = item.partition("=")
+        mix[name.strip()] = int(weight or 1)
+    return mix
+
+
+def percentile(values: List[float], p: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+
+def init_nonebot(args) -> str:
+    """初始化 NoneBot 并加载插件，返回数据库文件路径（内存库为 None）"""
+    db_path = None
+    if args.db == "memory":
+        # 共享缓存的内存库，连接池中的所有连接看到同一个数据库；
+        # 最后一个连接关闭时内存库即被销毁，所以额外保持一个连接直到进程退出
+        name = f"file:marryme_bench_{os.getpid()}?mode=memory&cache=shared"
+        args.keeper = sqlite3.connect(name, uri=True)
+        url = f"sqlite+aiosqlite:///{name}&uri=true"
+    else:
+        db_path = args.db_path or os.path.join(
+            tempfile.mkdtemp(prefix="marryme_bench_"), "bench.db"
+        )
+        if os.path.exists(db_path):
+            os.remove(db_path)
+        url = f"sqlite+aiosqlite:///{db_path}"
+
+    config = {
+        "driver": "~none",
+        "sqlalchemy_database_url": url,
+        "alembic_startup_check": False,
+        "command_start": [""],
+        "log_level": "WARNING",
+    }
+    if not args.rate_limits:
+        config["marryme_rate_limits"] = {}
+    if args.member_cache_ttl is not None:
+        config["marryme_member_cache_ttl"] = args.member_cache_ttl
+    nonebot.init(**config)
+
+    from nonebot.adapters.onebot.v11 import Adapter
+
+    nonebot.get_driver().register_adapter(Adapter)
+    for plugin in (
+        "nonebot_plugin_orm",
+        "nonebot_plugin_apscheduler",
+        "nonebot_plugin_uninfo",
+    ):
+        nonebot.require(plugin)
+
+    sys.path.insert(0, os.path.dirname(ROOT))
+    nonebot.load_plugin(os.path.basename(ROOT))
+    return db_path
+
+
+def make_bot(args):
+    """构造假的 OneBot V11 机器人，所有接口调用在本地应答"""
+    from nonebot.adapters.onebot.v11 import Adapter, Bot
+
+    class FakeBot(Bot):
+        sent = 0
+        api_calls: Counter = Counter()
+
+        async def call_api(self, api: str, **data):
+            FakeBot.api_calls[api] += 1
+            if api in ("send_msg", "send_group_msg"):
+                FakeBot.sent += 1
+                return {"message_id": FakeBot.sent}
+
+            if args.member_latency:
+                await asyncio.sleep(args.member_latency)
+            if api == "get_group_info":
+                return {"group_id": data["group_id"], "group_name": "测试群"}
+            if api == "get_group_member_info":
+                user_id = data["user_id"]
+                return {
+                    "group_id": data["group_id"],
+                    "user_id": user_id,
+                    "nickname": f"用户{user_id}",
+                    "card": "",
+                    "role": "member",
+                    "join_time": 0,
+                    "sex": "unknown",
+                }
+            if api == "get_group_member_list":
+                return []
+            if api in ("get_stranger_info", "get_login_info"):
+                return {
+                    "user_id": data.get("user_id", self.self_id),
+                    "nickname": "机器人",
+                }
+            return {}
+
+    return FakeBot(nonebot.get_adapter(Adapter), "10000")
+
+
+class Workload:
+    """按命令比例生成消息，并粗略跟踪求婚和婚姻，让同意/离婚/生宝宝有意义"""
+
+    def __init__(self, args):
+        self.rng = random.Random(args.seed)
+        self.groups = [str(900000 + g) for g in range(args.groups)]
+        self.users = {
+            group: [str(1000000 + g * 10000 + u) for u in range(args.users_per_group)]
+            for g, group in enumerate(self.groups)
+        }
+        mix = parse_mix(args.mix)
+        self.commands = list(mix)
+        self.weights = [mix[name] for name in self.commands]
+        self.proposals = defaultdict(list)  # 群 -> [(求婚者, 被求婚者)]
+        self.couples = defaultdict(list)  # 群 -> [(用户, 配偶)]
+        self.message_ids = itertools.count(1)
+
+    def next(self):
+        """返回 (命令名, 群号, 用户ID, 消息文本)"""
+        command = self.rng.choices(self.commands, self.weights)[0]
+        group = self.rng.choice(self.groups)
+        users = self.users[group]
+        user, other = self.rng.sample(users, 2)
+
+        if command == "marry":
+            self.proposals[group].append((user, other))
+            return command, group, user, f"结婚[CQ:at,qq={other}]"
+        if command in ("accept", "reject"):
+            if self.proposals[group]:
+                proposer, user = self.proposals[group].pop(
+                    self.rng.randrange(len(self.proposals[group]))
+                )
+                if command == "accept":
+                    self.couples[group].append((user, proposer))
+            return command, group, user, "同意" if command == "accept" else "拒绝"
+        if command in ("divorce", "baby"):
+            if self.couples[group]:
+                index = self.rng.randrange(len(self.couples[group]))
+                user, other = self.couples[group][index]
+                if command == "divorce":
+                    self.couples[group].pop(index)
+            text = "离婚" if command == "divorce" else "生宝宝"
+            return command, group, user, f"{text}[CQ:at,qq={other}]"
+        if command == "check":
+            return command, group, user, "婚姻状态"
+        if command == "babies":
+            return command, group, user, "我的宝宝"
+        if command == "preference":
+            option = self.rng.choice(["状态", "状态", "状态", "恢复全部"])
+            return command, group, user, f"婚姻设置 {option}"
+        raise ValueError(f"未知命令: {command}")
+
+    def event(self, bot, group: str, user: str, text: str):
+        from nonebot.adapters.onebot.v11 import Adapter
+
+        return Adapter.json_to_event(
+            {
+                "time": int(time.time()),
+                "self_id": int(bot.self_id),
+                "post_type": "message",
+                "message_type": "group",
+                "sub_type": "normal",
+                "message_id": next(self.message_ids),
+                "group_id": int(group),
+                "user_id": int(user),
+                "message": text,
+                "raw_message": text,
+                "font": 0,
+                "sender": {"user_id": int(user), "nickname": f"用户{user}"},
+            }
+        )
+
+
+def install_statement_counter(statements: Counter):
+    """按当前命令统计执行的 SQL 语句数"""
+    from sqlalchemy import event
+    import nonebot_plugin_orm
+
+    def before_cursor_execute(*_):
+        command = current_command.get()
+        if command is not None:
+            statements[command] += 1
+
+    for engine in nonebot_plugin_orm._engines.values():
+        event.listen(engine.sync_engine, "before_cursor_execute", before_cursor_execute)
+
+
+async def run(args) -> dict:
+    from nonebot.message import handle_event
+
+    plugin = nonebot.get_plugin(os.path.basename(ROOT))
+    module = plugin.module
+    manager = module.marriage_manager
+
+    # 生宝宝不受时段限制
+    if not args.time_restriction:
+        module.check_time_restriction = lambda *_, **__: (True, None)
+
+    # 头像下载改为本地内容
+    async def fake_fetch(url):
+        if args.avatar_latency:
+            await asyncio.sleep(args.avatar_latency)
+        return b"\x89PNG\r\n\x1a\n" + b"\0" * 1024
+
+    manager.avatar_cache.fetch = fake_fetch
+
+    driver = nonebot.get_driver()
+    await driver._lifespan.startup()
+    bot = make_bot(args)
+    driver._bot_connect(bot)
+
+    statements = Counter()
+    install_statement_counter(statements)
+    # 命令执行期间记录的 ERROR 日志数
+    errors = Counter()
+    logger.add(
+        lambda _: errors.update([current_command.get()]),
+        level="ERROR",
+        filter=lambda _: current_command.get() is not None,
+    )
+    latencies: Dict[str, List[float]] = defaultdict(list)
+    workload = Workload(args)
+    queue: asyncio.Queue = asyncio.Queue()
+    for _ in range(args.ops):
+        queue.put_nowait(workload.next())
+
+    async def worker():
+        while not queue.empty():
+            command, group, user, text = queue.get_nowait()
+            event = workload.event(bot, group, user, text)
+            token = current_command.set(command)
+            started = time.perf_counter()
+            try:
+                await handle_event(bot, event)
+            finally:
+                latencies[command].append(time.perf_counter() - started)
+                current_command.reset(token)
+
+    try:
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+        elapsed = time.perf_counter() - started
+    finally:
+        driver._bot_disconnect(bot)
+        await driver._lifespan.shutdown()
+
+    commands = {}
+    for command, values in sorted(latencies.items()):
+        commands[command] = {
+            "count": len(values),
+            "p50_ms": percentile(values, 0.50) * 1000,
+            "p95_ms": percentile(values, 0.95) * 1000,
+            "p99_ms": percentile(values, 0.99) * 1000,
+            "queries": statements[command] / len(values),
+            "errors": errors[command],
+        }
+
+    return {
+        "config": {
+            key: value
+            for key, value in vars(args).items()
+            if key not in ("save", "compare", "keeper")
+        },
+        "python": platform.python_version(),
+        "elapsed_s": elapsed,
+        "throughput": args.ops / elapsed,
+        "api_calls": dict(type(bot).api_calls),
+        "commands": commands,
+    }
+
+
+def report(result: dict, baseline: dict = None):
+    print(
+        f"{result['config']['ops']} 个命令，并发 {result['config']['concurrency']}，"
+        f"耗时 {result['elapsed_s']:.2f}s，吞吐 {result['throughput']:.1f} 命令/秒"
+    )
+    header = f"{'命令':<12}{'次数':>7}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'SQL/次':>9}{'错误':>6}"
+    print(header)
+    for command, stats in result["commands"].items():
+        line = (
+            f"{command:<12}{stats['count']:>7}{stats['p50_ms']:>10.2f}"
+            f"{stats['p95_ms']:>10.2f}{stats['p99_ms']:>10.2f}{stats['queries']:>9.1f}{stats['errors']:>6}"
+        )
+        old = (baseline or {}).get("commands", {}).get(command)
+        if old and old["p95_ms"]:
+            change = (stats["p95_ms"] - old["p95_ms"]) / old["p95_ms"] * 100
+            line += (
+                f"   p95 {change:+.0f}%  SQL {stats['queries'] - old['queries']:+.1f}"
+            )
+        print(line)
+    if baseline:
+        change = (result["throughput"] - baseline["throughput"]) / baseline[
+            "throughput"
+        ]
+        print(f"吞吐相对基线: {change * 100:+.1f}%")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--db", choices=["memory", "file"], default="file")
+    parser.add_argument("--db-path", help="--db file 时使用的数据库文件（会被清空）")
+    parser.add_argument("--ops", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--groups", type=int, default=20)
+    parser.add_argument("--users-per-group", type=int, default=50)
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="命令=权重，逗号分隔")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument(
+        "--member-latency", type=float, default=0.0, help="模拟群成员接口延迟（秒）"
+    )
+    parser.add_argument(
+        "--avatar-latency", type=float, default=0.0, help="模拟头像下载延迟（秒）"
+    )
+    parser.add_argument(
+        "--member-cache-ttl",
+        type=int,
+        help="群成员缓存有效期（秒），设为 0 时每次都调用群成员接口",
+    )
+    parser.add_argument(
+        "--rate-limits", action="store_true", help="保留插件配置的频率限制"
+    )
+    parser.add_argument(
+        "--time-restriction", action="store_true", help="保留生宝宝的时段限制"
+    )
+    parser.add_argument("--save", help="把结果保存为 JSON")
+    parser.add_argument("--compare", help="与之前保存的 JSON 结果对比")
+    args = parser.parse_args()
+
+    db_path = init_nonebot(args)
+    result = asyncio.run(run(args))
+    result["config"]["db_path"] = db_path
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+    report(result, baseline)
+
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+        print(f"结果已保存到 {args.save}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,217 @@
+"""复合索引前后对比基准
+
+用标准库 sqlite3 建立与插件相同结构的表，各灌入一百万行数据，
+分别在只有单列索引、以及加上复合索引之后，测量热点查询的平均耗时。
+
+用法:
+    python benchmarks/bench_indexes.py [--rows 1000000] [--queries 2000] [--db PATH]
+"""
+
+import argparse
+import os
+import random
+import sqlite3
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+SCHEMA = """
+CREATE TABLE marriage_requests (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    request_id VARCHAR(100) NOT NULL,
+    proposer_id VARCHAR(100) NOT NULL,
+    proposer_name VARCHAR(100),
+    target_id VARCHAR(100) NOT NULL,
+    target_name VARCHAR(100),
+    group_id VARCHAR(100) NOT NULL,
+    created_at DATETIME,
+    status VARCHAR(20)
+);
+CREATE UNIQUE INDEX ix_marriage_requests_request_id ON marriage_requests (request_id);
+CREATE INDEX ix_marriage_requests_proposer_id ON marriage_requests (proposer_id);
+CREATE INDEX ix_marriage_requests_target_id ON marriage_requests (target_id);
+CREATE INDEX ix_marriage_requests_group_id ON marriage_requests (group_id);
+
+CREATE TABLE marriages (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    marriage_id VARCHAR(100) NOT NULL,
+    proposer_id VARCHAR(100) NOT NULL,
+    proposer_name VARCHAR(100),
+    target_id VARCHAR(100) NOT NULL,
+    target_name VARCHAR(100),
+    group_id VARCHAR(100) NOT NULL,
+    married_at DATETIME,
+    status VARCHAR(20)
+);
+CREATE UNIQUE INDEX ix_marriages_marriage_id ON marriages (marriage_id);
+CREATE INDEX ix_marriages_proposer_id ON marriages (proposer_id);
+CREATE INDEX ix_marriages_target_id ON marriages (target_id);
+CREATE INDEX ix_marriages_group_id ON marriages (group_id);
+"""
+
+COMPOSITE_INDEXES = """
+CREATE INDEX ix_marriage_requests_status_created_at
+    ON marriage_requests (status, created_at);
+CREATE INDEX ix_marriage_requests_target_group_status_created
+    ON marriage_requests (target_id, group_id, status, created_at);
+CREATE INDEX ix_marriages_proposer_target_status
+    ON marriages (proposer_id, target_id, status);
+CREATE INDEX ix_marriages_target_status ON marriages (target_id, status);
+ANALYZE;
+"""
+
+QUERIES = {
+    "get_pending_requests": (
+        "SELECT * FROM marriage_requests"
+        " WHERE target_id = ? AND group_id = ? AND status = 'pending'"
+        " ORDER BY created_at DESC",
+        lambda p: (p.user(), p.group()),
+    ),
+    "cleanup_expired_requests": (
+        "SELECT request_id, group_id FROM marriage_requests"
+        " WHERE status = 'pending' AND created_at < ?",
+        lambda p: (p.expired_before,),
+    ),
+    "get_user_marriage": (
+        "SELECT * FROM marriages"
+        " WHERE ((proposer_id = ? AND target_id = ?)"
+        " OR (proposer_id = ? AND target_id = ?)) AND status = 'married'",
+        lambda p: p.pair(),
+    ),
+    "get_user_marriages": (
+        "SELECT * FROM marriages"
+        " WHERE (proposer_id = ? OR target_id = ?) AND status = 'married'",
+        lambda p: (p.user(),) * 2,
+    ),
+}
+
+
+class Params:
+    """随机查询参数"""
+
+    def __init__(self, users: int, groups: int, now: datetime):
+        self.users = users
+        self.groups = groups
+        self.expired_before = now - timedelta(seconds=120)
+
+    def user(self) -> str:
+        return str(random.randrange(self.users))
+
+    def group(self) -> str:
+        return str(random.randrange(self.groups))
+
+    def pair(self) -> tuple:
+        a, b = self.user(), self.user()
+        return (a, b, b, a)
+
+
+def seed(conn: sqlite3.Connection, rows: int, users: int, groups: int, now: datetime):
+    statuses = ["accepted"] * 6 + ["rejected"] * 2 + ["expired"] + ["pending"]
+    start = now - timedelta(days=30)
+    span = int((now - start).total_seconds())
+    # 过期调度器会及时处理超时请求，只有最近几分钟内的请求还处于 pending
+    pending_after = now - timedelta(minutes=5)
+
+    def requests():
+        for i in range(rows):
+            created_at = start + timedelta(seconds=random.randrange(span))
+            status = random.choice(statuses)
+            if status == "pending" and created_at < pending_after:
+                status = "expired"
+            yield (
+                f"req_{i}",
+                str(random.randrange(users)),
+                str(random.randrange(users)),
+                str(random.randrange(groups)),
+                created_at.isoformat(sep=" "),
+                status,
+            )
+
+    def marriages():
+        for i in range(rows):
+            yield (
+                f"marriage_{i}",
+                str(random.randrange(users)),
+                str(random.randrange(users)),
+                str(random.randrange(groups)),
+                random.choice(["married", "divorced", "divorced"]),
+            )
+
+    conn.executemany(
+        "INSERT INTO marriage_requests"
+        " (request_id, proposer_id, target_id, group_id, created_at, status)"
+        " VALUES (?, ?, ?, ?, ?, ?)",
+        requests(),
+    )
+    conn.executemany(
+        "INSERT INTO marriages (marriage_id, proposer_id, target_id, group_id, status)"
+        " VALUES (?, ?, ?, ?, ?)",
+        marriages(),
+    )
+    conn.execute("ANALYZE")
+    conn.commit()
+
+
+def measure(conn: sqlite3.Connection, params: Params, queries: int) -> dict:
+    results = {}
+    for name, (sql, make_args) in QUERIES.items():
+        plan = " | ".join(
+            row[-1]
+            for row in conn.execute("EXPLAIN QUERY PLAN " + sql, make_args(params))
+        )
+        random.seed(name)
+        started = time.perf_counter()
+        executed = 0
+        # 全表扫描的查询很慢，每个查询最多跑 5 秒
+        while executed < queries and time.perf_counter() - started < 5:
+            conn.execute(sql, make_args(params)).fetchall()
+            executed += 1
+        elapsed = time.perf_counter() - started
+        results[name] = (elapsed / executed * 1e6, plan)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--users", type=int, default=50_000)
+    parser.add_argument("--groups", type=int, default=200)
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--db", help="数据库文件路径（默认使用临时文件）")
+    args = parser.parse_args()
+
+    path = args.db or os.path.join(tempfile.mkdtemp(), "bench_indexes.sqlite3")
+    if os.path.exists(path):
+        os.remove(path)
+    conn = sqlite3.connect(path)
+    conn.executescript(SCHEMA)
+
+    now = datetime.now()
+    random.seed(0)
+    print(f"灌入数据: 每张表 {args.rows} 行 -> {path}")
+    started = time.perf_counter()
+    seed(conn, args.rows, args.users, args.groups, now)
+    print(f"灌入耗时 {time.perf_counter() - started:.1f}s")
+
+    params = Params(args.users, args.groups, now)
+    before = measure(conn, params, args.queries)
+    conn.executescript(COMPOSITE_INDEXES)
+    after = measure(conn, params, args.queries)
+
+    print(f"\n{'查询':<26}{'之前(us)':>12}{'之后(us)':>12}{'加速':>9}")
+    for name in QUERIES:
+        before_us, before_plan = before[name]
+        after_us, after_plan = after[name]
+        print(
+            f"{name:<26}{before_us:>12.1f}{after_us:>12.1f}{before_us / after_us:>8.1f}x"
+        )
+        print(f"    之前: {before_plan}")
+        print(f"    之后: {after_plan}")
+
+    conn.close()
+    if not args.db:
+        os.remove(path)
+
+
+if __name__ == "__main__":
+    main()
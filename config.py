@@ -0,0 +1,70 @@
+from typing import Dict, Optional
+
+from nonebot import get_plugin_config
+from pydantic import BaseModel, Field
+
+from .RateLimiter import RateLimitRule
+
+
+class Config(BaseModel):
+    """插件配置"""
+
+    # 群成员缓存：单个成员的有效期（秒）与最多缓存的群数量
+    marryme_member_cache_ttl: int = 300
+    marryme_member_cache_groups: int = 128
+
+    # 头像缓存：内存预算、单个头像大小上限、有效期（秒）
+    marryme_avatar_cache_bytes: int = 32 * 1024 * 1024
+    marryme_avatar_max_size: int = 15 * 1024 * 1024
+    marryme_avatar_cache_ttl: int = 24 * 3600
+    # 头像磁盘溢出目录（不配置则只缓存在内存，文件写在其下的 marryme_avatars 子目录）及其容量
+    marryme_avatar_spill_dir: Optional[str] = None
+    marryme_avatar_spill_bytes: int = 256 * 1024 * 1024
+
+    # 用户偏好缓存最多缓存的 (用户, 群) 条目数，包括“没有设置偏好”的结果
+    marryme_preference_cache_size: int = 65536
+
+    # 群通知发件箱：合并窗口（秒）内的通知合并为一条，单条最多合并的通知数
+    marryme_outbox_coalesce_window: float = 1.0
+    marryme_outbox_max_coalesce: int = Field(10, ge=1)
+    # 发件箱发送频率：每个群与全局的令牌桶容量及恢复一个令牌的间隔（秒），
+    # 发件箱总是限流，容量和间隔都必须为正
+    marryme_outbox_group_burst: int = Field(3, ge=1)
+    marryme_outbox_group_interval: float = Field(2.0, gt=0)
+    marryme_outbox_global_burst: int = Field(20, ge=1)
+    marryme_outbox_global_interval: float = Field(0.2, gt=0)
+    # 发送失败的通知重试间隔（秒，逐次递增）与最多重试次数
+    marryme_outbox_retry_delay: float = 5.0
+    marryme_outbox_max_retries: int = 3
+
+    # 每日重置后分批删除旧数据：每批行数与批间隔（秒）
+    marryme_purge_chunk: int = 500
+    marryme_purge_pause: float = 0.1
+
+    # 运行统计：Prometheus 文本文件路径（不配置则不写入）及写入间隔（秒）
+    marryme_metrics_file: Optional[str] = None
+    marryme_metrics_interval: int = 60
+
+    # 慢查询日志：超过阈值（毫秒，默认 None 关闭）的语句连同参数和查询计划写入
+    # 滚动日志文件（不配置文件则只输出到机器人日志）
+    marryme_slow_query_ms: Optional[float] = None
+    marryme_slow_query_log: Optional[str] = None
+    marryme_slow_query_rotation: str = "10 MB"
+    marryme_slow_query_retention: int = 5
+
+    # 各命令的频率限制：marry 求婚、baby 生宝宝、divorce 离婚
+    # 求婚每天最多 4 次（只计待处理和已接受的请求），令牌桶用于拦截刷屏
+    marryme_rate_limits: Dict[str, RateLimitRule] = {
+        "marry": RateLimitRule(
+            user_daily=4,
+            user_burst=3,
+            user_interval=20,
+            group_burst=20,
+            group_interval=3,
+        ),
+        "baby": RateLimitRule(user_burst=3, user_interval=20),
+        "divorce": RateLimitRule(user_burst=3, user_interval=20),
+    }
+
+
+plugin_config = get_plugin_config(Config)
@@ -0,0 +1,67 @@
+"""unique active marriage
+
+迁移 ID: 3b8d1e6f4c92
+父迁移: 8c3f5d27b0e4
+创建时间: 2026-10-18 15:00:00.000000
+
+"""
+
+from __future__ import annotations
+
+from collections.abc import Sequence
+
+from alembic import op
+import sqlalchemy as sa
+
+revision: str = "3b8d1e6f4c92"
+down_revision: str | Sequence[str] | None = "8c3f5d27b0e4"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+
+def upgrade(name: str = "") -> None:
+    if name:
+        return
+    # 并发接受可能已经留下了同一代中重复的有效婚姻，只保留最早的一段
+    marriages = sa.table(
+        "marriages",
+        sa.column("id", sa.Integer),
+        sa.column("pair_key", sa.String),
+        sa.column("generation", sa.Integer),
+        sa.column("status", sa.String),
+    )
+    first = (
+        sa.select(sa.func.min(marriages.c.id).label("id"))
+        .where(marriages.c.status == "married")
+        .group_by(marriages.c.pair_key, marriages.c.generation)
+    )
+    op.execute(
+        marriages.update()
+        .where(marriages.c.status == "married", marriages.c.id.not_in(first))
+        .values(status="divorced")
+    )
+
+    # 部分唯一索引，只约束有效婚姻（插件只支持 SQLite 与 PostgreSQL）
+    with op.batch_alter_table("marriages", schema=None) as batch_op:
+        batch_op.drop_index("ix_marriages_pair_key_married")
+        batch_op.create_index(
+            "uq_marriages_pair_key_married",
+            ["pair_key", "generation"],
+            unique=True,
+            sqlite_where=sa.text("status = 'married'"),
+            postgresql_where=sa.text("status = 'married'"),
+        )
+
+
+def downgrade(name: str = "") -> None:
+    if name:
+        return
+    with op.batch_alter_table("marriages", schema=None) as batch_op:
+        batch_op.drop_index("uq_marriages_pair_key_married")
+        batch_op.create_index(
+            "ix_marriages_pair_key_married",
+            ["pair_key"],
+            unique=False,
+            sqlite_where=sa.text("status = 'married'"),
+            postgresql_where=sa.text("status = 'married'"),
+        )
@@ -0,0 +1,90 @@
+"""pair key
+
+迁移 ID: 45fb706b3b3f
+父迁移: a5be593cdd43
+创建时间: 2026-10-18 12:30:00.000000
+
+"""
+
+from __future__ import annotations
+
+from collections.abc import Sequence
+
+from alembic import op
+import sqlalchemy as sa
+
+revision: str = "45fb706b3b3f"
+down_revision: str | Sequence[str] | None = "a5be593cdd43"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+
+def _pair_key(user1_id: sa.ColumnClause, user2_id: sa.ColumnClause):
+    """与 models.make_pair_key 相同的规则：排序后用 & 连接"""
+    return sa.case(
+        (user1_id <= user2_id, user1_id + "&" + user2_id),
+        else_=user2_id + "&" + user1_id,
+    )
+
+
+def upgrade(name: str = "") -> None:
+    if name:
+        return
+    with op.batch_alter_table("marriages", schema=None) as batch_op:
+        batch_op.add_column(sa.Column("pair_key", sa.String(length=201), nullable=True))
+    with op.batch_alter_table("baby_records", schema=None) as batch_op:
+        batch_op.add_column(sa.Column("pair_key", sa.String(length=201), nullable=True))
+
+    # 回填已有数据
+    marriages = sa.table(
+        "marriages",
+        sa.column("proposer_id", sa.String),
+        sa.column("target_id", sa.String),
+        sa.column("pair_key", sa.String),
+    )
+    op.execute(
+        marriages.update().values(
+            pair_key=_pair_key(marriages.c.proposer_id, marriages.c.target_id)
+        )
+    )
+    baby_records = sa.table(
+        "baby_records",
+        sa.column("parent1_id", sa.String),
+        sa.column("parent2_id", sa.String),
+        sa.column("pair_key", sa.String),
+    )
+    op.execute(
+        baby_records.update().values(
+            pair_key=_pair_key(baby_records.c.parent1_id, baby_records.c.parent2_id)
+        )
+    )
+
+    with op.batch_alter_table("marriages", schema=None) as batch_op:
+        batch_op.alter_column(
+            "pair_key", existing_type=sa.String(length=201), nullable=False
+        )
+        batch_op.create_index(
+            "ix_marriages_pair_key_married",
+            ["pair_key"],
+            unique=False,
+            sqlite_where=sa.text("status = 'married'"),
+            postgresql_where=sa.text("status = 'married'"),
+        )
+    with op.batch_alter_table("baby_records", schema=None) as batch_op:
+        batch_op.alter_column(
+            "pair_key", existing_type=sa.String(length=201), nullable=False
+        )
+        batch_op.create_index(
+            batch_op.f("ix_baby_records_pair_key"), ["pair_key"], unique=False
+        )
+
+
+def downgrade(name: str = "") -> None:
+    if name:
+        return
+    with op.batch_alter_table("baby_records", schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f("ix_baby_records_pair_key"))
+        batch_op.drop_column("pair_key")
+    with op.batch_alter_table("marriages", schema=None) as batch_op:
+        batch_op.drop_index("ix_marriages_pair_key_married")
+        batch_op.drop_column("pair_key")
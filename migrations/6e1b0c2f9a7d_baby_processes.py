@@ -0,0 +1,50 @@
+"""baby processes
+
+迁移 ID: 6e1b0c2f9a7d
+父迁移: d145403a834c
+创建时间: 2026-10-18 13:30:00.000000
+
+"""
+
+from __future__ import annotations
+
+from collections.abc import Sequence
+
+from alembic import op
+import sqlalchemy as sa
+
+revision: str = "6e1b0c2f9a7d"
+down_revision: str | Sequence[str] | None = "d145403a834c"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+
+def upgrade(name: str = "") -> None:
+    if name:
+        return
+    op.create_table(
+        "baby_processes",
+        sa.Column("pair_key", sa.String(length=201), nullable=False),
+        sa.Column("user1_id", sa.String(length=100), nullable=False),
+        sa.Column("user2_id", sa.String(length=100), nullable=False),
+        sa.Column("group_id", sa.String(length=100), nullable=False),
+        sa.Column("bot_id", sa.String(length=100), nullable=True),
+        sa.Column("started_at", sa.DateTime(), nullable=False),
+        sa.Column("duration", sa.Integer(), nullable=False),
+        sa.Column("finish_at", sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint("pair_key", name=op.f("pk_baby_processes")),
+        info={"bind_key": "marryme"},
+    )
+    with op.batch_alter_table("baby_processes", schema=None) as batch_op:
+        batch_op.create_index(
+            batch_op.f("ix_baby_processes_finish_at"), ["finish_at"], unique=False
+        )
+
+
+def downgrade(name: str = "") -> None:
+    if name:
+        return
+    with op.batch_alter_table("baby_processes", schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f("ix_baby_processes_finish_at"))
+
+    op.drop_table("baby_processes")
@@ -0,0 +1,53 @@
+"""unique user preference
+
+迁移 ID: 7a4c2e9d1b65
+父迁移: 3b8d1e6f4c92
+创建时间: 2026-10-18 15:30:00.000000
+
+"""
+
+from __future__ import annotations
+
+from collections.abc import Sequence
+
+from alembic import op
+import sqlalchemy as sa
+
+revision: str = "7a4c2e9d1b65"
+down_revision: str | Sequence[str] | None = "3b8d1e6f4c92"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+
+def upgrade(name: str = "") -> None:
+    if name:
+        return
+    # 之前先查询再插入，并发时可能插入了重复的偏好；读取和更新一直用的是
+    # 最早的一条，保留它，删除其余的
+    preferences = sa.table(
+        "user_preferences",
+        sa.column("id", sa.Integer),
+        sa.column("user_id", sa.String),
+        sa.column("group_id", sa.String),
+    )
+    first = sa.select(sa.func.min(preferences.c.id)).group_by(
+        preferences.c.user_id, preferences.c.group_id
+    )
+    op.execute(preferences.delete().where(preferences.c.id.not_in(first)))
+
+    # (user_id, group_id) 的唯一索引可以代替 user_id 上的单列索引
+    with op.batch_alter_table("user_preferences", schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f("ix_user_preferences_user_id"))
+        batch_op.create_index(
+            "uq_user_preferences_user_group", ["user_id", "group_id"], unique=True
+        )
+
+
+def downgrade(name: str = "") -> None:
+    if name:
+        return
+    with op.batch_alter_table("user_preferences", schema=None) as batch_op:
+        batch_op.drop_index("uq_user_preferences_user_group")
+        batch_op.create_index(
+            batch_op.f("ix_user_preferences_user_id"), ["user_id"], unique=False
+        )
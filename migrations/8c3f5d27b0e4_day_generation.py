@@ -0,0 +1,52 @@
+"""day generation
+
+迁移 ID: 8c3f5d27b0e4
+父迁移: 6e1b0c2f9a7d
+创建时间: 2026-10-18 14:00:00.000000
+
+"""
+
+from __future__ import annotations
+
+from collections.abc import Sequence
+
+from alembic import op
+import sqlalchemy as sa
+
+revision: str = "8c3f5d27b0e4"
+down_revision: str | Sequence[str] | None = "6e1b0c2f9a7d"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+
+def upgrade(name: str = "") -> None:
+    if name:
+        return
+    plugin_state = op.create_table(
+        "plugin_state",
+        sa.Column("key", sa.String(length=50), nullable=False),
+        sa.Column("value", sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint("key", name=op.f("pk_plugin_state")),
+        info={"bind_key": "marryme"},
+    )
+    op.bulk_insert(plugin_state, [{"key": "generation", "value": 0}])
+
+    # 已有数据都属于第 0 代；几乎所有行都属于当前代，不单独建索引，
+    # 否则 SQLite 会优先选这个区分度极低的索引而放弃 pair_key 等索引
+    for table in ("marriage_requests", "marriages"):
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.add_column(
+                sa.Column(
+                    "generation", sa.Integer(), server_default="0", nullable=False
+                )
+            )
+
+
+def downgrade(name: str = "") -> None:
+    if name:
+        return
+    for table in ("marriages", "marriage_requests"):
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.drop_column("generation")
+
+    op.drop_table("plugin_state")
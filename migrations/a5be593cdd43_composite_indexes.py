@@ -0,0 +1,63 @@
+"""composite indexes
+
+迁移 ID: a5be593cdd43
+父迁移: abc4d464ed16
+创建时间: 2026-10-18 12:10:00.000000
+
+"""
+
+from __future__ import annotations
+
+from collections.abc import Sequence
+
+from alembic import op
+import sqlalchemy as sa
+
+revision: str = "a5be593cdd43"
+down_revision: str | Sequence[str] | None = "abc4d464ed16"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+
+def upgrade(name: str = "") -> None:
+    if name:
+        return
+    with op.batch_alter_table("marriage_requests", schema=None) as batch_op:
+        batch_op.create_index(
+            "ix_marriage_requests_status_created_at",
+            ["status", "created_at"],
+            unique=False,
+        )
+        batch_op.create_index(
+            "ix_marriage_requests_target_group_status_created",
+            ["target_id", "group_id", "status", "created_at"],
+            unique=False,
+        )
+        batch_op.create_index(
+            "ix_marriage_requests_proposer_created_status",
+            ["proposer_id", "created_at", "status"],
+            unique=False,
+        )
+
+    with op.batch_alter_table("marriages", schema=None) as batch_op:
+        batch_op.create_index(
+            "ix_marriages_proposer_target_status",
+            ["proposer_id", "target_id", "status"],
+            unique=False,
+        )
+        batch_op.create_index(
+            "ix_marriages_target_status", ["target_id", "status"], unique=False
+        )
+
+
+def downgrade(name: str = "") -> None:
+    if name:
+        return
+    with op.batch_alter_table("marriages", schema=None) as batch_op:
+        batch_op.drop_index("ix_marriages_target_status")
+        batch_op.drop_index("ix_marriages_proposer_target_status")
+
+    with op.batch_alter_table("marriage_requests", schema=None) as batch_op:
+        batch_op.drop_index("ix_marriage_requests_proposer_created_status")
+        batch_op.drop_index("ix_marriage_requests_target_group_status_created")
+        batch_op.drop_index("ix_marriage_requests_status_created_at")
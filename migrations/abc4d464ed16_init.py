@@ -0,0 +1,150 @@
+"""init
+
+迁移 ID: abc4d464ed16
+父迁移:
+创建时间: 2026-10-18 12:00:00.000000
+
+"""
+
+from __future__ import annotations
+
+from collections.abc import Sequence
+
+from alembic import op
+import sqlalchemy as sa
+
+revision: str = "abc4d464ed16"
+down_revision: str | Sequence[str] | None = None
+branch_labels: str | Sequence[str] | None = ("marryme",)
+depends_on: str | Sequence[str] | None = None
+
+
+def upgrade(name: str = "") -> None:
+    if name:
+        return
+    # 之前的版本没有迁移脚本，表可能已经由 `nb orm sync` 创建，已存在的表保持不动
+    existing_tables = set(sa.inspect(op.get_bind()).get_table_names())
+
+    if "marriage_requests" not in existing_tables:
+        op.create_table(
+            "marriage_requests",
+            sa.Column("id", sa.Integer(), autoincrement=True, nullable=False),
+            sa.Column("request_id", sa.String(length=100), nullable=False),
+            sa.Column("proposer_id", sa.String(length=100), nullable=False),
+            sa.Column("proposer_name", sa.String(length=100), nullable=True),
+            sa.Column("target_id", sa.String(length=100), nullable=False),
+            sa.Column("target_name", sa.String(length=100), nullable=True),
+            sa.Column("group_id", sa.String(length=100), nullable=False),
+            sa.Column("created_at", sa.DateTime(), nullable=True),
+            sa.Column("status", sa.String(length=20), nullable=True),
+            sa.PrimaryKeyConstraint("id", name=op.f("pk_marriage_requests")),
+            info={"bind_key": "marryme"},
+        )
+        with op.batch_alter_table("marriage_requests", schema=None) as batch_op:
+            batch_op.create_index(
+                batch_op.f("ix_marriage_requests_group_id"), ["group_id"], unique=False
+            )
+            batch_op.create_index(
+                batch_op.f("ix_marriage_requests_proposer_id"),
+                ["proposer_id"],
+                unique=False,
+            )
+            batch_op.create_index(
+                batch_op.f("ix_marriage_requests_request_id"),
+                ["request_id"],
+                unique=True,
+            )
+            batch_op.create_index(
+                batch_op.f("ix_marriage_requests_target_id"),
+                ["target_id"],
+                unique=False,
+            )
+
+    if "marriages" not in existing_tables:
+        op.create_table(
+            "marriages",
+            sa.Column("id", sa.Integer(), autoincrement=True, nullable=False),
+            sa.Column("marriage_id", sa.String(length=100), nullable=False),
+            sa.Column("proposer_id", sa.String(length=100), nullable=False),
+            sa.Column("proposer_name", sa.String(length=100), nullable=True),
+            sa.Column("target_id", sa.String(length=100), nullable=False),
+            sa.Column("target_name", sa.String(length=100), nullable=True),
+            sa.Column("group_id", sa.String(length=100), nullable=False),
+            sa.Column("married_at", sa.DateTime(), nullable=True),
+            sa.Column("status", sa.String(length=20), nullable=True),
+            sa.PrimaryKeyConstraint("id", name=op.f("pk_marriages")),
+            info={"bind_key": "marryme"},
+        )
+        with op.batch_alter_table("marriages", schema=None) as batch_op:
+            batch_op.create_index(
+                batch_op.f("ix_marriages_group_id"), ["group_id"], unique=False
+            )
+            batch_op.create_index(
+                batch_op.f("ix_marriages_marriage_id"), ["marriage_id"], unique=True
+            )
+            batch_op.create_index(
+                batch_op.f("ix_marriages_proposer_id"), ["proposer_id"], unique=False
+            )
+            batch_op.create_index(
+                batch_op.f("ix_marriages_target_id"), ["target_id"], unique=False
+            )
+
+    if "baby_records" not in existing_tables:
+        op.create_table(
+            "baby_records",
+            sa.Column("id", sa.Integer(), autoincrement=True, nullable=False),
+            sa.Column("marriage_id", sa.String(length=100), nullable=False),
+            sa.Column("parent1_id", sa.String(length=100), nullable=False),
+            sa.Column("parent1_name", sa.String(length=100), nullable=True),
+            sa.Column("parent2_id", sa.String(length=100), nullable=False),
+            sa.Column("parent2_name", sa.String(length=100), nullable=True),
+            sa.Column("baby_count", sa.Integer(), nullable=True),
+            sa.Column("created_at", sa.DateTime(), nullable=True),
+            sa.Column("group_id", sa.String(length=100), nullable=False),
+            sa.PrimaryKeyConstraint("id", name=op.f("pk_baby_records")),
+            info={"bind_key": "marryme"},
+        )
+        with op.batch_alter_table("baby_records", schema=None) as batch_op:
+            batch_op.create_index(
+                batch_op.f("ix_baby_records_group_id"), ["group_id"], unique=False
+            )
+            batch_op.create_index(
+                batch_op.f("ix_baby_records_marriage_id"), ["marriage_id"], unique=False
+            )
+            batch_op.create_index(
+                batch_op.f("ix_baby_records_parent1_id"), ["parent1_id"], unique=False
+            )
+            batch_op.create_index(
+                batch_op.f("ix_baby_records_parent2_id"), ["parent2_id"], unique=False
+            )
+
+    if "user_preferences" not in existing_tables:
+        op.create_table(
+            "user_preferences",
+            sa.Column("id", sa.Integer(), autoincrement=True, nullable=False),
+            sa.Column("user_id", sa.String(length=100), nullable=False),
+            sa.Column("user_name", sa.String(length=100), nullable=True),
+            sa.Column("group_id", sa.String(length=100), nullable=False),
+            sa.Column("allow_marriage", sa.Boolean(), nullable=True),
+            sa.Column("allow_baby", sa.Boolean(), nullable=True),
+            sa.Column("created_at", sa.DateTime(), nullable=True),
+            sa.Column("updated_at", sa.DateTime(), nullable=True),
+            sa.PrimaryKeyConstraint("id", name=op.f("pk_user_preferences")),
+            info={"bind_key": "marryme"},
+        )
+        with op.batch_alter_table("user_preferences", schema=None) as batch_op:
+            batch_op.create_index(
+                batch_op.f("ix_user_preferences_group_id"), ["group_id"], unique=False
+            )
+            batch_op.create_index(
+                batch_op.f("ix_user_preferences_user_id"), ["user_id"], unique=False
+            )
+
+
+def downgrade(name: str = "") -> None:
+    if name:
+        return
+    op.drop_table("user_preferences")
+    op.drop_table("baby_records")
+    op.drop_table("marriages")
+    op.drop_table("marriage_requests")
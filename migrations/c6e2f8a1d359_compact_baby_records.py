@@ -0,0 +1,98 @@
+"""compact baby records
+
+迁移 ID: c6e2f8a1d359
+父迁移: 7a4c2e9d1b65
+创建时间: 2026-10-18 16:00:00.000000
+
+"""
+
+from __future__ import annotations
+
+from collections.abc import Sequence
+
+from alembic import op
+import sqlalchemy as sa
+
+revision: str = "c6e2f8a1d359"
+down_revision: str | Sequence[str] | None = "7a4c2e9d1b65"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+# 每批合并的夫妻数
+CHUNK = 500
+
+baby_records = sa.table(
+    "baby_records",
+    sa.column("id", sa.Integer),
+    sa.column("pair_key", sa.String),
+    sa.column("baby_count", sa.Integer),
+    sa.column("created_at", sa.DateTime),
+)
+
+
+def compact(connection, chunk: int = CHUNK) -> tuple[int, int]:
+    """把每对夫妻的多条宝宝记录合并到最早的一条（id 最小）上
+
+    数量相加，时间取最新的一条；每批处理 chunk 对夫妻，每批三条语句。
+
+    Returns:
+        (合并的夫妻数, 删除的记录数)
+    """
+    merged = deleted = 0
+    while True:
+        stmt = (
+            sa.select(
+                baby_records.c.pair_key,
+                sa.func.min(baby_records.c.id),
+                sa.func.sum(baby_records.c.baby_count),
+                sa.func.max(baby_records.c.created_at),
+            )
+            .group_by(baby_records.c.pair_key)
+            .having(sa.func.count() > 1)
+            .limit(chunk)
+        )
+        rows = connection.execute(stmt).all()
+        if not rows:
+            return merged, deleted
+
+        connection.execute(
+            baby_records.update()
+            .where(baby_records.c.id == sa.bindparam("keep_id"))
+            .values(
+                baby_count=sa.bindparam("total"),
+                created_at=sa.bindparam("latest"),
+            ),
+            [
+                {"keep_id": keep_id, "total": total or 0, "latest": latest}
+                for _, keep_id, total, latest in rows
+            ],
+        )
+        result = connection.execute(
+            baby_records.delete().where(
+                baby_records.c.pair_key.in_([row[0] for row in rows]),
+                baby_records.c.id.not_in([row[1] for row in rows]),
+            )
+        )
+        merged += len(rows)
+        deleted += result.rowcount
+
+
+def upgrade(name: str = "") -> None:
+    if name:
+        return
+    # 旧版本每生一次可能新增一条记录，合并后每对夫妻只保留一条
+    compact(op.get_bind())
+
+    with op.batch_alter_table("baby_records", schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f("ix_baby_records_pair_key"))
+        batch_op.create_index("uq_baby_records_pair_key", ["pair_key"], unique=True)
+
+
+def downgrade(name: str = "") -> None:
+    if name:
+        return
+    with op.batch_alter_table("baby_records", schema=None) as batch_op:
+        batch_op.drop_index("uq_baby_records_pair_key")
+        batch_op.create_index(
+            batch_op.f("ix_baby_records_pair_key"), ["pair_key"], unique=False
+        )
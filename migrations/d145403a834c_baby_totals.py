@@ -0,0 +1,64 @@
+"""baby totals
+
+迁移 ID: d145403a834c
+父迁移: 45fb706b3b3f
+创建时间: 2026-10-18 13:00:00.000000
+
+"""
+
+from __future__ import annotations
+
+from collections.abc import Sequence
+
+from alembic import op
+import sqlalchemy as sa
+
+revision: str = "d145403a834c"
+down_revision: str | Sequence[str] | None = "45fb706b3b3f"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+
+def upgrade(name: str = "") -> None:
+    if name:
+        return
+    op.create_table(
+        "baby_totals",
+        sa.Column("kind", sa.String(length=10), nullable=False),
+        sa.Column("owner_key", sa.String(length=201), nullable=False),
+        sa.Column("total", sa.Integer(), nullable=False),
+        sa.Column("updated_at", sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint("kind", "owner_key", name=op.f("pk_baby_totals")),
+        info={"bind_key": "marryme"},
+    )
+    with op.batch_alter_table("baby_totals", schema=None) as batch_op:
+        batch_op.create_index(
+            "ix_baby_totals_kind_total", ["kind", "total"], unique=False
+        )
+
+    # 用已有的宝宝记录初始化汇总
+    op.execute("""
+        INSERT INTO baby_totals (kind, owner_key, total, updated_at)
+        SELECT 'pair', pair_key, COALESCE(SUM(baby_count), 0), CURRENT_TIMESTAMP
+        FROM baby_records
+        GROUP BY pair_key
+        """)
+    op.execute("""
+        INSERT INTO baby_totals (kind, owner_key, total, updated_at)
+        SELECT 'user', user_id, COALESCE(SUM(baby_count), 0), CURRENT_TIMESTAMP
+        FROM (
+            SELECT parent1_id AS user_id, baby_count FROM baby_records
+            UNION ALL
+            SELECT parent2_id AS user_id, baby_count FROM baby_records
+        ) AS parents
+        GROUP BY user_id
+        """)
+
+
+def downgrade(name: str = "") -> None:
+    if name:
+        return
+    with op.batch_alter_table("baby_totals", schema=None) as batch_op:
+        batch_op.drop_index("ix_baby_totals_kind_total")
+
+    op.drop_table("baby_totals")
@@ -0,0 +1,38 @@
+"""drop proposer index
+
+迁移 ID: e3a7b5c9d281
+父迁移: c6e2f8a1d359
+创建时间: 2026-10-18 18:00:00.000000
+
+"""
+
+from __future__ import annotations
+
+from collections.abc import Sequence
+
+from alembic import op
+import sqlalchemy as sa
+
+revision: str = "e3a7b5c9d281"
+down_revision: str | Sequence[str] | None = "c6e2f8a1d359"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+
+def upgrade(name: str = "") -> None:
+    if name:
+        return
+    # 每日求婚次数改由内存计数，没有查询再用到这个索引，只会拖慢插入
+    with op.batch_alter_table("marriage_requests", schema=None) as batch_op:
+        batch_op.drop_index("ix_marriage_requests_proposer_created_status")
+
+
+def downgrade(name: str = "") -> None:
+    if name:
+        return
+    with op.batch_alter_table("marriage_requests", schema=None) as batch_op:
+        batch_op.create_index(
+            "ix_marriage_requests_proposer_created_status",
+            ["proposer_id", "created_at", "status"],
+            unique=False,
+        )
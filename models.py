@@ -1,13 +1,32 @@
 from nonebot_plugin_orm import Model
-from sqlalchemy import Boolean, Column, String, DateTime, Integer
+from sqlalchemy import Boolean, Column, String, DateTime, Integer, Index, text
 from datetime import datetime
 
 
+def make_pair_key(user1_id: str, user2_id: str) -> str:
+    """生成与顺序无关的夫妻键：两个ID排序后用 & 连接"""
+    if user1_id > user2_id:
+        user1_id, user2_id = user2_id, user1_id
+    return f"{user1_id}&{user2_id}"
+
+
 # 定义数据模型
 class MarriageRequest(Model):
     """结婚请求表"""
 
     __tablename__ = "marriage_requests"
+    __table_args__ = (
+        # 过期清理按 status + created_at 范围扫描
+        Index("ix_marriage_requests_status_created_at", "status", "created_at"),
+        # 查询待处理请求：target_id + group_id + status，按 created_at 排序
+        Index(
+            "ix_marriage_requests_target_group_status_created",
+            "target_id",
+            "group_id",
+            "status",
+            "created_at",
+        ),
+    )
 
     id = Column(Integer, primary_key=True, autoincrement=True)
     request_id = Column(String(100), unique=True, nullable=False, index=True)
@@ -20,6 +39,9 @@ class MarriageRequest(Model):
     status = Column(
         String(20), default="pending"
     )  # pending, accepted, rejected, expired
+    # 所属的“天”，只有当前代的数据有效，见 PluginState。
+    # 不单独建索引：几乎所有行都属于当前代，SQLite 会误用这个区分度极低的索引
+    generation = Column(Integer, nullable=False, default=0, server_default="0")
 
     def to_dict(self):
         return {
@@ -43,6 +65,24 @@ class Marriage(Model):
     """婚姻关系表"""
 
     __tablename__ = "marriages"
+    __table_args__ = (
+        # 夫妻双方 + status，OR 的两个分支都能走这个索引
+        Index(
+            "ix_marriages_proposer_target_status", "proposer_id", "target_id", "status"
+        ),
+        # 按被求婚者查询有效婚姻
+        Index("ix_marriages_target_status", "target_id", "status"),
+        # 同一代中每对夫妻只有一段有效婚姻（部分唯一索引，只包含 married），
+        # 同时用于按夫妻键查询有效婚姻；接受请求时以它作为插入的冲突目标
+        Index(
+            "uq_marriages_pair_key_married",
+            "pair_key",
+            "generation",
+            unique=True,
+            sqlite_where=text("status = 'married'"),
+            postgresql_where=text("status = 'married'"),
+        ),
+    )
 
     id = Column(Integer, primary_key=True, autoincrement=True)
     marriage_id = Column(String(100), unique=True, nullable=False, index=True)
@@ -51,8 +91,12 @@ class Marriage(Model):
     target_id = Column(String(100), nullable=False, index=True)
     target_name = Column(String(100))
     group_id = Column(String(100), nullable=False, index=True)
+    pair_key = Column(String(201), nullable=False)  # 排序后的夫妻ID，见 make_pair_key
     married_at = Column(DateTime, default=datetime.now)
     status = Column(String(20), default="married")  # married, divorced
+    # 所属的“天”，只有当前代的数据有效，见 PluginState。
+    # 不单独建索引：几乎所有行都属于当前代，SQLite 会误用这个区分度极低的索引
+    generation = Column(Integer, nullable=False, default=0, server_default="0")
 
     def to_dict(self):
         return {
@@ -63,6 +107,7 @@ class Marriage(Model):
             "target_id": self.target_id,
             "target_name": self.target_name,
             "group_id": self.group_id,
+            "pair_key": self.pair_key,
             "married_at": (
                 self.married_at.isoformat()
                 if hasattr(self.married_at, "isoformat")
@@ -76,6 +121,10 @@ class BabyRecord(Model):
     """宝宝记录表"""
 
     __tablename__ = "baby_records"
+    __table_args__ = (
+        # 每对夫妻只有一条记录，生宝宝时以它作为 upsert 的冲突目标
+        Index("uq_baby_records_pair_key", "pair_key", unique=True),
+    )
 
     id = Column(Integer, primary_key=True, autoincrement=True)
     marriage_id = Column(String(100), nullable=False, index=True)  # 关联的婚姻ID
@@ -83,6 +132,7 @@ class BabyRecord(Model):
     parent1_name = Column(String(100))
     parent2_id = Column(String(100), nullable=False, index=True)  # 父母ID2
     parent2_name = Column(String(100))
+    pair_key = Column(String(201), nullable=False)  # 排序后的父母ID
     baby_count = Column(Integer, default=1)  # 生的宝宝数量
     created_at = Column(DateTime, default=datetime.now)
     group_id = Column(String(100), nullable=False, index=True)  # 群组ID
@@ -95,6 +145,7 @@ class BabyRecord(Model):
             "parent1_name": self.parent1_name,
             "parent2_id": self.parent2_id,
             "parent2_name": self.parent2_name,
+            "pair_key": self.pair_key,
             "baby_count": self.baby_count,
             "created_at": (
                 self.created_at.isoformat()
@@ -109,9 +160,13 @@ class UserPreference(Model):
     """用户偏好设置表"""
 
     __tablename__ = "user_preferences"
+    __table_args__ = (
+        # 每个用户在每个群只有一条偏好，设置偏好时以它作为 upsert 的冲突目标
+        Index("uq_user_preferences_user_group", "user_id", "group_id", unique=True),
+    )
 
     id = Column(Integer, primary_key=True, autoincrement=True)
-    user_id = Column(String(100), nullable=False, index=True)
+    user_id = Column(String(100), nullable=False)
     user_name = Column(String(100))
     group_id = Column(String(100), nullable=False, index=True)
     allow_marriage = Column(Boolean, default=True)  # 是否允许结婚
@@ -138,3 +193,58 @@ class UserPreference(Model):
                 else self.updated_at
             ),
         }
+
+
+class BabyTotal(Model):
+    """宝宝数量汇总表，随每次生宝宝在同一事务中增量更新"""
+
+    __tablename__ = "baby_totals"
+    __table_args__ = (
+        # 排行榜：按类型取 total 最大的若干条
+        Index("ix_baby_totals_kind_total", "kind", "total"),
+    )
+
+    kind = Column(String(10), primary_key=True)  # user: 单个用户, pair: 夫妻
+    owner_key = Column(String(201), primary_key=True)  # 用户ID 或 夫妻键
+    total = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, default=datetime.now, onupdate=datetime.now)
+
+    def to_dict(self):
+        return {
+            "kind": self.kind,
+            "owner_key": self.owner_key,
+            "total": self.total,
+            "updated_at": (
+                self.updated_at.isoformat()
+                if hasattr(self.updated_at, "isoformat")
+                else self.updated_at
+            ),
+        }
+
+
+class BabyProcess(Model):
+    """进行中的生宝宝过程，重启后据此恢复"""
+
+    __tablename__ = "baby_processes"
+
+    pair_key = Column(String(201), primary_key=True)  # 排序后的夫妻ID
+    user1_id = Column(String(100), nullable=False)  # 发起者
+    user2_id = Column(String(100), nullable=False)  # 配偶
+    group_id = Column(String(100), nullable=False)
+    bot_id = Column(String(100))  # 完成后用哪个机器人发送通知
+    started_at = Column(DateTime, nullable=False)
+    duration = Column(Integer, nullable=False)  # 持续时间（秒）
+    finish_at = Column(DateTime, nullable=False, index=True)
+
+
+class PluginState(Model):
+    """插件的全局计数器
+
+    generation：每日重置时加一，婚姻和结婚请求只读取当前代的数据，
+    旧代的数据由后台任务分批删除。
+    """
+
+    __tablename__ = "plugin_state"
+
+    key = Column(String(50), primary_key=True)
+    value = Column(Integer, nullable=False, default=0)
@@ -0,0 +1,64 @@
+import asyncio
+import os
+import sys
+import tempfile
+
+import nonebot
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PLUGIN = os.path.basename(ROOT)
+
+# 用临时的 SQLite 数据库和数据目录初始化 NoneBot 并加载插件
+_data_dir = tempfile.mkdtemp(prefix="marryme_test_")
+nonebot.init(
+    driver="~none",
+    sqlalchemy_database_url=f"sqlite+aiosqlite:///{os.path.join(_data_dir, 'test.db')}",
+    alembic_startup_check=False,
+    localstore_data_dir=_data_dir,
+    localstore_cache_dir=_data_dir,
+    localstore_config_dir=_data_dir,
+    command_start=[""],
+    log_level="WARNING",
+    # 测试按需替换管理器的频率限制，默认不限制
+    marryme_rate_limits={},
+)
+
+from nonebot.adapters.onebot.v11 import Adapter  # noqa: E402
+
+nonebot.get_driver().register_adapter(Adapter)
+for _plugin in (
+    "nonebot_plugin_orm",
+    "nonebot_plugin_apscheduler",
+    "nonebot_plugin_uninfo",
+):
+    nonebot.require(_plugin)
+sys.path.insert(0, os.path.dirname(ROOT))
+nonebot.load_plugin(PLUGIN)
+
+# 插件目录名因安装方式而异，测试统一通过 marryme 导入插件模块
+for _name, _module in list(sys.modules.items()):
+    if _name == PLUGIN or _name.startswith(f"{PLUGIN}."):
+        sys.modules["marryme" + _name[len(PLUGIN) :]] = _module
+
+
+@pytest.fixture(scope="session")
+def loop():
+    """整个测试会话共用一个事件循环，数据库引擎和管理器的后台任务都绑定在上面"""
+    loop = asyncio.new_event_loop()
+    driver = nonebot.get_driver()
+    loop.run_until_complete(driver._lifespan.startup())
+    yield loop
+    loop.run_until_complete(driver._lifespan.shutdown())
+    loop.close()
+
+
+@pytest.fixture
+def run(loop):
+    """在会话事件循环上执行协程并返回结果"""
+    return loop.run_until_complete
+
+
+@pytest.fixture
+def manager(loop):
+    return sys.modules["marryme"].marriage_manager
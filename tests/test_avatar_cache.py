@@ -0,0 +1,69 @@
+import asyncio
+
+from marryme.AvatarCache import AvatarCache
+
+URL = "https://example.com/avatar.png"
+
+
+def test_waiter_returns_when_first_fetch_cancelled():
+    async def main():
+        cache = AvatarCache()
+        started = asyncio.Event()
+
+        async def download(url):
+            started.set()
+            await asyncio.sleep(3600)
+
+        cache._download = download
+
+        first = asyncio.create_task(cache.fetch(URL))
+        await started.wait()
+        second = asyncio.create_task(cache.fetch(URL))
+        await asyncio.sleep(0)
+
+        first.cancel()
+        assert await asyncio.wait_for(second, timeout=1) is None
+        assert first.cancelled()
+        assert URL not in cache._inflight
+
+    asyncio.run(main())
+
+
+def test_waiter_shares_result_of_first_fetch():
+    async def main():
+        cache = AvatarCache()
+        release = asyncio.Event()
+        calls = 0
+
+        async def download(url):
+            nonlocal calls
+            calls += 1
+            await release.wait()
+            return b"avatar"
+
+        cache._download = download
+
+        tasks = [asyncio.create_task(cache.fetch(URL)) for _ in range(3)]
+        await asyncio.sleep(0)
+        release.set()
+        assert await asyncio.gather(*tasks) == [b"avatar"] * 3
+        assert calls == 1
+
+    asyncio.run(main())
+
+
+def test_spill_keeps_unrelated_files(tmp_path):
+    other = tmp_path / "keep.txt"
+    other.write_text("user data")
+
+    async def main():
+        cache = AvatarCache(memory_budget=10, spill_dir=str(tmp_path))
+        await cache._put_memory("a", b"0123456789")
+        await cache._put_memory("b", b"0123456789")
+        assert await cache._get_disk("a") == b"0123456789"
+        await cache.close()
+
+    asyncio.run(main())
+    # 重新创建时只清理自己的溢出文件
+    AvatarCache(spill_dir=str(tmp_path))
+    assert other.read_text() == "user data"
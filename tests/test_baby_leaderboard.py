@@ -0,0 +1,26 @@
+async def marry(manager, proposer, proposer_name, target, target_name):
+    request_id = await manager.create_marriage_request(
+        proposer, proposer_name, target, target_name, "200"
+    )
+    assert await manager.accept_marriage_request(request_id)
+
+
+def test_leaderboard_names_come_from_baby_records(manager, run):
+    async def main():
+        await marry(manager, "lb1", "小明", "lb2", "小红")
+        await marry(manager, "lb1", "小明", "lb3", "小兰")
+        await manager.have_baby_with_spouse("lb1", "lb2", "200", 1000)
+        await manager.have_baby_with_spouse("lb3", "lb1", "200", 500)
+        users = await manager.get_baby_leaderboard(limit=10, kind="user")
+        pairs = await manager.get_baby_leaderboard(limit=10, kind="pair")
+        return users, pairs
+
+    users, pairs = run(main())
+    users = {row["owner_key"]: row for row in users}
+    assert users["lb1"]["total"] == 1500
+    assert users["lb1"]["names"] == ["小明"]
+    assert users["lb3"]["names"] == ["小兰"]
+
+    pairs = {row["owner_key"]: row for row in pairs}
+    assert pairs["lb1&lb2"]["names"] == ["小明", "小红"]
+    assert pairs["lb1&lb3"]["names"] == ["小明", "小兰"]
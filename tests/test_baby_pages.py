@@ -0,0 +1,60 @@
+from datetime import datetime, timedelta
+
+from nonebot_plugin_orm import get_session
+
+from marryme.models import BabyRecord, make_pair_key
+
+USER = "page0"
+START = datetime(2026, 1, 1, 12, 0, 0, 123456)
+
+
+async def add_pair(partner_id: str, created_at: datetime):
+    async with get_session() as session:
+        session.add(
+            BabyRecord(
+                marriage_id=f"marriage_{partner_id}",
+                parent1_id=USER,
+                parent1_name="我",
+                parent2_id=partner_id,
+                parent2_name=f"伴侣{partner_id}",
+                pair_key=make_pair_key(USER, partner_id),
+                baby_count=1,
+                created_at=created_at,
+                group_id="300",
+            )
+        )
+        await session.commit()
+
+
+def partners(result):
+    return [row["parent2_name"] for row in result["pairs"]]
+
+
+def test_pages_follow_cursor_newest_first(manager, run):
+    async def main():
+        # 两对夫妻时间相同，按夫妻键排序
+        for i in range(6):
+            await add_pair(f"page{i + 1}", START + timedelta(minutes=i // 2))
+        first = await manager.get_baby_pairs_page(USER, 1, 4)
+        # 翻页前又有一对夫妻生了宝宝，排在第一页之前
+        await add_pair("page9", START + timedelta(days=1))
+        second = await manager.get_baby_pairs_page(
+            USER, 2, 4, cursor=first["next_cursor"]
+        )
+        jumped = await manager.get_baby_pairs_page(USER, 2, 4)
+        invalid = await manager.get_baby_pairs_page(USER, 2, 4, cursor="不是游标")
+        return first, second, jumped, invalid
+
+    first, second, jumped, invalid = run(main())
+    assert partners(first) == ["伴侣page5", "伴侣page6", "伴侣page3", "伴侣page4"]
+    assert first["total_pairs"] == 6
+    assert first["next_cursor"]
+
+    # 游标之后的内容不受新插入的夫妻影响，总数包含它
+    assert partners(second) == ["伴侣page1", "伴侣page2"]
+    assert second["total_pairs"] == 7
+    assert second["next_cursor"] is None
+
+    # 没有游标或游标无效时按 OFFSET 取第二页
+    assert partners(jumped) == ["伴侣page4", "伴侣page1", "伴侣page2"]
+    assert partners(invalid) == partners(jumped)
@@ -0,0 +1,14 @@
+import asyncio
+
+
+def test_concurrent_starts_for_one_couple_start_once(manager, run):
+    baby = manager.baby_process_manager
+
+    async def main():
+        return await asyncio.gather(
+            *(baby.start_baby_process("bp1", "bp2", "400", 3600) for _ in range(5)),
+            baby.start_baby_process("bp2", "bp1", "400", 3600),
+        )
+
+    assert sorted(run(main())) == [False] * 5 + [True]
+    assert run(baby.is_in_baby_process("bp1", "bp2"))
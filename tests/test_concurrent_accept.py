@@ -0,0 +1,101 @@
+"""并发接受结婚请求
+
+为 PAIRS 对用户各创建两个互相求婚的请求，然后同时发起所有“接受”：
+每个请求被重复接受 REPEAT 次，每次使用独立的会话（相当于不同的命令
+处理器同时执行）。SQLite 只允许一个写事务，锁等待超时的接受不会留下
+任何数据，只跳过依赖全部接受都完成的检查。
+"""
+
+import asyncio
+from collections import Counter
+
+from nonebot_plugin_orm import get_session
+from sqlalchemy import func, select
+
+from marryme.models import Marriage, MarriageRequest, make_pair_key
+
+GROUP_ID = "500"
+PAIRS = 20
+REPEAT = 3
+
+
+def test_concurrent_accepts_marry_each_pair_once(manager, run):
+    pairs = [(f"ca{1000 + i}", f"ca{2000 + i}") for i in range(PAIRS)]
+    pair_keys = [make_pair_key(user1, user2) for user1, user2 in pairs]
+    users = [user for pair in pairs for user in pair]
+
+    async def accept_all():
+        requests = []
+        for user1, user2 in pairs:
+            for proposer, target in ((user1, user2), (user2, user1)):
+                requests.append(
+                    await manager.create_marriage_request(
+                        proposer, f"用户{proposer}", target, f"用户{target}", GROUP_ID
+                    )
+                )
+        attempts = [request_id for request_id in requests for _ in range(REPEAT)]
+        return await asyncio.gather(
+            *(manager.accept_marriage_request(request_id) for request_id in attempts),
+            return_exceptions=True,
+        )
+
+    async def read_state():
+        async with get_session() as session:
+            married = dict(
+                (
+                    await session.execute(
+                        select(Marriage.pair_key, func.count())
+                        .where(
+                            Marriage.status == "married",
+                            Marriage.pair_key.in_(pair_keys),
+                        )
+                        .group_by(Marriage.pair_key)
+                    )
+                ).all()
+            )
+            statuses = Counter(
+                (
+                    await session.execute(
+                        select(MarriageRequest.status).where(
+                            MarriageRequest.proposer_id.in_(users)
+                        )
+                    )
+                ).scalars()
+            )
+        return married, statuses
+
+    results = run(accept_all())
+    outcomes = Counter(
+        type(result).__name__ if isinstance(result, BaseException) else result
+        for result in results
+    )
+    married, statuses = run(read_state())
+
+    # 没有重复的有效婚姻，接受成功的次数等于婚姻数
+    assert all(count == 1 for count in married.values())
+    assert outcomes[True] == sum(married.values())
+    if outcomes[True] + outcomes[False] == len(results):
+        assert len(married) == PAIRS
+        assert statuses["accepted"] == statuses["rejected"] == PAIRS
+        assert not statuses["pending"]
+
+    # 内存婚姻索引与数据库一致
+    indexed = sum(len(manager.marriage_index.get_all(user1)) for user1, _ in pairs)
+    assert indexed == sum(married.values())
+
+
+def test_remarry_after_divorce(manager, run):
+    async def main():
+        request_id = await manager.create_marriage_request(
+            "ca1", "甲", "ca2", "乙", GROUP_ID
+        )
+        assert await manager.accept_marriage_request(request_id)
+        assert await manager.divorce_with_spouse("ca1", "ca2")
+        await asyncio.sleep(1)  # 请求 ID 精确到秒
+        request_id = await manager.create_marriage_request(
+            "ca1", "甲", "ca2", "乙", GROUP_ID
+        )
+        # 离婚后再次结婚，婚姻 ID 不冲突
+        return await manager.accept_marriage_request(request_id)
+
+    assert run(main())
@@ -0,0 +1,77 @@
+"""内存索引只在事务提交后更新，回滚时保持原状"""
+
+import pytest
+
+GROUP_ID = "600"
+
+
+class Abort(Exception):
+    pass
+
+
+async def propose(manager, proposer, target, session=None):
+    return await manager.create_marriage_request(
+        proposer, f"用户{proposer}", target, f"用户{target}", GROUP_ID, session=session
+    )
+
+
+def test_indexes_ignore_rolled_back_unit(manager, run):
+    async def main():
+        assert manager.marriage_index.loaded and manager.pending_index.loaded
+
+        with pytest.raises(Abort):
+            async with manager.unit_of_work() as session:
+                await propose(manager, "ix1", "ix2", session=session)
+                raise Abort()
+        assert not manager.has_pending_request("ix2", GROUP_ID)
+
+        request_id = await propose(manager, "ix1", "ix2")
+        assert manager.has_pending_request("ix2", GROUP_ID)
+
+        # 接受后回滚：请求仍待处理，也没有婚姻
+        with pytest.raises(Abort):
+            async with manager.unit_of_work() as session:
+                assert await manager.accept_marriage_request(request_id, session)
+                raise Abort()
+        assert manager.has_pending_request("ix2", GROUP_ID)
+        assert manager.marriage_index.get("ix1", "ix2") is None
+
+        async with manager.unit_of_work() as session:
+            assert await manager.accept_marriage_request(request_id, session)
+            # 提交前索引还没有变化
+            assert manager.has_pending_request("ix2", GROUP_ID)
+            assert manager.marriage_index.get("ix1", "ix2") is None
+        assert not manager.has_pending_request("ix2", GROUP_ID)
+        assert manager.marriage_index.get("ix2", "ix1")["pair_key"]
+
+        # 离婚后回滚：婚姻仍在索引中
+        with pytest.raises(Abort):
+            async with manager.unit_of_work() as session:
+                assert await manager.divorce_with_spouse("ix1", "ix2", session)
+                raise Abort()
+        assert manager.marriage_index.get("ix1", "ix2") is not None
+
+        assert await manager.divorce_with_spouse("ix1", "ix2")
+        assert manager.marriage_index.get("ix1", "ix2") is None
+
+    run(main())
+
+
+def test_swallowed_failure_rolls_back_whole_unit(manager, run):
+    async def main():
+        request_id = await propose(manager, "ix3", "ix4")
+
+        async with manager.unit_of_work() as session:
+            assert await manager.accept_marriage_request(request_id, session)
+            try:
+                async with manager._transaction(session):
+                    raise Abort()
+            except Abort:
+                pass
+
+        # 调用方吞掉了异常，工作单元仍整体回滚
+        assert manager.has_pending_request("ix4", GROUP_ID)
+        assert manager.marriage_index.get("ix3", "ix4") is None
+        assert await manager.get_user_marriage("ix3", "ix4") is None
+
+    run(main())
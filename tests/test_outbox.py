@@ -0,0 +1,125 @@
+import asyncio
+
+import pytest
+from pydantic import ValidationError
+
+import marryme.Outbox as outbox_module
+from marryme.config import Config
+from marryme.Outbox import Outbox
+
+
+class FakeBot:
+    """记录发送的群消息，前 failures 次发送抛出异常"""
+
+    def __init__(self, failures: int = 0):
+        self.failures = failures
+        self.sent = []
+
+    async def send_group_msg(self, group_id: int, message):
+        if self.failures:
+            self.failures -= 1
+            raise RuntimeError("网络错误")
+        self.sent.append((str(group_id), str(message)))
+
+
+@pytest.fixture
+def bot(monkeypatch):
+    bot = FakeBot()
+    monkeypatch.setattr(outbox_module, "get_bot", lambda bot_id=None: bot)
+    return bot
+
+
+def make_outbox(**kwargs) -> Outbox:
+    options = dict(
+        coalesce_window=0.05,
+        group_burst=100,
+        group_interval=0.01,
+        global_burst=100,
+        global_interval=0.01,
+        retry_delay=0.01,
+    )
+    options.update(kwargs)
+    return Outbox(**options)
+
+
+async def drain(outbox: Outbox):
+    while outbox._workers:
+        await asyncio.gather(*list(outbox._workers.values()))
+
+
+def test_notices_in_window_are_coalesced(bot):
+    async def main():
+        outbox = make_outbox(max_coalesce=3)
+        for i in range(5):
+            outbox.put("1", f"通知{i}")
+        await drain(outbox)
+        return outbox
+
+    outbox = asyncio.run(main())
+    assert bot.sent == [
+        ("1", "通知0\n通知1\n通知2"),
+        ("1", "通知3\n通知4"),
+    ]
+    assert outbox.stats()["sent_notices"] == 5
+    assert outbox.depth() == 0
+
+
+def test_groups_keep_their_own_order(bot):
+    async def main():
+        outbox = make_outbox(max_coalesce=1)
+        for i in range(4):
+            outbox.put("1", f"甲{i}")
+            outbox.put("2", f"乙{i}")
+        await drain(outbox)
+
+    asyncio.run(main())
+    for group_id, prefix in (("1", "甲"), ("2", "乙")):
+        messages = [message for gid, message in bot.sent if gid == group_id]
+        assert messages == [f"{prefix}{i}" for i in range(4)]
+
+
+def test_failed_send_is_retried_in_order(bot):
+    bot.failures = 2
+
+    async def main():
+        outbox = make_outbox(max_coalesce=1)
+        for i in range(3):
+            outbox.put("1", f"通知{i}")
+        await drain(outbox)
+        return outbox
+
+    outbox = asyncio.run(main())
+    assert [message for _, message in bot.sent] == ["通知0", "通知1", "通知2"]
+    assert outbox.failed_notices == 0
+
+
+def test_notices_dropped_after_max_retries(bot):
+    bot.failures = 3
+
+    async def main():
+        outbox = make_outbox(max_retries=2)
+        outbox.put("1", "丢弃")
+        await drain(outbox)
+        outbox.put("1", "送达")
+        await drain(outbox)
+        return outbox
+
+    outbox = asyncio.run(main())
+    assert bot.sent == [("1", "送达")]
+    assert outbox.failed_notices == 1
+    assert outbox.sent_notices == 1
+
+
+@pytest.mark.parametrize(
+    "field",
+    [
+        "marryme_outbox_group_interval",
+        "marryme_outbox_global_interval",
+        "marryme_outbox_group_burst",
+        "marryme_outbox_global_burst",
+        "marryme_outbox_max_coalesce",
+    ],
+)
+def test_config_rejects_non_positive_rate(field):
+    with pytest.raises(ValidationError):
+        Config(**{field: 0})
@@ -0,0 +1,50 @@
+"""偏好缓存只在事务提交后失效，回滚时保留原来的值"""
+
+import pytest
+
+GROUP_ID = "700"
+
+
+class Abort(Exception):
+    pass
+
+
+def test_cache_invalidated_on_commit(manager, run):
+    async def main():
+        assert await manager.get_user_preference("pc1", GROUP_ID) is None
+        # 没有设置偏好的结果也被缓存
+        assert ("pc1", GROUP_ID) in manager._preferences
+
+        async with manager.unit_of_work() as session:
+            await manager.set_user_preference(
+                "pc1", "甲", GROUP_ID, allow_marriage=False, session=session
+            )
+            # 同一工作单元内读到未提交的新值，缓存里仍是提交前的结果
+            preference = await manager.get_user_preference("pc1", GROUP_ID, session)
+            assert preference["allow_marriage"] is False
+            assert manager._preferences.get(("pc1", GROUP_ID)) is None
+
+        preference = await manager.get_user_preference("pc1", GROUP_ID)
+        assert preference["allow_marriage"] is False
+        assert manager._preferences.get(("pc1", GROUP_ID))["allow_marriage"] is False
+
+    run(main())
+
+
+def test_cache_kept_on_rollback(manager, run):
+    async def main():
+        await manager.set_user_preference("pc2", "乙", GROUP_ID, allow_baby=True)
+        assert (await manager.get_user_preference("pc2", GROUP_ID))["allow_baby"]
+
+        with pytest.raises(Abort):
+            async with manager.unit_of_work() as session:
+                await manager.set_user_preference(
+                    "pc2", "乙", GROUP_ID, allow_baby=False, session=session
+                )
+                raise Abort()
+
+        assert manager._preferences.get(("pc2", GROUP_ID))["allow_baby"] is True
+        preference = await manager.get_user_preference("pc2", GROUP_ID)
+        assert preference["allow_baby"] is True
+
+    run(main())
@@ -0,0 +1,96 @@
+from datetime import date, timedelta
+
+import pytest
+
+import marryme.RateLimiter as rate_limiter_module
+from marryme.RateLimiter import RateLimiter, RateLimitRule, TokenBuckets
+
+
+class Clock:
+    """可手动拨动的 monotonic 时钟"""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self) -> float:
+        return self.now
+
+
+class Today(date):
+    """可手动翻页的日期，替换模块里的 date.today"""
+
+    current = date(2026, 10, 18)
+
+    @classmethod
+    def today(cls):
+        return cls.current
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(rate_limiter_module, "time", clock)
+    return clock
+
+
+@pytest.fixture
+def today(monkeypatch):
+    monkeypatch.setattr(Today, "current", date(2026, 10, 18))
+    monkeypatch.setattr(rate_limiter_module, "date", Today)
+    return Today
+
+
+def test_token_bucket_refills_over_time(clock):
+    buckets = TokenBuckets(burst=2, interval=10)
+
+    assert buckets.take("u") == 0
+    assert buckets.take("u") == 0
+    assert buckets.take("u") == pytest.approx(10)
+
+    # 半个间隔只恢复半个令牌
+    clock.now += 5
+    assert buckets.take("u") == pytest.approx(5)
+
+    clock.now += 5
+    assert buckets.take("u") == 0
+    assert buckets.take("u") > 0
+
+    # 空闲再久也不会超过容量
+    clock.now += 1000
+    assert buckets.take("u") == 0
+    assert buckets.take("u") == 0
+    assert buckets.take("u") > 0
+
+    # 不同的键互不影响
+    assert buckets.take("v") == 0
+
+
+def test_refund_and_seed_across_daily_reset(today):
+    limiter = RateLimiter({"marry": RateLimitRule(user_daily=2)})
+
+    limiter.seed_daily("marry", {"u": 2})
+    assert limiter.remaining_daily("marry", "u") == 0
+    assert limiter.acquire("marry", "u", "g") is not None
+
+    # 今天的请求被拒绝，退还一次
+    limiter.refund_daily("marry", "u", day=today.current)
+    assert limiter.remaining_daily("marry", "u") == 1
+
+    yesterday = today.current
+    today.current = yesterday + timedelta(days=1)
+
+    # 零点后次数清零，昨天的请求过期不能再退到今天
+    assert limiter.remaining_daily("marry", "u") == 2
+    assert limiter.acquire("marry", "u", "g") is None
+    limiter.refund_daily("marry", "u", day=yesterday)
+    assert limiter.remaining_daily("marry", "u") == 1
+
+    # 次数不会被退成负数
+    limiter.refund_daily("marry", "u")
+    limiter.refund_daily("marry", "u")
+    assert limiter.remaining_daily("marry", "u") == 2
+
+    # 跨天后用昨天的统计初始化，下一次读取时仍然按今天清零
+    limiter.seed_daily("marry", {"u": 2})
+    today.current += timedelta(days=1)
+    assert limiter.remaining_daily("marry", "u") == 2
@@ -0,0 +1,66 @@
+import asyncio
+import time
+
+from marryme.DeadlineScheduler import DeadlineScheduler
+from marryme.ExpiryScheduler import ExpiryScheduler
+
+
+def test_failed_batch_is_rearmed():
+    async def main():
+        calls = []
+        notified = []
+        done = asyncio.Event()
+
+        async def expire(request_ids):
+            calls.append(list(request_ids))
+            if len(calls) == 1:
+                raise RuntimeError("database is locked")
+            return [{"request_id": request_id} for request_id in request_ids]
+
+        async def notify(expired):
+            notified.extend(expired)
+            done.set()
+
+        scheduler = ExpiryScheduler(expire, batch_window=0.01, retry_delay=0.05)
+        scheduler.schedule("r1", time.time())
+        scheduler.schedule("r2", time.time())
+        scheduler.start(notify)
+        try:
+            await asyncio.wait_for(done.wait(), timeout=2)
+        finally:
+            await scheduler.stop()
+        return calls, notified, len(scheduler)
+
+    calls, notified, remaining = asyncio.run(main())
+    assert calls == [["r1", "r2"], ["r1", "r2"]]
+    assert notified == [{"request_id": "r1"}, {"request_id": "r2"}]
+    assert remaining == 0
+
+
+def test_retry_respects_changes_made_during_dispatch():
+    async def main():
+        calls = []
+        scheduler = None
+
+        async def callback(keys):
+            calls.append(list(keys))
+            if len(calls) == 1:
+                # 处理期间 a 被取消、b 被重新登记到更晚的时间
+                scheduler.discard("a")
+                scheduler.schedule("b", time.time() + 3600)
+                raise RuntimeError("database is locked")
+
+        scheduler = DeadlineScheduler(callback, batch_window=0.01, retry_delay=0.05)
+        for key in ("a", "b", "c"):
+            scheduler.schedule(key, time.time())
+        scheduler.start()
+        try:
+            await asyncio.sleep(0.3)
+        finally:
+            await scheduler.stop()
+        return calls, dict(scheduler._deadlines)
+
+    calls, deadlines = asyncio.run(main())
+    assert calls == [["a", "b", "c"], ["c"]]
+    assert list(deadlines) == ["b"]
+    assert deadlines["b"] > time.time() + 3000
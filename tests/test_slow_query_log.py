@@ -0,0 +1,19 @@
+import pytest
+from sqlalchemy import create_engine, exc, text
+
+from marryme.SlowQueryLog import SlowQueryLog
+
+
+def test_failed_statement_does_not_leak_start_time():
+    engine = create_engine("sqlite://")
+    slow_queries = SlowQueryLog(threshold_ms=0)
+    slow_queries.watch(engine)
+
+    with engine.connect() as conn:
+        with pytest.raises(exc.OperationalError):
+            conn.execute(text("SELECT * FROM missing_table"))
+        assert conn.info["marryme_query_started"] == []
+
+        conn.execute(text("SELECT 1"))
+        assert conn.info["marryme_query_started"] == []
+    assert slow_queries.count == 1
@@ -0,0 +1,42 @@
+import pytest
+from sqlalchemy.exc import OperationalError
+
+from marryme.RateLimiter import RateLimiter, RateLimitRule
+
+
+@pytest.fixture
+def daily_limit(manager, monkeypatch):
+    limiter = RateLimiter({"marry": RateLimitRule(user_daily=4)})
+    monkeypatch.setattr(manager, "rate_limiter", limiter)
+    return limiter
+
+
+def test_failed_commit_refunds_daily_count(manager, run, daily_limit):
+    async def main():
+        async with manager.unit_of_work() as session:
+
+            async def commit():
+                raise OperationalError("COMMIT", {}, Exception("database is locked"))
+
+            session.commit = commit
+            await manager.create_marriage_request(
+                "uow1", "甲", "uow2", "乙", "100", session=session
+            )
+            assert daily_limit.remaining_daily("marry", "uow1") == 3
+
+    with pytest.raises(OperationalError):
+        run(main())
+    assert daily_limit.remaining_daily("marry", "uow1") == 4
+    assert not manager.has_pending_request("uow2", "100")
+
+
+def test_committed_request_keeps_daily_count(manager, run, daily_limit):
+    async def main():
+        async with manager.unit_of_work() as session:
+            await manager.create_marriage_request(
+                "uow3", "丙", "uow4", "丁", "100", session=session
+            )
+
+    run(main())
+    assert daily_limit.remaining_daily("marry", "uow3") == 3
+    assert manager.has_pending_request("uow4", "100")